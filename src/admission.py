@@ -0,0 +1,163 @@
+"""
+요청 수락 제어 (Firestore 호출 전에 과부하 요청을 일찍 거절)
+- 토큰 버킷: 사용자(역할별 한도), IP, 엔드포인트별 초당 요청 수 → 초과 시 429
+- 동시 처리 제한: 처리 중 요청이 한도를 넘으면 짧게 대기, 대기열도 가득 차면 503
+거절 시 Retry-After(초)를 함께 돌려줍니다.
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_BUCKETS = 20000
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate          # 초당 채워지는 토큰 수
+        self.burst = burst        # 최대 토큰 수
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+
+    def take(self, now):
+        """토큰 하나 사용 (성공하면 0, 부족하면 다음 토큰까지 기다릴 초)"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """키별 토큰 버킷 (오래 쓰지 않은 키부터 정리)"""
+
+    def __init__(self, max_buckets=DEFAULT_MAX_BUCKETS):
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+        self.max_buckets = max_buckets
+
+    def check(self, key, rate, burst):
+        """
+        Returns:
+            float: 0이면 허용, 아니면 Retry-After 초
+        """
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None or bucket.rate != rate or bucket.burst != burst:
+                bucket = self._buckets[key] = TokenBucket(rate, burst)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+            return bucket.take(now)
+
+    def size(self):
+        with self._lock:
+            return len(self._buckets)
+
+
+class ConcurrencyLimiter:
+    """동시 처리 중 요청 수 제한 (한도 초과 시 queue_timeout 동안 대기, 대기열이 가득 차면 바로 거절)"""
+
+    def __init__(self, max_in_flight, max_queue, queue_timeout):
+        self._cond = threading.Condition()
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiting = 0
+
+    def acquire(self):
+        with self._cond:
+            if self.in_flight < self.max_in_flight:
+                self.in_flight += 1
+                return True
+            if self.waiting >= self.max_queue:
+                return False
+            self.waiting += 1
+            try:
+                admitted = self._cond.wait_for(lambda: self.in_flight < self.max_in_flight, self.queue_timeout)
+                if admitted:
+                    self.in_flight += 1
+                return admitted
+            finally:
+                self.waiting -= 1
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+
+class AdmissionController:
+    """
+    Args:
+        role_limits: 역할 → (초당 요청, 버스트) - 로그인한 사용자별 한도
+        ip_limit: IP별 (초당 요청, 버스트)
+        endpoint_limits: 'METHOD /path' → (초당 요청, 버스트) - 엔드포인트 전체 한도
+    """
+
+    def __init__(self, role_limits, ip_limit, endpoint_limits,
+                 max_in_flight, max_queue, queue_timeout):
+        self._lock = threading.Lock()
+        self.role_limits = role_limits
+        self.ip_limit = ip_limit
+        self.endpoint_limits = endpoint_limits
+        self.rate_limiter = RateLimiter()
+        self.concurrency = ConcurrencyLimiter(max_in_flight, max_queue, queue_timeout)
+        self.admitted = 0
+        self.shed = {'principal': 0, 'ip': 0, 'endpoint': 0, 'concurrency': 0}
+
+    def check_rates(self, endpoint=None, ip=None, principal=None, role=None):
+        """
+        토큰 버킷 확인 (엔드포인트 → IP → 사용자 순)
+
+        Returns:
+            tuple: (거절 사유 또는 None, Retry-After 초)
+        """
+        checks = []
+        if endpoint and endpoint in self.endpoint_limits:
+            checks.append(('endpoint', endpoint, self.endpoint_limits[endpoint]))
+        if ip and self.ip_limit:
+            checks.append(('ip', ip, self.ip_limit))
+        if principal and role in self.role_limits:
+            checks.append(('principal', principal, self.role_limits[role]))
+
+        for scope, key, (rate, burst) in checks:
+            retry_after = self.rate_limiter.check((scope, key), rate, burst)
+            if retry_after:
+                self._count_shed(scope)
+                return scope, max(1, math.ceil(retry_after))
+        return None, 0
+
+    def acquire(self):
+        """동시 처리 슬롯 확보 (실패하면 False → 503)"""
+        if self.concurrency.acquire():
+            with self._lock:
+                self.admitted += 1
+            return True
+        self._count_shed('concurrency')
+        return False
+
+    def release(self):
+        self.concurrency.release()
+
+    def _count_shed(self, scope):
+        with self._lock:
+            self.shed[scope] += 1
+
+    def stats(self):
+        with self._lock:
+            admitted = self.admitted
+            shed = dict(self.shed)
+        return {
+            'in_flight': self.concurrency.in_flight,
+            'queue_depth': self.concurrency.waiting,
+            'max_in_flight': self.concurrency.max_in_flight,
+            'max_queue': self.concurrency.max_queue,
+            'admitted': admitted,
+            'shed': shed,
+            'rate_buckets': self.rate_limiter.size(),
+        }
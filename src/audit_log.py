@@ -0,0 +1,149 @@
+"""
+쓰기 지연(write-behind) 감사 로그
+스탬프 부여/회수, 역할 변경, 전체 초기화 등 모든 변경을 저장소의 감사 로그(Firestore: audit_log 컬렉션)에 추가만 합니다.
+- 요청 스레드는 메모리 큐에 넣기만 함 (저장소 쓰기 대기 없음)
+- 백그라운드 스레드가 flush_interval마다 batch로 모아서 storage.append_audit
+- 큐가 가득 찼거나 종료 시 남은 이벤트, 커밋에 계속 실패한 이벤트는 로컬 spill 파일(JSON Lines)에 저장
+  → 다음 시작 때 spill 파일을 읽어 다시 기록
+"""
+
+import datetime
+import glob
+import json
+import os
+import queue
+import tempfile
+import threading
+import uuid
+
+DEFAULT_MAX_QUEUE = 10000
+DEFAULT_FLUSH_INTERVAL_SECONDS = 2.0
+DEFAULT_BATCH_SIZE = 400        # Firestore batch 한도(500) 이하
+MAX_FLUSH_ATTEMPTS = 3
+SPILL_PREFIX = 'audit_spill_'
+
+
+class AuditLog:
+    def __init__(self, get_storage, max_queue=DEFAULT_MAX_QUEUE, flush_interval=DEFAULT_FLUSH_INTERVAL_SECONDS,
+                 batch_size=DEFAULT_BATCH_SIZE, spill_dir=None):
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._flusher = None
+        self.get_storage = get_storage
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.spill_dir = spill_dir or tempfile.gettempdir()
+        self.counts = {'recorded': 0, 'written': 0, 'spilled': 0, 'recovered': 0, 'flush_errors': 0}
+
+    def record(self, action, actor=None, **details):
+        """감사 이벤트 추가 (블로킹 없음, 큐가 가득 차면 spill 파일로)"""
+        event = {
+            'event_id': uuid.uuid4().hex,
+            'action': action,
+            'actor': actor,
+            'at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'pid': os.getpid(),
+            **details,
+        }
+        self._count('recorded')
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self._spill([event])
+
+    def start(self):
+        """spill 파일 복구 + 백그라운드 flush 스레드 시작 (워커 프로세스마다)"""
+        if self._flusher and self._flusher.is_alive():
+            return
+        self._stop.clear()
+        self.recover_spill()
+        self._flusher = threading.Thread(target=self._flush_loop, name='audit-log', daemon=True)
+        self._flusher.start()
+
+    def shutdown(self, timeout=5.0):
+        """flush 스레드 정지 → 남은 이벤트 기록 시도 → 실패분은 spill 파일로"""
+        self._stop.set()
+        if self._flusher and self._flusher.is_alive():
+            self._flusher.join(timeout)
+        while self.flush():
+            pass
+        self._spill(self._drain(self._queue.qsize()))
+
+    def flush(self):
+        """
+        큐에서 batch_size만큼 꺼내 한 batch로 커밋
+
+        Returns:
+            int: 기록한 이벤트 수 (실패하면 0, 이벤트는 큐로 되돌리거나 spill)
+        """
+        events = self._drain(self.batch_size)
+        if not events:
+            return 0
+        storage = self.get_storage()
+        for attempt in range(MAX_FLUSH_ATTEMPTS):
+            if not storage:
+                break
+            try:
+                # event_id가 같은 이벤트는 한 번만 기록 → 재시도해도 중복 없음
+                storage.append_audit(events)
+                self._count('written', len(events))
+                return len(events)
+            except Exception as e:
+                print(f"Audit log flush error (attempt {attempt + 1}): {e}")
+                self._count('flush_errors')
+        self._spill(events)
+        return 0
+
+    def recover_spill(self):
+        """이전 프로세스가 남긴 spill 파일을 큐로 다시 넣기 (rename으로 한 워커만 가져감)"""
+        for path in glob.glob(os.path.join(self.spill_dir, f'{SPILL_PREFIX}*.jsonl')):
+            claimed = f'{path}.{os.getpid()}.claimed'
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                continue  # 다른 워커가 먼저 가져감
+            with open(claimed, encoding='utf-8') as f:
+                events = [json.loads(line) for line in f if line.strip()]
+            for event in events:
+                try:
+                    self._queue.put_nowait(event)
+                except queue.Full:
+                    self._spill([event])
+            self._count('recovered', len(events))
+            os.remove(claimed)
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            while self.flush() == self.batch_size:
+                pass  # 밀린 이벤트가 더 있으면 바로 이어서
+
+    def _drain(self, limit):
+        events = []
+        while len(events) < limit:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return events
+
+    def _spill(self, events):
+        if not events:
+            return
+        path = os.path.join(self.spill_dir, f'{SPILL_PREFIX}{os.getpid()}.jsonl')
+        with self._lock:
+            with open(path, 'a', encoding='utf-8') as f:
+                for event in events:
+                    f.write(json.dumps(event, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+        self._count('spilled', len(events))
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.counts[key] += amount
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self.counts)
+        return {**counts, 'queued': self._queue.qsize(), 'max_queue': self._queue.maxsize}
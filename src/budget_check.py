@@ -0,0 +1,158 @@
+"""
+엔드포인트별 저장소 작업 한도 확인 (storage_ops.ENDPOINT_BUDGETS)
+메모리/SQLite 저장소로 서버를 띄우고, 캐시를 비운 최악의 경우로 엔드포인트를 한 번씩 호출해
+요청 하나가 읽고 쓴 문서/쿼리 수가 한도 안인지 확인합니다. 넘으면 종료 코드 1 (CI용)
+포인트 조회가 전체 스캔으로 바뀌는 변경은 학생 수(--students)에 비례해 reads가 늘어나므로 여기서 걸립니다.
+
+실행 (src에서):
+    python budget_check.py --backend memory --students 200
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from loadtest import ADMIN_EMAIL, FIRST_STUDENT_NUMBER, fake_id_token, verify_fake_id_token
+from stamp_codec import STAMP_IDS
+from storage_ops import ENDPOINT_BUDGETS, assert_within_budget, counting
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='엔드포인트별 저장소 작업 한도 확인')
+    parser.add_argument('--backend', default='memory', choices=['memory', 'sqlite'])
+    parser.add_argument('--sqlite-path', default='budget_check.sqlite3')
+    parser.add_argument('--students', type=int, default=200)
+    return parser.parse_args(argv)
+
+
+def configure_environment(args):
+    """flask_auth_server import 전에 저장소 설정, 한도는 해제 (429 없이 한 번씩 호출)"""
+    os.environ['STORAGE_BACKEND'] = args.backend
+    os.environ['WARM_USER_INDEX_LIMIT'] = '0'
+    if args.backend == 'sqlite':
+        os.environ['SQLITE_PATH'] = args.sqlite_path
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(args.sqlite_path + suffix):
+                os.remove(args.sqlite_path + suffix)
+    unlimited = [1e9, 1e9]
+    os.environ['RATE_LIMITS'] = json.dumps({role: unlimited for role in ('student', 'manager', 'admin')})
+    os.environ['IP_RATE_LIMIT'] = json.dumps({'ip': unlimited})
+    os.environ['ENDPOINT_RATE_LIMITS'] = json.dumps({endpoint: unlimited for endpoint in ENDPOINT_BUDGETS})
+
+
+class BudgetCheck:
+    def __init__(self, server, students):
+        self.server = server
+        self.client = server.app.test_client()
+        self.students = [(f'student{n}', f'{n}@jeohyeon.hs.kr')
+                         for n in range(FIRST_STUDENT_NUMBER, FIRST_STUDENT_NUMBER + students)]
+        self.manager = ('manager1', 'manager1@jeohyeon.hs.kr')
+        self.admin = ('admin', ADMIN_EMAIL)
+        self.tokens = {}
+        self.results = []
+
+    def cold(self):
+        """프로세스 캐시 비우기 → 매 요청이 저장소까지 감 (최악의 경우)"""
+        self.server.profile_cache.clear()
+        self.server.user_index.clear()
+
+    def call(self, method, path, account=None, body=None):
+        headers = {'Authorization': f'Bearer {self.tokens[account[0]]}'} if account else {}
+        return self.client.open(path, method=method, json=body, headers=headers)
+
+    def login(self, account):
+        response = self.call('POST', '/api/login', body={'id_token': fake_id_token(*account)})
+        if response.status_code == 200:
+            self.tokens[account[0]] = response.get_json()['access_token']
+        return response
+
+    def measure(self, name, endpoint, request, expected_status=200):
+        """request()를 캐시를 비운 상태로 한 번 실행하고 작업 수를 한도와 비교"""
+        self.cold()
+        with counting() as counts:
+            response = request()
+            response.close()    # 스트리밍 응답까지 끝까지 처리
+        error = None
+        if response.status_code != expected_status:
+            error = f"상태 코드 {response.status_code} (예상 {expected_status})"
+        else:
+            try:
+                assert_within_budget(counts, endpoint)
+            except AssertionError as e:
+                error = str(e)
+        self.results.append({'name': name, 'endpoint': endpoint, 'counts': counts.to_dict(),
+                             'budget': ENDPOINT_BUDGETS.get(endpoint), 'error': error})
+        return response
+
+    def setup(self):
+        for account in [self.admin, self.manager] + self.students:
+            self.login(account)
+        self.call('POST', '/api/role', self.admin, {'target_email': self.manager[1], 'new_role': 'manager'})
+        self.login(self.manager)
+
+    def run(self):
+        student = self.students[0]
+        new_student = ('student_new', f'{FIRST_STUDENT_NUMBER + len(self.students)}@jeohyeon.hs.kr')
+        batch_targets = [email.split('@')[0] for _, email in self.students[1:51]]
+
+        self.measure('login (신규 가입)', 'POST /api/login', lambda: self.login(new_student))
+        self.measure('login (기존 사용자)', 'POST /api/login', lambda: self.login(student))
+        self.measure('profile', 'GET /api/profile', lambda: self.call('GET', '/api/profile', student))
+        self.measure('부장 순차 부여', 'POST /api/stamps', lambda: self.call(
+            'POST', '/api/stamps', self.manager, {'target_email': student[1], 'action': 'grant', 'auto_grant': True}))
+        self.measure('부장 중복 부여', 'POST /api/stamps', lambda: self.call(
+            'POST', '/api/stamps', self.manager, {'target_email': student[1], 'action': 'grant', 'auto_grant': True}),
+            expected_status=400)
+        self.measure('관리자 부여', 'POST /api/stamps', lambda: self.call(
+            'POST', '/api/stamps', self.admin, {'target_email': student[1], 'action': 'grant', 'stamp_id': STAMP_IDS[5]}))
+        self.measure('관리자 회수', 'POST /api/stamps', lambda: self.call(
+            'POST', '/api/stamps', self.admin, {'target_email': student[1], 'action': 'revoke', 'stamp_id': 'stamp1'}))
+        self.measure(f'일괄 부여 ({len(batch_targets)}명)', 'POST /api/stamps/batch', lambda: self.call(
+            'POST', '/api/stamps/batch', self.manager, {'targets': batch_targets}))
+        self.measure('역할 변경', 'POST /api/role', lambda: self.call(
+            'POST', '/api/role', self.admin, {'target_email': student[1], 'new_role': 'student'}))
+        self.measure('통계', 'GET /api/stats', lambda: self.call('GET', '/api/stats', self.admin))
+        self.measure('스탬프 목록', 'GET /api/stamps', lambda: self.call('GET', '/api/stamps', student))
+        self.measure('사용자 목록 (page_size=50)', 'GET /api/users',
+                     lambda: self.call('GET', '/api/users?page_size=50', self.admin))
+
+        response = self.measure('통계 재계산 시작', 'POST /api/stats/rebuild',
+                                lambda: self.call('POST', '/api/stats/rebuild', self.admin), expected_status=202)
+        job_id = (response.get_json() or {}).get('job_id')
+        if job_id:
+            self.measure('작업 조회', 'GET /api/jobs/<job_id>', lambda: self.call('GET', f'/api/jobs/{job_id}', self.admin))
+        return self.results
+
+
+def print_results(results):
+    print(f"{'확인':<28} {'reads':>6} {'writes':>6} {'deletes':>7} {'queries':>7}  결과")
+    for result in results:
+        counts = result['counts']
+        status = '❌ ' + result['error'] if result['error'] else ('✅' if result['budget'] else '- (한도 없음)')
+        print(f"{result['name']:<28} {counts['reads']:>6} {counts['writes']:>6} {counts['deletes']:>7} "
+              f"{counts['queries']:>7}  {status}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_environment(args)
+
+    import flask_auth_server as server
+    server.verify_firebase_id_token = verify_fake_id_token
+    server.warm_up()
+
+    check = BudgetCheck(server, args.students)
+    check.setup()
+    results = check.run()
+    print_results(results)
+    failed = [result for result in results if result['error']]
+    if failed:
+        print(f"\n❌ {len(failed)}개 확인 실패")
+        return 1
+    print("\n✅ 모든 엔드포인트가 한도 안에 있습니다.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""
+Firestore 일괄 쓰기 엔진
+초기화/마이그레이션/정리 스크립트에서 문서 하나당 update()/delete() 한 번씩 하던 것을
+최대 500개 쓰기의 batch로 묶어 병렬(개수 제한) 커밋합니다.
+- 경합/일시적 오류는 지수 백오프로 재시도
+- progress 콜백으로 진행 상황 보고
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from google.api_core import exceptions as gcp_exceptions
+
+MAX_BATCH_WRITES = 500        # Firestore batch 한 번에 최대 쓰기 수
+DEFAULT_MAX_WORKERS = 4       # 동시에 커밋 중인 batch 수
+DEFAULT_MAX_RETRIES = 5
+BASE_BACKOFF_SECONDS = 0.5
+MAX_ERRORS_KEPT = 20
+
+RETRYABLE_ERRORS = (
+    gcp_exceptions.Aborted,
+    gcp_exceptions.DeadlineExceeded,
+    gcp_exceptions.ResourceExhausted,
+    gcp_exceptions.ServiceUnavailable,
+    gcp_exceptions.InternalServerError,
+)
+
+
+class BulkResult:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.processed = 0   # 처리한 문서 수
+        self.written = 0     # 커밋된 문서 수
+        self.skipped = 0     # op가 건너뛴 문서 수
+        self.failed = 0      # 실패한 문서 수
+        self.retries = 0     # 재시도한 batch 커밋 수
+        self.errors = []
+
+    def add(self, written=0, skipped=0, failed=0, retries=0, error=None):
+        with self._lock:
+            self.written += written
+            self.skipped += skipped
+            self.failed += failed
+            self.processed += written + skipped + failed
+            self.retries += retries
+            if error and len(self.errors) < MAX_ERRORS_KEPT:
+                self.errors.append(error)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'processed': self.processed,
+                'written': self.written,
+                'skipped': self.skipped,
+                'failed': self.failed,
+                'retries': self.retries,
+                'errors': list(self.errors),
+            }
+
+
+def bulk_apply(db, docs, op, writes_per_doc=1, max_workers=DEFAULT_MAX_WORKERS,
+               max_retries=DEFAULT_MAX_RETRIES, progress=None):
+    """
+    docs의 각 문서에 op(batch, doc)를 적용해 batch 단위로 커밋
+
+    Args:
+        docs: DocumentSnapshot/DocumentReference iterable (stream() 결과 그대로 가능)
+        op: batch에 쓰기를 추가하는 함수, False를 반환하면 해당 문서는 건너뜀
+        writes_per_doc: 문서 하나당 op가 추가하는 최대 쓰기 수 (batch 크기 계산용)
+        progress: progress(BulkResult.to_dict()) - batch 커밋마다 호출
+
+    Returns:
+        BulkResult
+    """
+    result = BulkResult()
+    chunk_size = max(1, MAX_BATCH_WRITES // writes_per_doc)
+    in_flight = threading.BoundedSemaphore(max_workers)
+
+    def commit_chunk(chunk):
+        try:
+            _commit_with_retry(db, chunk, op, max_retries, result)
+        finally:
+            in_flight.release()
+        if progress:
+            progress(result.to_dict())
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        chunk = []
+        for doc in docs:
+            chunk.append(doc)
+            if len(chunk) >= chunk_size:
+                in_flight.acquire()  # 스트리밍이 커밋보다 너무 앞서가지 않도록
+                executor.submit(commit_chunk, chunk)
+                chunk = []
+        if chunk:
+            in_flight.acquire()
+            executor.submit(commit_chunk, chunk)
+
+    return result
+
+
+def bulk_update(db, docs, fields, **kwargs):
+    """모든 문서에 같은 필드 업데이트"""
+    return bulk_apply(db, docs, lambda batch, doc: batch.update(_ref(doc), fields), **kwargs)
+
+
+def bulk_delete(db, docs, **kwargs):
+    """모든 문서 삭제"""
+    return bulk_apply(db, docs, lambda batch, doc: batch.delete(_ref(doc)), **kwargs)
+
+
+def _ref(doc):
+    return getattr(doc, 'reference', doc)
+
+
+def _commit_with_retry(db, chunk, op, max_retries, result):
+    retries = 0
+    while True:
+        # batch는 커밋 후 재사용할 수 없으므로 시도마다 새로 구성
+        batch = db.batch()
+        written, skipped, op_errors = 0, 0, []
+        for doc in chunk:
+            try:
+                if op(batch, doc) is False:
+                    skipped += 1
+                else:
+                    written += 1
+            except Exception as e:
+                op_errors.append(f"{_ref(doc).id}: {e}")
+
+        error = None
+        try:
+            if written:
+                batch.commit()
+        except RETRYABLE_ERRORS as e:
+            if retries < max_retries:
+                # 지수 백오프 + 지터
+                time.sleep(BASE_BACKOFF_SECONDS * (2 ** retries) * (0.5 + random.random()))
+                retries += 1
+                continue
+            error = f"batch 커밋 실패 ({retries}회 재시도): {e}"
+        except Exception as e:
+            error = f"batch 커밋 실패: {e}"
+
+        for op_error in op_errors:
+            result.add(failed=1, error=op_error)
+        if error:
+            result.add(skipped=skipped, failed=written, retries=retries, error=error)
+        else:
+            result.add(written=written, skipped=skipped, retries=retries)
+        return
@@ -0,0 +1,66 @@
+"""
+응답 압축 (Accept-Encoding 협상: br > gzip)
+- JSON/NDJSON/텍스트 응답 중 MIN_SIZE 이상인 것만 압축 (작은 응답은 압축해도 이득이 없음)
+- br은 brotli 패키지가 설치되어 있을 때만 (선택 의존성, 없으면 gzip)
+- 스트리밍 응답(/api/events SSE, format=ndjson)은 건드리지 않음 (청크가 바로 전달되어야 함)
+ETag는 약한 ETag(W/)라 압축 여부와 관계없이 그대로 써도 됩니다.
+"""
+
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5      # 11(최대)은 응답마다 압축하기엔 너무 느림
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/')
+
+
+def supported_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def choose_encoding(accept_encodings):
+    """
+    Args:
+        accept_encodings: request.accept_encodings (werkzeug Accept)
+    Returns:
+        str or None: 'br' | 'gzip' (클라이언트 q값이 같으면 br 우선)
+    """
+    best, best_quality = None, 0
+    for encoding in supported_encodings():
+        quality = accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+def is_compressible(response):
+    return (response.status_code == 200
+            and not response.direct_passthrough
+            and not response.is_streamed
+            and 'Content-Encoding' not in response.headers
+            and (response.mimetype or '').startswith(COMPRESSIBLE_TYPES))
+
+
+def compress_response(response, accept_encodings):
+    """after_request용: 협상한 인코딩으로 본문 압축 (해당 없으면 그대로)"""
+    if not is_compressible(response):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(accept_encodings)
+    data = response.get_data()
+    if encoding is None or len(data) < MIN_SIZE:
+        return response
+    response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
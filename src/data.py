@@ -1,13 +1,10 @@
 # migrate_firestore.py
-import firebase_admin
-from firebase_admin import credentials, firestore
+from firebase_clients import initialize_firebase, get_db
 import json
 
 # Firebase Admin SDK 초기화
-cred = credentials.Certificate("serviceAccountKey.json")
-firebase_admin.initialize_app(cred)
-
-db = firestore.client()
+initialize_firebase("serviceAccountKey.json")
+db = get_db()
 
 # 스탬프 부스 목록
 STAMP_BOOTHS = [f"booth{i}" for i in range(1, 35)]
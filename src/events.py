@@ -0,0 +1,179 @@
+"""
+프로세스 내 이벤트 버스 (SSE /api/events 용)
+스탬프/역할 변경을 구독자(연결)별 큐로 나눠 줍니다. Firestore 리스너를 연결마다 만들지 않습니다.
+- 사용자 구독: 자기 uid 이벤트만
+- 관리자 구독(include_all): 모든 사용자 이벤트
+- 큐가 가득 찬 느린 구독자는 끊음 → 클라이언트가 재연결하면서 프로필을 다시 받음
+- UserChangeFeed: 저장소의 사용자 변경 구독(storage.watch_users)으로 버스를 채움
+  → 여러 워커로 실행해도 모든 워커의 버스가 모든 워커의 변경을 봄
+  (구독을 지원하지 않는 저장소(memory)에서는 요청을 처리한 워커가 직접 발행)
+"""
+
+import itertools
+import json
+import queue
+import threading
+
+from stamp_codec import STAMP_IDS, count_stamps, user_stamp_bits
+
+DEFAULT_QUEUE_SIZE = 100
+HEARTBEAT_SECONDS = 15
+
+
+def format_sse(event, data, event_id=None):
+    """SSE 메시지 한 개 (data는 JSON으로 직렬화)"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
+class Subscription:
+    def __init__(self, bus, uid, include_all, queue_size):
+        self._bus = bus
+        self.uid = uid
+        self.include_all = include_all
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.closed = False
+
+    def get(self, timeout=HEARTBEAT_SECONDS):
+        """다음 이벤트 (timeout 동안 없으면 None)"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self._bus.unsubscribe(self)
+
+
+class EventBus:
+    def __init__(self, queue_size=DEFAULT_QUEUE_SIZE):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._ids = itertools.count(1)
+        self.queue_size = queue_size
+        self.published = 0
+        self.dropped_subscribers = 0
+
+    def subscribe(self, uid, include_all=False):
+        subscription = Subscription(self, uid, include_all, self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+        subscription.closed = True
+
+    def publish(self, event, data, uid=None):
+        """
+        이벤트 발행 (uid가 None이면 전체 구독자에게)
+
+        Returns:
+            int: 전달된 구독자 수
+        """
+        with self._lock:
+            event_id = next(self._ids)
+            self.published += 1
+            targets = [s for s in self._subscribers if uid is None or s.include_all or s.uid == uid]
+
+        message = (event_id, event, data)
+        delivered = 0
+        for subscription in targets:
+            try:
+                subscription.queue.put_nowait(message)
+                delivered += 1
+            except queue.Full:
+                # ✅ 느린 구독자 하나가 발행을 막지 않도록 끊음
+                self.unsubscribe(subscription)
+                with self._lock:
+                    self.dropped_subscribers += 1
+        return delivered
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': len(self._subscribers),
+                'published': self.published,
+                'dropped_subscribers': self.dropped_subscribers,
+            }
+
+
+def stamp_event(uid, stamp_bits, stamp_id=None, value=None):
+    """'stamp' 이벤트 데이터 (여러 스탬프가 한 번에 바뀌면 stamp_id/value 없이 stamp_bits만)"""
+    return {
+        'uid': uid,
+        'stamp_id': stamp_id,
+        'value': value,
+        'stamp_bits': stamp_bits,
+        'stamp_count': count_stamps(stamp_bits)
+    }
+
+
+class UserChangeFeed:
+    """
+    저장소 사용자 변경 → 이벤트 버스 (워커마다 하나)
+    사용자별 마지막 (스탬프 비트, 역할)과 비교해 달라진 것만 발행합니다. (처음 받은 상태는 기준으로만 기록)
+    """
+
+    def __init__(self, bus):
+        self.bus = bus
+        self._lock = threading.Lock()
+        self._known = {}        # uid → (stamp_bits, role)
+        self._unsubscribe = None
+        self.changes = 0
+
+    @property
+    def active(self):
+        return self._unsubscribe is not None
+
+    def start(self, storage):
+        """
+        Returns:
+            bool: 구독 시작 여부 (저장소가 지원하지 않으면 False → 직접 발행)
+        """
+        if self.active:
+            return True
+        self._unsubscribe = storage.watch_users(self.on_change)
+        return self.active
+
+    def stop(self):
+        if self._unsubscribe:
+            self._unsubscribe()
+            self._unsubscribe = None
+
+    def on_change(self, uid, user_data):
+        stamp_bits, role = user_stamp_bits(user_data), user_data.get('role')
+        with self._lock:
+            previous = self._known.get(uid)
+            self._known[uid] = (stamp_bits, role)
+        if previous is None:
+            return
+        previous_bits, previous_role = previous
+
+        changed_bits = previous_bits ^ stamp_bits
+        if changed_bits:
+            self.changes += 1
+            if changed_bits & (changed_bits - 1) == 0:
+                # 스탬프 하나 (부여/회수)
+                stamp_id = STAMP_IDS[changed_bits.bit_length() - 1]
+                data = stamp_event(uid, stamp_bits, stamp_id, bool(stamp_bits & changed_bits))
+            else:
+                data = stamp_event(uid, stamp_bits)
+            self.bus.publish('stamp', data, uid=uid)
+        if role != previous_role:
+            self.changes += 1
+            self.bus.publish('role', {'uid': uid, 'role': role}, uid=uid)
+
+    def stats(self):
+        with self._lock:
+            known = len(self._known)
+        return {'active': self.active, 'users': known, 'changes': self.changes}
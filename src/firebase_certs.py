@@ -0,0 +1,126 @@
+"""
+Firebase ID 토큰 서명 인증서 캐시
+Google 공개 인증서를 미리 받아 두고 Cache-Control max-age에 맞춰 백그라운드에서 갱신합니다.
+로그인 요청이 인증서 다운로드를 기다리지 않도록 하기 위함입니다.
+"""
+
+import json
+import re
+import threading
+import time
+import urllib.request
+
+from firebase_admin import auth
+from google.auth import jwt as google_jwt
+
+CERTS_URL = 'https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com'
+DEFAULT_MAX_AGE_SECONDS = 3600
+MIN_REFRESH_SECONDS = 60
+REFRESH_AT = 0.8           # max-age의 80%가 지나면 미리 갱신
+FETCH_TIMEOUT_SECONDS = 10
+CLOCK_SKEW_SECONDS = 5
+ALGORITHM = 'RS256'
+
+
+def parse_max_age(cache_control):
+    match = re.search(r'max-age=(\d+)', cache_control or '')
+    return int(match.group(1)) if match else DEFAULT_MAX_AGE_SECONDS
+
+
+class CertCache:
+    def __init__(self, url=CERTS_URL):
+        self._lock = threading.Lock()
+        self._refresher = None
+        self.url = url
+        self.certs = None
+        self.expires_at = 0.0
+        self.refresh_at = 0.0
+        self.fetches = 0
+
+    def refresh(self):
+        """인증서 다운로드 (max-age 만큼 유효)"""
+        with urllib.request.urlopen(self.url, timeout=FETCH_TIMEOUT_SECONDS) as response:
+            certs = json.loads(response.read().decode())
+            max_age = parse_max_age(response.headers.get('Cache-Control'))
+        now = time.monotonic()
+        with self._lock:
+            self.certs = certs
+            self.expires_at = now + max_age
+            self.refresh_at = now + max(MIN_REFRESH_SECONDS, max_age * REFRESH_AT)
+            self.fetches += 1
+        return max_age
+
+    def get(self, force_refresh=False):
+        with self._lock:
+            fresh = self.certs is not None and time.monotonic() < self.expires_at
+        if force_refresh or not fresh:
+            self.refresh()
+        return self.certs
+
+    def start(self):
+        """
+        만료 전에 계속 갱신하는 데몬 스레드 시작
+        (get()으로 이미 받아 둔 인증서가 있으면 다시 받지 않고 갱신 시각까지 기다림)
+        """
+        if self._refresher and self._refresher.is_alive():
+            return
+        self._refresher = threading.Thread(target=self._refresh_loop, name='firebase-certs', daemon=True)
+        self._refresher.start()
+
+    def _refresh_loop(self):
+        while True:
+            with self._lock:
+                delay = self.refresh_at - time.monotonic() if self.certs is not None else 0
+            if delay > 0:
+                time.sleep(delay)
+                continue
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Firebase cert refresh error: {e}")
+                time.sleep(MIN_REFRESH_SECONDS)
+
+
+def verify_id_token(id_token, project_id, cert_cache):
+    """
+    캐시된 인증서로 Firebase ID 토큰 검증 (auth.verify_id_token과 같은 검사)
+
+    Returns:
+        dict: 디코딩된 토큰 (uid 포함)
+    Raises:
+        auth.ExpiredIdTokenError, auth.InvalidIdTokenError
+    """
+    issuer = f'https://securetoken.google.com/{project_id}'
+    try:
+        header = google_jwt.decode_header(id_token)
+    except (ValueError, TypeError) as e:
+        raise auth.InvalidIdTokenError(f'Invalid Firebase ID token: {e}', e)
+    # firebase-admin과 같은 헤더 검사 (다른 알고리즘/kid 없는 토큰은 서명 확인 전에 거부)
+    if header.get('alg') != ALGORITHM:
+        raise auth.InvalidIdTokenError(f'Firebase ID token has incorrect algorithm: {header.get("alg")}')
+    if not header.get('kid'):
+        raise auth.InvalidIdTokenError('Firebase ID token has no "kid" claim.')
+
+    try:
+        try:
+            claims = google_jwt.decode(id_token, certs=cert_cache.get(), audience=project_id,
+                                       clock_skew_in_seconds=CLOCK_SKEW_SECONDS)
+        except ValueError as e:
+            if 'Certificate for key id' not in str(e):
+                raise
+            # 키가 교체된 직후 → 인증서를 다시 받아 한 번 더 시도
+            claims = google_jwt.decode(id_token, certs=cert_cache.get(force_refresh=True),
+                                       audience=project_id, clock_skew_in_seconds=CLOCK_SKEW_SECONDS)
+    except ValueError as e:
+        if 'expired' in str(e).lower():
+            raise auth.ExpiredIdTokenError(f'Firebase ID token has expired: {e}', e)
+        raise auth.InvalidIdTokenError(f'Invalid Firebase ID token: {e}', e)
+
+    if claims.get('iss') != issuer:
+        raise auth.InvalidIdTokenError(f'Firebase ID token has incorrect "iss" claim: {claims.get("iss")}')
+    subject = claims.get('sub')
+    if not isinstance(subject, str) or not subject or len(subject) > 128:
+        raise auth.InvalidIdTokenError('Firebase ID token has invalid "sub" claim.')
+
+    claims['uid'] = subject
+    return claims
@@ -0,0 +1,89 @@
+"""
+Firebase Admin 앱 / Firestore 클라이언트 (프로세스별 지연 생성)
+- 서버: FIREBASE_SERVICE_ACCOUNT_JSON 환경 변수
+- 관리 스크립트: serviceAccountKey.json 파일
+gRPC 채널은 fork 후 공유하면 안 되므로 클라이언트는 처음 사용하는 프로세스에서 만들고,
+fork된 자식 프로세스에서는 버리고 다시 만듭니다. (gunicorn --preload 대응)
+"""
+
+import json
+import os
+import threading
+
+import firebase_admin
+from firebase_admin import credentials
+from google.cloud import firestore as gcloud_firestore
+
+_lock = threading.Lock()
+_client = None
+_client_pid = None
+_unavailable = False   # 이 프로세스에서 초기화가 이미 실패함 (요청마다 다시 시도/출력하지 않음)
+
+
+def initialize_firebase(service_account_path=None):
+    """
+    Firebase Admin 앱 초기화 (이미 초기화되어 있으면 그대로 사용)
+
+    Args:
+        service_account_path: 서비스 계정 키 파일 경로 (없으면 FIREBASE_SERVICE_ACCOUNT_JSON 사용)
+    Returns:
+        bool: 초기화 성공 여부
+    """
+    if firebase_admin._apps:
+        return True
+    try:
+        if service_account_path:
+            cred = credentials.Certificate(service_account_path)
+        else:
+            service_account_json = os.environ.get('FIREBASE_SERVICE_ACCOUNT_JSON')
+            if not service_account_json:
+                print("❌ FIREBASE_SERVICE_ACCOUNT_JSON environment variable not found")
+                return False
+            cred = credentials.Certificate(json.loads(service_account_json))
+        firebase_admin.initialize_app(cred)
+        print("✅ Firebase Admin SDK initialized")
+        return True
+    except ValueError:
+        # 다른 스레드가 먼저 초기화함
+        return bool(firebase_admin._apps)
+    except Exception as e:
+        print(f"❌ Firebase initialization failed: {e}")
+        return False
+
+
+def get_db():
+    """현재 프로세스의 Firestore 클라이언트 (없으면 생성, 초기화 실패 시 None)"""
+    global _client, _client_pid, _unavailable
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+    if _unavailable:
+        return None
+    with _lock:
+        if _client is None or _client_pid != pid:
+            if not initialize_firebase():
+                _unavailable = True
+                return None
+            try:
+                # firestore.client()는 앱에 클라이언트를 캐시하므로 fork 후에도 같은 채널을 돌려줌 → 직접 생성
+                app = firebase_admin.get_app()
+                _client = gcloud_firestore.Client(credentials=app.credential.get_credential(),
+                                                  project=app.project_id)
+                _client_pid = pid
+            except Exception as e:
+                print(f"Firestore client error: {e}")
+                return None
+    return _client
+
+
+def _forget_client():
+    # fork된 자식은 부모의 gRPC 채널을 쓰지 않음
+    global _client, _client_pid, _unavailable, _lock
+    _client = None
+    _client_pid = None
+    _unavailable = False
+    _lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_client)
@@ -0,0 +1,481 @@
+"""
+Firestore 저장소 (운영 기본값)
+- users/{uid}                        : 사용자 문서 (스탬프는 STAMP_STORAGE 방식: map | bitmask)
+- user_index/{email}                 : 이메일 → uid 인덱스
+- stamp_grants / stamp_grant_keys    : 부장 부여 기록 (grant_ledger.py)
+- stats_shards                       : 통계 카운터 샤드 (stats_counters.py)
+- jobs, job_leases, audit_log        : 작업 상태, 작업 종류별 임대 (워커 간 exclusive), 감사 로그
+클라이언트는 firebase_clients.get_db()로 프로세스마다 만듭니다.
+"""
+
+import os
+import time
+
+from firebase_admin import firestore
+from google.api_core import exceptions as gcp_exceptions
+
+from bulk_writes import bulk_update, bulk_delete, MAX_BATCH_WRITES
+from firebase_clients import get_db
+from grant_ledger import GRANTS_COLLECTION, GRANT_KEYS_COLLECTION, grant_ref, grant_key_ref, grant_key_data
+from stamp_codec import STAMP_IDS, STORAGE_MAP, STORAGE_BITMASK, bits_to_stamps, stamp_bit, user_stamp_bits
+from stats_counters import NUM_SHARDS, StatsDelta, read_stats, reset_stats, rebuild_stats
+from storage import Storage, UserNotFound, GrantExists, EmailInUse, TransactionContention, select_fields
+from storage_ops import count_ops, count_stream
+from user_index import INDEX_COLLECTION, index_entry, normalize_email
+
+USERS_COLLECTION = 'users'
+JOBS_COLLECTION = 'jobs'
+JOB_LEASES_COLLECTION = 'job_leases'
+AUDIT_COLLECTION = 'audit_log'
+
+
+class FirestoreStorage(Storage):
+    name = 'firestore'
+
+    def __init__(self, stamp_storage=None):
+        # 스탬프 저장 방식: map (stamps.stamp1~34 불리언 맵, 기본) | bitmask (stamp_bits 정수 하나)
+        self.stamp_storage = stamp_storage or os.environ.get('STAMP_STORAGE', STORAGE_MAP)
+
+    @property
+    def db(self):
+        return get_db()
+
+    def available(self):
+        return get_db() is not None
+
+    def ping(self):
+        self.db.collection(INDEX_COLLECTION).limit(1).get()
+        count_ops(queries=1, reads=1)
+        return True
+
+    def user_ref(self, uid):
+        return self.db.collection(USERS_COLLECTION).document(uid)
+
+    # ---- 스탬프 필드 (저장 방식별) ----
+    def default_stamp_fields(self):
+        """새 사용자용 스탬프 필드 (저장 방식에 따라)"""
+        if self.stamp_storage == STORAGE_BITMASK:
+            return {'stamp_bits': 0}
+        return {'stamps': {stamp: False for stamp in STAMP_IDS}}
+
+    def reset_stamp_fields(self):
+        """초기화용 스탬프 필드 (다른 방식으로 저장된 필드는 삭제)"""
+        fields = self.default_stamp_fields()
+        other_field = 'stamps' if self.stamp_storage == STORAGE_BITMASK else 'stamp_bits'
+        fields[other_field] = firestore.DELETE_FIELD
+        return fields
+
+    def stamp_write_fields(self, user_data, stamp_id, value):
+        """
+        스탬프 하나를 변경하는 업데이트 필드
+        - bitmask: stamp_bits 필드 하나
+        - map: stamps.{stamp_id} 필드 하나
+        저장 방식이 바뀐 문서, 구버전 booth{n} 키가 남은 문서는 이번 쓰기에서 현재 방식으로 변환됩니다.
+        (booth 키를 남겨 두면 stamps_to_bits가 그 비트를 계속 켜서 회수가 반영되지 않음)
+        """
+        bits = changed_stamp_bits(user_data, stamp_id, value)
+
+        if self.stamp_storage == STORAGE_BITMASK:
+            fields = {'stamp_bits': bits}
+            if 'stamps' in user_data:
+                fields['stamps'] = firestore.DELETE_FIELD
+        elif 'stamp_bits' in user_data:
+            fields = {'stamps': bits_to_stamps(bits), 'stamp_bits': firestore.DELETE_FIELD}
+        elif has_legacy_stamp_keys(user_data):
+            fields = {'stamps': bits_to_stamps(bits)}
+        else:
+            fields = {f'stamps.{stamp_id}': value}
+        return fields
+
+    def with_stamp(self, user_data, stamp_id, value):
+        """스탬프 변경 후의 사용자 문서 내용 (프로필 캐시 갱신용)"""
+        bits = changed_stamp_bits(user_data, stamp_id, value)
+        updated = {k: v for k, v in user_data.items() if k not in ('stamps', 'stamp_bits')}
+        if self.stamp_storage == STORAGE_BITMASK:
+            updated['stamp_bits'] = bits
+        else:
+            updated['stamps'] = bits_to_stamps(bits)
+        return updated
+
+    # ---- 사용자 ----
+    def get_user(self, uid):
+        user_ref = self.user_ref(uid)
+        user_doc = user_ref.get()
+        count_ops(reads=1)
+        if not user_doc.exists:
+            return None
+        user_data = user_doc.to_dict()
+        if 'stamps' not in user_data and 'stamp_bits' not in user_data:
+            # 스탬프 필드가 없는 예전 문서 → 기본값으로 보충
+            stamp_fields = self.default_stamp_fields()
+            user_ref.update(stamp_fields)
+            count_ops(writes=1)
+            user_data = {**user_data, **stamp_fields}
+        return user_data
+
+    def watch_users(self, on_change):
+        """
+        users 컬렉션 on_snapshot 리스너 (워커당 하나)
+        처음 스냅샷에서 사용자 수만큼, 이후 바뀐 문서마다 읽기 1회 (연결마다 리스너를 만들지 않음)
+        """
+        def on_snapshot(_, changes, read_time):
+            for change in changes:
+                if change.type.name == 'REMOVED':
+                    continue
+                try:
+                    on_change(change.document.id, change.document.to_dict())
+                except Exception as e:
+                    print(f"User watch callback error: {e}")
+
+        watch = self.db.collection(USERS_COLLECTION).on_snapshot(on_snapshot)
+        return watch.unsubscribe
+
+    def get_users(self, uids):
+        if not uids:
+            return {}
+        snapshots = self.db.get_all([self.user_ref(uid) for uid in uids])
+        count_ops(reads=len(uids))
+        return {doc.id: (doc.to_dict(), doc.update_time) for doc in snapshots if doc.exists}
+
+    def create_user(self, uid, user_data):
+        """
+        사용자 문서 + 인덱스 + 통계를 한 번의 batch 커밋으로 생성 (create → 이미 있으면 실패)
+        인덱스도 create → 같은 이메일의 다른 uid 사용자가 있으면 EmailInUse,
+        인덱스가 이미 없는 사용자를 가리키면 새 uid로 다시 가리키고 한 번 더 시도
+        """
+        db = self.db
+        new_user = {
+            **user_data,
+            **self.default_stamp_fields(),
+            'created_at': firestore.SERVER_TIMESTAMP
+        }
+        email = normalize_email(user_data['email'])
+        index_ref = db.collection(INDEX_COLLECTION).document(email)
+        for repoint in (False, True):
+            batch = db.batch()
+            batch.create(self.user_ref(uid), new_user)
+            if repoint:
+                batch.set(index_ref, index_entry(email, uid))
+            else:
+                batch.create(index_ref, index_entry(email, uid))
+            stats_delta = StatsDelta()
+            stats_delta.user_created()
+            stats_delta.write(db, batch)
+            try:
+                batch.commit()
+                break
+            except gcp_exceptions.AlreadyExists:
+                if repoint:
+                    return None     # 그 사이 같은 uid로 생성됨
+            # 사용자 문서와 인덱스 중 무엇이 이미 있었는지 확인
+            index_doc = index_ref.get()
+            count_ops(reads=1)
+            existing_uid = index_doc.to_dict().get('uid') if index_doc.exists else None
+            if not existing_uid or existing_uid == uid:
+                return None         # 이 uid의 사용자 문서가 이미 있음
+            existing_user = self.user_ref(existing_uid).get()
+            count_ops(reads=1)
+            if existing_user.exists:
+                raise EmailInUse(email, existing_uid)
+        count_ops(writes=3)
+        # created_at은 서버 타임스탬프 센티널이므로 돌려주지 않음
+        return {k: v for k, v in new_user.items() if k != 'created_at'}
+
+    def update_user(self, uid, fields):
+        try:
+            self.user_ref(uid).update(fields)
+            count_ops(writes=1)
+        except gcp_exceptions.NotFound:
+            raise UserNotFound(uid)
+
+    def list_users(self, page_size=None, cursor=None, fields=None):
+        """users 컬렉션을 문서 ID 순으로 스트리밍 (커서 다음부터, select()로 선택한 필드만)"""
+        db = self.db
+        query = db.collection(USERS_COLLECTION).order_by(firestore.FieldPath.document_id())
+        if fields:
+            # stamps 요청 시 저장 방식과 관계없이 읽을 수 있도록 두 필드 모두 선택
+            fields_to_read = set(fields) - {'id'}
+            if 'stamps' in fields_to_read or 'stamp_bits' in fields_to_read:
+                fields_to_read |= {'stamps', 'stamp_bits'}
+            query = query.select(sorted(fields_to_read))
+        if cursor:
+            query = query.start_after({firestore.FieldPath.document_id(): self.user_ref(cursor)})
+        if page_size:
+            query = query.limit(page_size)
+        count_ops(queries=1)
+        return ((doc.id, select_fields(doc.to_dict(), fields)) for doc in count_stream(query.stream()))
+
+    # ---- 이메일 인덱스 ----
+    def get_index_uids(self, emails):
+        if not emails:
+            return {}
+        db = self.db
+        index_refs = [db.collection(INDEX_COLLECTION).document(email) for email in emails]
+        count_ops(reads=len(index_refs))
+        return {doc.id: doc.to_dict().get('uid') for doc in db.get_all(index_refs)
+                if doc.exists and doc.to_dict().get('uid')}
+
+    def find_uid_by_email(self, email):
+        """인덱스가 생기기 전에 가입한 사용자: 쿼리 한 번 + 인덱스 보충"""
+        legacy_docs = self.db.collection(USERS_COLLECTION).where('email', '==', email).limit(1).get()
+        count_ops(queries=1, reads=1)   # 결과가 없어도 읽기 1회로 과금
+        uid = legacy_docs[0].id if legacy_docs else None
+        if uid:
+            self.write_index_entry(email, uid)
+        return uid
+
+    def write_index_entry(self, email, uid):
+        self.db.collection(INDEX_COLLECTION).document(normalize_email(email)).set(index_entry(email, uid))
+        count_ops(writes=1)
+
+    def iter_index(self, limit=None):
+        query = self.db.collection(INDEX_COLLECTION).select(['uid'])
+        if limit:
+            query = query.limit(limit)
+        count_ops(queries=1)
+        for index_doc in count_stream(query.stream()):
+            uid = index_doc.to_dict().get('uid')
+            if uid:
+                yield index_doc.id, uid
+
+    # ---- 스탬프 ----
+    def change_stamp(self, uid, target_email, value, choose_stamp, manager_email=None, attempts=None):
+        attempts = attempts if attempts is not None else [0]
+        writes = {}
+        try:
+            result = _change_stamp_transaction(self.db.transaction(), self, attempts, uid, target_email,
+                                               value, choose_stamp, manager_email, writes)
+            # 읽기는 시도마다 과금, 쓰기는 커밋된 마지막 시도만
+            count_ops(**writes)
+            return result
+        except gcp_exceptions.AlreadyExists:
+            # ✅ 부여 기록 create() 실패 = 이 부장이 이미 이 대상에게 부여함
+            raise GrantExists(self.get_manager_grants(manager_email, [target_email]).get(target_email))
+        except (gcp_exceptions.Aborted, ValueError) as e:
+            # 재시도 한도를 넘긴 경합 (ValueError: "Failed to commit transaction in N attempts")
+            raise TransactionContention(str(e)) from e
+
+    def get_manager_grants(self, manager_email, target_emails):
+        """stamp_grants/{manager}|{target} 포인트 조회 (get_all 한 번)"""
+        if not target_emails:
+            return {}
+        db = self.db
+        snapshots = db.get_all([grant_ref(db, manager_email, email) for email in target_emails])
+        count_ops(reads=len(target_emails))
+        return {doc.to_dict().get('target_email'): doc.to_dict().get('stamp_id')
+                for doc in snapshots if doc.exists}
+
+    def commit_grants(self, grants, manager_email=None):
+        """
+        batch로 커밋 (사용자 문서는 last_update_time 전제 조건, 부여 기록은 create)
+        batch 하나가 충돌하면 그 batch의 대상 전체를 conflicted로 돌려줌
+        """
+        db = self.db
+        updated, conflicted = {}, []
+        writes_per_target = 3 if manager_email else 1
+        chunk_size = (MAX_BATCH_WRITES - 1) // writes_per_target  # 1: 통계 카운터 샤드
+        for start in range(0, len(grants), chunk_size):
+            chunk = grants[start:start + chunk_size]
+            batch = db.batch()
+            stats_delta = StatsDelta()
+            for uid, target_email, user_data, update_time, stamp_id in chunk:
+                batch.update(self.user_ref(uid), self.stamp_write_fields(user_data, stamp_id, True),
+                             option=db.write_option(last_update_time=update_time))
+                stamp_bits = user_stamp_bits(user_data)
+                stats_delta.stamps_changed(stamp_bits, stamp_bits | stamp_bit(stamp_id))
+                if manager_email:
+                    add_grant_record(db, batch, manager_email, target_email, stamp_id)
+                    stats_delta.manager_grant(manager_email)
+            stats_written = stats_delta.write(db, batch)
+
+            try:
+                batch.commit()
+            except (gcp_exceptions.FailedPrecondition, gcp_exceptions.AlreadyExists, gcp_exceptions.Aborted) as e:
+                # ✅ 읽은 뒤 다른 요청이 대상 문서/부여 기록을 바꿈
+                print(f"Batch grant conflict: {e}")
+                conflicted.extend(uid for uid, *_ in chunk)
+                continue
+            count_ops(writes=len(chunk) * writes_per_target + int(stats_written))
+            for uid, _, user_data, _, stamp_id in chunk:
+                updated[uid] = self.with_stamp(user_data, stamp_id, True)
+        return updated, conflicted
+
+    # ---- 통계 ----
+    def read_stats(self):
+        count_ops(reads=NUM_SHARDS)
+        return read_stats(self.db)
+
+    def rebuild_stats(self):
+        db = self.db
+        users = db.collection(USERS_COLLECTION).select(['stamps', 'stamp_bits']).stream()
+        grants = db.collection(GRANTS_COLLECTION).select(['manager_email']).stream()
+        count_ops(queries=2, writes=1, deletes=NUM_SHARDS - 1)     # 스캔 2회 + write_baseline
+        return rebuild_stats(db,
+                             (user_stamp_bits(doc.to_dict()) for doc in count_stream(users)),
+                             (doc.to_dict().get('manager_email') for doc in count_stream(grants)))
+
+    # ---- 전체 초기화 ----
+    def reset_all_stamps(self, progress=None):
+        """
+        1. 모든 사용자의 스탬프 필드 초기화
+        2. stamp_grants 컬렉션의 모든 문서 삭제 (보조 키 포함)
+        문서 ID만 읽고(select([])) batch 단위로 일괄 커밋합니다.
+        """
+        db = self.db
+
+        def report(stage):
+            return (lambda counts: progress(stage, counts)) if progress else None
+
+        users = db.collection(USERS_COLLECTION).select([]).stream()
+        user_result = bulk_update(db, users, self.reset_stamp_fields(), progress=report('users'))
+
+        grants = db.collection(GRANTS_COLLECTION).select([]).stream()
+        grant_result = bulk_delete(db, grants, progress=report('grants'))
+
+        keys = db.collection(GRANT_KEYS_COLLECTION).select([]).stream()
+        key_result = bulk_delete(db, keys, progress=report('grant_keys'))
+
+        # ✅ 통계 카운터: 모든 사용자 스탬프 0개, 부여 기록 없음
+        reset_stats(db, user_result.processed)
+        count_ops(queries=3,
+                  reads=user_result.processed + grant_result.processed + key_result.processed,
+                  writes=user_result.written + 1,
+                  deletes=grant_result.written + key_result.written + NUM_SHARDS - 1)
+
+        failed = user_result.failed + grant_result.failed + key_result.failed
+        if failed:
+            print(f"Reset all stamps: {failed} writes failed (통계가 실제와 다를 수 있음 → /api/stats/rebuild)")
+        return {
+            'users_reset': user_result.written,
+            'grants_deleted': grant_result.written,
+            'failed': failed,
+            'errors': (user_result.errors + grant_result.errors + key_result.errors)[:20]
+        }
+
+    # ---- 작업 / 감사 로그 ----
+    def save_job(self, job_data):
+        self.db.collection(JOBS_COLLECTION).document(job_data['job_id']).set(job_data)
+        count_ops(writes=1)
+
+    def get_job(self, job_id):
+        job_doc = self.db.collection(JOBS_COLLECTION).document(job_id).get()
+        count_ops(reads=1)
+        return job_doc.to_dict() if job_doc.exists else None
+
+    def acquire_job_lease(self, kind, job_id, seconds):
+        lease_ref = self.db.collection(JOB_LEASES_COLLECTION).document(kind)
+        return _acquire_lease_transaction(self.db.transaction(), lease_ref, job_id, seconds)
+
+    def release_job_lease(self, kind, job_id):
+        lease_ref = self.db.collection(JOB_LEASES_COLLECTION).document(kind)
+        _release_lease_transaction(self.db.transaction(), lease_ref, job_id)
+
+    def append_audit(self, events):
+        db = self.db
+        batch = db.batch()
+        for event in events:
+            # 문서 ID = event_id → 재시도해도 중복 기록되지 않음
+            batch.set(db.collection(AUDIT_COLLECTION).document(event['event_id']), event)
+        batch.commit()
+        count_ops(writes=len(events))
+
+
+def changed_stamp_bits(user_data, stamp_id, value):
+    bits = user_stamp_bits(user_data)
+    return bits | stamp_bit(stamp_id) if value else bits & ~stamp_bit(stamp_id)
+
+
+def add_grant_record(db, writer, manager_email, target_email, stamp_id):
+    """
+    스탬프 부여 내역을 writer(트랜잭션 또는 batch)에 추가
+    - stamp_grants/{manager}|{target} 를 create() → 이미 있으면 커밋 실패 (1인당 1회 제한)
+    - stamp_grant_keys/{target}|{stamp_id} 보조 키 (회수 시 포인트 삭제용)
+    """
+    grant_data = {
+        'manager_email': manager_email,
+        'target_email': target_email,
+        'stamp_id': stamp_id,
+        'granted_at': firestore.SERVER_TIMESTAMP
+    }
+    writer.create(grant_ref(db, manager_email, target_email), grant_data)
+    writer.set(grant_key_ref(db, target_email, stamp_id), grant_key_data(manager_email, target_email, stamp_id))
+
+
+def has_legacy_stamp_keys(user_data):
+    return any(key.startswith('booth') for key in (user_data.get('stamps') or {}))
+
+
+@firestore.transactional
+def _change_stamp_transaction(transaction, storage, attempts, uid, target_email, value, choose_stamp, manager_email,
+                              writes):
+    """
+    스탬프 부여/회수를 한 트랜잭션으로 처리
+    사용자 문서 업데이트와 stamp_grants 기록, 통계 카운터가 함께 커밋됩니다.
+    (경합 시 Firestore가 이 함수 전체를 다시 실행함)
+    writes: 이번 시도의 쓰기/삭제 수 (커밋 성공 시 change_stamp가 집계)
+    """
+    attempts[0] += 1
+    db = storage.db
+    user_ref = storage.user_ref(uid)
+
+    # 1. 읽기 (트랜잭션에서는 모든 읽기가 쓰기보다 먼저 와야 함)
+    target_doc = user_ref.get(transaction=transaction)
+    count_ops(reads=1)
+    if not target_doc.exists:
+        raise UserNotFound(uid)
+    target_data = target_doc.to_dict()
+    stamp_bits = user_stamp_bits(target_data)
+    stamp_id = choose_stamp(stamp_bits)
+    stats_delta = StatsDelta()
+
+    key_doc = None
+    if not value:
+        # ✅ 회수 시 grant 기록도 같은 트랜잭션에서 삭제 (보조 키로 포인트 조회)
+        key_ref = grant_key_ref(db, target_email, stamp_id)
+        key_doc = key_ref.get(transaction=transaction)
+        count_ops(reads=1)
+
+    # 2. 쓰기: 스탬프 필드 하나만 갱신 + 부장 부여 내역
+    transaction.update(user_ref, storage.stamp_write_fields(target_data, stamp_id, value))
+    updated_user = storage.with_stamp(target_data, stamp_id, value)
+    if value and manager_email:
+        # ✅ 1인당 1회 제한은 부여 기록 create()가 보장 (이미 있으면 커밋 실패 → GrantExists)
+        add_grant_record(db, transaction, manager_email, target_email, stamp_id)
+        stats_delta.manager_grant(manager_email)
+    if key_doc is not None and key_doc.exists:
+        key_data = key_doc.to_dict()
+        transaction.delete(db.collection(GRANTS_COLLECTION).document(key_data.get('grant_id')))
+        transaction.delete(key_ref)
+        stats_delta.manager_grant(key_data.get('manager_email'), -1)
+
+    # 3. 통계 카운터 증감도 같은 커밋으로
+    stats_delta.stamps_changed(stamp_bits, user_stamp_bits(updated_user))
+    stats_written = stats_delta.write(db, transaction)
+
+    writes.clear()
+    writes['writes'] = 1 + (2 if value and manager_email else 0) + int(stats_written)
+    writes['deletes'] = 2 if key_doc is not None and key_doc.exists else 0
+    return stamp_id, updated_user
+
+
+@firestore.transactional
+def _acquire_lease_transaction(transaction, lease_ref, job_id, seconds):
+    """임대 문서를 읽고 비었거나 만료됐으면 job_id로 기록 (경합 시 Firestore가 다시 실행)"""
+    lease_doc = lease_ref.get(transaction=transaction)
+    count_ops(reads=1)
+    lease = lease_doc.to_dict() if lease_doc.exists else {}
+    now = time.time()
+    if lease.get('job_id') not in (None, job_id) and lease.get('expires_at', 0) > now:
+        return lease['job_id']
+    transaction.set(lease_ref, {'job_id': job_id, 'expires_at': now + seconds})
+    count_ops(writes=1)
+    return None
+
+
+@firestore.transactional
+def _release_lease_transaction(transaction, lease_ref, job_id):
+    lease_doc = lease_ref.get(transaction=transaction)
+    count_ops(reads=1)
+    if lease_doc.exists and lease_doc.to_dict().get('job_id') == job_id:
+        transaction.delete(lease_ref)
+        count_ops(deletes=1)
@@ -1,15 +1,36 @@
 from flask_cors import CORS
-from flask import Flask, request, jsonify
+from flask import Flask, Blueprint, current_app, g, request, jsonify, Response, stream_with_context, make_response
 import firebase_admin
-from firebase_admin import credentials, auth, firestore
+from firebase_admin import auth
 import jwt
 import datetime
 from functools import wraps
+import atexit
+import hmac
 import os
 import json
+import math
+import threading
+import time
+from user_index import UserIndex, normalize_email
+from versions import VersionCounters, make_etag
+from jobs import JobRunner, JobQueueFull, JobAlreadyRunning, QUEUED, RUNNING
+from cache import LRUCache
+from token_claims import TokenClaims
+from firebase_certs import CertCache, verify_id_token
+from events import EventBus, UserChangeFeed, format_sse, stamp_event, HEARTBEAT_SECONDS
+from storage import get_storage, add_storage_observer, UserNotFound, GrantExists, EmailInUse, TransactionContention
+from metrics import REGISTRY, CONTENT_TYPE
+from storage_ops import ENDPOINT_BUDGETS, OP_KINDS, start_counting, stop_counting
+from compression import compress_response
+from sampling_profiler import SamplingProfiler, MAX_SECONDS as MAX_PROFILE_SECONDS, MAX_REQUESTS as MAX_PROFILE_REQUESTS
+from admission import AdmissionController
+from audit_log import AuditLog
+from idempotency import IdempotencyStore, request_fingerprint, MAX_KEY_LENGTH
+from stamp_codec import STAMP_IDS, FORMAT_MAP, FORMAT_BITS, user_stamp_bits, get_next_stamp_number, present_stamps
 
-# Flask 앱 생성
-app = Flask(__name__)
+# ✅ API 라우트 (create_app에서 앱에 등록)
+api = Blueprint('api', __name__)
 
 # ✅ CORS 설정
 allowed_origins = [
@@ -19,105 +40,296 @@ allowed_origins = [
     "https://jeohyeongoweb.streamlit.app",
 ]
 
-CORS(app, origins=allowed_origins)
+def requested_stamp_format():
+    """클라이언트가 요청한 스탬프 응답 형식 (?stamp_format=bits, 기본 map)"""
+    return request.args.get('stamp_format', FORMAT_MAP)
 
-# ✅ 환경 변수 사용
-app.secret_key = os.environ.get('FLASK_SECRET_KEY', 'fallback-secret-key-for-development')
+# ✅ Firebase ID 토큰 서명 인증서 (미리 받아 두고 max-age에 맞춰 갱신)
+cert_cache = CertCache()
 
-# ✅ 스탬프 ID 목록 (부스 → 스탬프로 변경)
-STAMP_IDS = [f"stamp{i}" for i in range(1, 35)]
-
-def initialize_firebase():
+def firebase_project_id():
     try:
-        service_account_json = os.environ.get('FIREBASE_SERVICE_ACCOUNT_JSON')
-        
-        if service_account_json:
-            service_account_info = json.loads(service_account_json)
-            cred = credentials.Certificate(service_account_info)
-            firebase_admin.initialize_app(cred)
-            print("✅ Firebase Admin SDK initialized from environment variables")
-            return True
-        else:
-            print("❌ FIREBASE_SERVICE_ACCOUNT_JSON environment variable not found")
-            return False
-    except Exception as e:
-        print(f"❌ Firebase initialization failed: {e}")
-        return False
+        return firebase_admin.get_app().project_id
+    except Exception:
+        return None
 
-def get_db():
-    try:
-        db = firestore.client()
-        return db
-    except Exception as e:
-        print(f"Firestore client error: {e}")
+def verify_firebase_id_token(id_token):
+    """
+    캐시된 인증서로 ID 토큰 검증
+    (프로젝트 ID를 모르거나 인증서를 받을 수 없으면 auth.verify_id_token 사용)
+    """
+    project_id = firebase_project_id()
+    if project_id:
+        try:
+            return verify_id_token(id_token, project_id, cert_cache)
+        except auth.InvalidIdTokenError:
+            raise
+        except Exception as e:
+            print(f"Cached cert verification unavailable, falling back: {e}")
+    return auth.verify_id_token(id_token)
+
+# ✅ 이메일/학번 → uid 인덱스 (부여·역할 변경 시 컬렉션 쿼리 제거)
+user_index = UserIndex()
+
+# ✅ 사용자 프로필 캐시 (LRU + TTL), 이 서버의 쓰기는 바로 캐시에 반영
+profile_cache = LRUCache(maxsize=int(os.environ.get('PROFILE_CACHE_SIZE', 5000)),
+                         ttl=float(os.environ.get('PROFILE_CACHE_TTL', 60)))
+
+def load_user_profile(storage, user_uid):
+    """
+    캐시 → 저장소 순으로 사용자 조회
+
+    Returns:
+        dict or None (사용자 없음)
+    """
+    user_data = profile_cache.get(user_uid)
+    if user_data is None:
+        user_data = storage.get_user(user_uid)
+        if user_data is None:
+            return None
+        profile_cache.set(user_uid, user_data)
+    return user_data
+
+# ✅ ETag용 사용자/컬렉션 버전 (스탬프·역할 쓰기마다 증가, 워커가 여러 개면 꺼짐)
+versions = VersionCounters()
+if not versions.enabled:
+    print("ETag versions disabled: WEB_CONCURRENCY > 1 (다른 워커의 쓰기를 알 수 없음)")
+
+# ✅ 오래 걸리는 관리자 작업용 백그라운드 실행기 (상태는 저장소에도 기록)
+def persist_job(job_data):
+    storage = get_storage()
+    if storage:
+        storage.save_job(job_data)
+
+def acquire_job_lease(kind, job_id, seconds):
+    """다른 워커가 같은 종류 작업을 진행 중이면 그 작업 (저장소 임대 - 초기화/재계산 중복 실행 방지)"""
+    storage = get_storage()
+    if not storage:
+        return None
+    holder = storage.acquire_job_lease(kind, job_id, seconds)
+    if holder is None:
         return None
+    return storage.get_job(holder) or {'job_id': holder, 'kind': kind}
 
-def get_next_stamp_number(stamps):
-    """순차적으로 다음 스탬프 번호 찾기"""
-    for i in range(1, 35):
-        stamp_id = f"stamp{i}"
-        if not stamps.get(stamp_id, False):
-            return stamp_id, i
-    return None, None  # 모든 스탬프가 이미 부여됨
+def release_job_lease(kind, job_id):
+    storage = get_storage()
+    if storage:
+        storage.release_job_lease(kind, job_id)
 
-def check_manager_grant_limit(db, manager_email, target_email):
+job_runner = JobRunner(persist=persist_job, acquire_lease=acquire_job_lease, release_lease=release_job_lease)
+
+# ✅ 스탬프/역할 변경 알림 (SSE /api/events 연결들이 공유하는 프로세스 내 버스)
+# 버스는 저장소 변경 구독(user_feed)으로 채움 → 다른 워커가 처리한 부여/회수도 전달 (warm_up에서 시작)
+event_bus = EventBus()
+user_feed = UserChangeFeed(event_bus)
+# 워커당 SSE 연결 한도: 동시 접속 예상 학생 수(EXPECTED_STUDENTS, 기본 1000)를 워커 수로 나눈 몫 + 20% 여유
+# (넘으면 503 + Retry-After → 클라이언트는 그동안 /api/profile 주기 조회로 대신함)
+EXPECTED_STUDENTS = int(os.environ.get('EXPECTED_STUDENTS', 1000))
+WEB_WORKERS = max(1, int(os.environ.get('WEB_CONCURRENCY', 1)))
+MAX_EVENT_STREAMS = int(os.environ.get('MAX_EVENT_STREAMS', math.ceil(EXPECTED_STUDENTS * 1.2 / WEB_WORKERS)))
+EVENT_STREAM_SECONDS = int(os.environ.get('EVENT_STREAM_SECONDS', 300))  # 이후 클라이언트가 재연결
+
+# ✅ 모든 변경 감사 로그 (요청은 큐에 넣기만, 백그라운드 스레드가 저장소에 batch 기록)
+audit_log = AuditLog(get_storage,
+                     max_queue=int(os.environ.get('AUDIT_QUEUE_SIZE', 10000)),
+                     flush_interval=float(os.environ.get('AUDIT_FLUSH_SECONDS', 2.0)),
+                     spill_dir=os.environ.get('AUDIT_SPILL_DIR'))
+atexit.register(audit_log.shutdown)
+
+# ✅ 관리자용 샘플링 프로파일러 (/api/profiler, 켜져 있을 때만 샘플러 스레드 실행)
+profiler = SamplingProfiler(os.environ.get('PROFILE_DIR'))
+
+def publish_stamp_change(user_uid, stamp_id, value, updated_user):
+    # 저장소 구독 중이면 user_feed가 발행 (여기서도 발행하면 이 워커의 구독자가 두 번 받음)
+    if user_feed.active:
+        return
+    event_bus.publish('stamp', stamp_event(user_uid, user_stamp_bits(updated_user), stamp_id, value), uid=user_uid)
+
+def publish_role_change(user_uid, new_role):
+    if user_feed.active:
+        return
+    event_bus.publish('role', {'uid': user_uid, 'role': new_role}, uid=user_uid)
+
+def etag_matches(etag):
+    """요청의 If-None-Match가 현재 ETag와 같으면 True (ETag가 None이면 항상 False)"""
+    return etag is not None and request.if_none_match.contains_weak(etag)
+
+def not_modified(etag):
+    response = make_response('', 304)
+    response.set_etag(etag, weak=True)
+    return response
+
+def with_etag(result, etag):
+    """(jsonify(...), status) 또는 Response에 ETag 부착"""
+    response = make_response(result)
+    if response.status_code == 200 and etag is not None:
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def json_body():
+    """요청 JSON 객체 (없거나 객체가 아니면 빈 dict → 필수 입력값 검증에서 400)"""
+    data = request.get_json(silent=True)
+    return data if isinstance(data, dict) else {}
+
+def target_identifier(value):
     """
-    Manager가 특정 target에게 이미 스탬프를 부여했는지 확인
+    대상 학번/이메일 입력값 → 정규화된 이메일
+    숫자로 보낸 학번(2411224)은 문자열로 변환, 그 밖의 타입이나 빈 값은 None (400 처리)
+    """
+    if isinstance(value, int) and not isinstance(value, bool):
+        value = str(value)
+    if not isinstance(value, str) or not value.strip():
+        return None
+    return normalize_email(value)
+
+def find_user_uid(storage, target_email):
+    """
+    인덱스로 대상 사용자 uid 조회 (사용자 데이터는 읽지 않음)
+
+    Returns:
+        str or None
+    """
+    return user_index.lookup(storage, target_email)
+
+class StampChangeError(Exception):
+    """스탬프 변경 요청을 거절할 때 사용 (메시지, HTTP 상태 코드)"""
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+# ✅ 스탬프 트랜잭션 재시도/경합 통계
+transaction_stats = {
+    'transactions': 0,           # 성공한 트랜잭션
+    'attempts': 0,               # 트랜잭션 함수 실행 횟수 (재시도 포함)
+    'retries': 0,                # 경합으로 인한 재실행 횟수
+    'contention_failures': 0,    # 재시도 한도를 넘겨 실패한 트랜잭션
+}
+transaction_stats_lock = threading.Lock()
+
+def count_transaction(key, amount=1):
+    with transaction_stats_lock:
+        transaction_stats[key] += amount
+
+def plan_stamp_grant(stamp_bits, user_role, auto_grant, stamp_id=None):
+    """
+    부여할 스탬프 결정 (트랜잭션/일괄 부여 공통)
     
     Returns:
-        tuple: (이미_부여됨: bool, 부여된_스탬프_id: str or None)
+        tuple: (stamp_id, action_text)
+    Raises:
+        StampChangeError
     """
-    try:
-        grants_ref = db.collection('stamp_grants')
-        query = grants_ref.where('manager_email', '==', manager_email)\
-                          .where('target_email', '==', target_email)\
-                          .limit(1)
+    # ✅ 부장은 순차적 부여만 가능
+    if user_role == 'manager':
+        if not auto_grant:
+            raise StampChangeError('부장은 순차적 스탬프 부여만 가능합니다.')
         
-        existing_grants = query.get()
-        
-        if existing_grants:
-            # 이미 부여한 적이 있음
-            grant_data = existing_grants[0].to_dict()
-            return True, grant_data.get('stamp_id')
-        else:
-            # 부여한 적 없음
-            return False, None
-            
-    except Exception as e:
-        print(f"Grant limit check error: {e}")
-        return False, None
+        stamp_id, _ = get_next_stamp_number(stamp_bits)
+        if not stamp_id:
+            raise StampChangeError('모든 스탬프가 이미 부여되었습니다.')
+        return stamp_id, "순차적 부여"
+    
+    # ✅ 관리자는 특정 스탬프 또는 순차적 부여 가능 (제한 없음)
+    if user_role == 'admin':
+        if auto_grant:
+            stamp_id, _ = get_next_stamp_number(stamp_bits)
+            if not stamp_id:
+                raise StampChangeError('모든 스탬프가 이미 부여되었습니다.')
+            return stamp_id, "순차적 부여"
+        return stamp_id, "특정 부여"
+    
+    raise StampChangeError('권한이 없습니다.', 403)
 
-def record_stamp_grant(db, manager_email, target_email, stamp_id):
+def run_stamp_transaction(storage, target_uid, action, stamp_id, auto_grant, user_role, user_email, target_email):
     """
-    스탬프 부여 내역을 stamp_grants 컬렉션에 기록
+    스탬프 부여/회수를 저장소의 트랜잭션 하나로 처리 + 재시도/경합 통계 기록
+    사용자 업데이트, stamp_grants 기록, 통계 카운터가 함께 커밋됩니다.
+
+    Returns:
+        tuple: (stamp_id, action_text, 변경 후 사용자 데이터)
     """
+    if action == 'grant':
+        # ✅ 부장의 1인당 1회 제한은 저장소가 부여 기록으로 보장 (이미 있으면 GrantExists)
+        choose_stamp = lambda stamp_bits: plan_stamp_grant(stamp_bits, user_role, auto_grant, stamp_id)[0]
+        action_text = "순차적 부여" if auto_grant else "특정 부여"
+    else:  # revoke
+        choose_stamp = lambda stamp_bits: stamp_id
+        action_text = "회수"
+    manager_email = user_email if action == 'grant' and user_role == 'manager' else None
+    
+    attempts = [0]
     try:
-        grants_ref = db.collection('stamp_grants')
-        grant_data = {
-            'manager_email': manager_email,
-            'target_email': target_email,
-            'stamp_id': stamp_id,
-            'granted_at': firestore.SERVER_TIMESTAMP
-        }
-        grants_ref.add(grant_data)
-        return True
-    except Exception as e:
-        print(f"Grant record error: {e}")
-        return False
+        stamp_id, updated_user = storage.change_stamp(target_uid, target_email, action == 'grant', choose_stamp,
+                                                      manager_email=manager_email, attempts=attempts)
+    except UserNotFound:
+        raise StampChangeError('대상 사용자를 찾을 수 없습니다.', 404)
+    except GrantExists as e:
+        raise StampChangeError(
+            f'이미 {target_email}에게 {e.previous_stamp}를 부여했습니다. 각 계정에는 1개의 스탬프만 부여할 수 있습니다.')
+    except TransactionContention:
+        count_transaction('contention_failures')
+        raise
+    finally:
+        count_transaction('attempts', attempts[0])
+        if attempts[0] > 1:
+            count_transaction('retries', attempts[0] - 1)
+    count_transaction('transactions')
+    return stamp_id, action_text, updated_user
+
+# ✅ Prometheus 메트릭 (/metrics)
+http_requests = REGISTRY.counter('http_requests_total', '라우트/메서드/상태 코드별 요청 수',
+                                 ('route', 'method', 'status'))
+http_latency = REGISTRY.histogram('http_request_duration_seconds', '라우트별 처리 시간 (스트리밍 응답은 헤더까지)',
+                                  ('route', 'method'))
+http_in_flight = REGISTRY.gauge('http_requests_in_flight', '처리 중인 요청 수')
+storage_latency = REGISTRY.histogram('storage_operation_duration_seconds', '저장소 호출 시간',
+                                     ('backend', 'operation', 'method'))
+storage_errors = REGISTRY.counter('storage_operation_errors_total', '실패한 저장소 호출 수',
+                                  ('backend', 'operation', 'method'))
+jwt_failures = REGISTRY.counter('jwt_validation_failures_total', 'JWT 검증 실패 수', ('reason',))
+storage_request_ops = REGISTRY.counter('storage_request_ops_total', '요청 처리 중 읽고 쓴 저장소 문서/쿼리 수',
+                                       ('route', 'method', 'kind'))
+storage_budget_exceeded = REGISTRY.counter('storage_budget_exceeded_total', '저장소 작업 한도를 넘은 요청 수',
+                                           ('route', 'method'))
+
+def observe_storage_call(backend, method, operation, seconds, error):
+    storage_latency.labels(backend, operation, method).observe(seconds)
+    if error:
+        storage_errors.labels(backend, operation, method).inc()
+
+add_storage_observer(observe_storage_call)
+
+# ✅ 검증된 JWT 클레임 캐시 + 역할 변경 반영 (이 워커의 변경은 즉시, 다른 워커의 변경은 ROLE_RECHECK_SECONDS 안에)
+def stored_role(claims):
+    """토큰 사용자의 저장소 역할 (조회한 프로필은 캐시에도 넣음)"""
+    storage = get_storage()
+    user_uid = claims.get('user_uid')
+    if not storage or not user_uid:
+        return None
+    user_data = storage.get_user(user_uid)
+    if user_data is None:
+        return None
+    profile_cache.set(user_uid, user_data)
+    return user_data.get('role')
+
+token_claims = TokenClaims(role_lookup=stored_role,
+                           recheck_seconds=float(os.environ.get('ROLE_RECHECK_SECONDS', 60)))
 
-db = None
-if initialize_firebase():
-    db = get_db()
+def decode_jwt(token):
+    return jwt.decode(token, current_app.secret_key, algorithms=['HS256'])
 
 def create_jwt(user_uid, email, role):
     payload = {
         'user_uid': user_uid,
         'email': email,
         'role': role,
+        'iat': datetime.datetime.now(datetime.timezone.utc),
         'exp': datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=24)
     }
     try:
-        token = jwt.encode(payload, app.secret_key, algorithm='HS256')
+        token = jwt.encode(payload, current_app.secret_key, algorithm='HS256')
         return token
     except Exception as e:
         print(f"JWT creation error: {e}")
@@ -128,90 +340,443 @@ def token_required(f):
     def decorated(*args, **kwargs):
         token = request.headers.get('Authorization')
         if not token:
+            jwt_failures.labels('missing').inc()
             return jsonify({'message': 'Token is missing!'}), 401
         try:
             if token.startswith('Bearer '):
                 token = token[7:]
-            data = jwt.decode(token, app.secret_key, algorithms=['HS256'])
-            current_user = data
+            current_user = token_claims.verify(token, decode_jwt)
         except jwt.ExpiredSignatureError:
+            jwt_failures.labels('expired').inc()
             return jsonify({'message': 'Token has expired!'}), 401
         except jwt.InvalidTokenError:
+            jwt_failures.labels('invalid').inc()
             return jsonify({'message': 'Invalid token!'}), 401
         except Exception as e:
+            jwt_failures.labels('error').inc()
             return jsonify({'message': f'Token validation error: {str(e)}'}), 401
         return f(current_user, *args, **kwargs)
     return decorated
 
+# ✅ 재시도 요청에는 처음 응답을 그대로 반환 (Idempotency-Key 헤더)
+idempotency_store = IdempotencyStore(maxsize=int(os.environ.get('IDEMPOTENCY_STORE_SIZE', 10000)))
+IDEMPOTENCY_WAIT_SECONDS = 10
+
+def idempotent(f):
+    """
+    token_required 다음에 적용
+    Idempotency-Key가 있으면 응답(5xx 제외)을 저장해 두고, 같은 키의 재시도에는 라우트를 다시 실행하지 않고 반환
+    """
+    @wraps(f)
+    def decorated(current_user, *args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return f(current_user, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return jsonify({'message': 'Idempotency-Key가 너무 깁니다.'}), 400
+        
+        store_key = (current_user['email'], request.path, key)
+        fingerprint = request_fingerprint(request.get_data())
+        entry, is_new = idempotency_store.begin(store_key, fingerprint)
+        if not is_new:
+            if entry.fingerprint != fingerprint:
+                idempotency_store.count('conflicts')
+                return jsonify({'message': '같은 Idempotency-Key로 다른 요청을 보낼 수 없습니다.'}), 422
+            stored = entry.wait(IDEMPOTENCY_WAIT_SECONDS)
+            if stored is None:
+                return jsonify({'message': '같은 요청을 처리하고 있습니다. 잠시 후 다시 시도하세요.'}), 409
+            idempotency_store.count('replays')
+            body, status, headers = stored
+            response = Response(body, status=status, headers=headers)
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+        
+        try:
+            response = make_response(f(current_user, *args, **kwargs))
+        except Exception:
+            idempotency_store.abandon(store_key, entry)
+            raise
+        if response.status_code >= 500:
+            idempotency_store.abandon(store_key, entry)
+        else:
+            idempotency_store.complete(store_key, entry, response.get_data(), response.status_code,
+                                       {'Content-Type': response.headers.get('Content-Type')})
+        return response
+    return decorated
+
+def create_user_profile(storage, user_uid, email, name):
+    """
+    사용자 + 인덱스 + 통계를 한 번에 생성 (이미 있으면 실패)
+    
+    Returns:
+        dict: 새 사용자 데이터 (이미 존재하면 None)
+    """
+    if email == '2411224@jeohyeon.hs.kr':
+        role = 'admin'
+    else:
+        role = 'student'
+    
+    new_user = storage.create_user(user_uid, {
+        'email': email,
+        'display_name': name or email.split('@')[0],
+        'role': role
+    })
+    if new_user is None:
+        return None
+    
+    user_index.remember(email, user_uid)
+    profile_cache.set(user_uid, new_user)
+    versions.bump_user(user_uid)
+    return new_user
+
 def init_or_get_user_profile(user_uid, email, name):
-    if not db:
-        default_role = 'admin' if email == '2411224@jeohyeon.hs.kr' else 'student'
-        default_stamps = {stamp: False for stamp in STAMP_IDS}
-        return {
-            'email': email, 
-            'display_name': name, 
-            'stamps': default_stamps,
-            'role': default_role
-        }
+    """
+    로그인 시 프로필 조회/생성 (저장소 왕복 최소화)
+    - 캐시 히트: 0회
+    - 신규 사용자: 생성 커밋 1회
+    - 이 프로세스가 아는 기존 사용자: 조회 1회
+    저장소에 연결할 수 없으면 예외 (로그인 실패 → 500)
+    """
+    storage = get_storage()
+    if not storage:
+        raise RuntimeError('데이터베이스 연결에 실패했습니다.')
     
-    try:
-        user_ref = db.collection('users').document(user_uid)
-        user_doc = user_ref.get()
-        if user_doc.exists:
-            user_data = user_doc.to_dict()
-            if 'stamps' not in user_data:
-                default_stamps = {stamp: False for stamp in STAMP_IDS}
-                user_data['stamps'] = default_stamps
-                user_ref.update({'stamps': default_stamps})
-            return user_data
-        else:
-            if email == '2411224@jeohyeon.hs.kr':
-                role = 'admin'
-            else:
-                role = 'student'
-            
-            default_stamps = {stamp: False for stamp in STAMP_IDS}
-            
-            new_user = {
-                'email': email,
-                'display_name': name or email.split('@')[0],
-                'stamps': default_stamps,
-                'role': role,
-                'created_at': firestore.SERVER_TIMESTAMP
-            }
-            user_ref.set(new_user)
+    user_data = profile_cache.get(user_uid)
+    
+    # ✅ 이 프로세스가 모르는 사용자는 생성부터 시도 (신규 가입이면 커밋 한 번으로 끝)
+    if user_data is None and user_index.cached_uid(email) != user_uid:
+        new_user = create_user_profile(storage, user_uid, email, name)
+        if new_user is not None:
             return new_user
+    
+    # 기존 사용자 (캐시에 없을 때만 조회)
+    if user_data is None:
+        user_data = load_user_profile(storage, user_uid)
+        if user_data is None:
+            # 인덱스에는 있지만 사용자가 없는 경우 → 생성 (동시에 생성됐으면 다시 조회)
+            new_user = create_user_profile(storage, user_uid, email, name)
+            if new_user is not None:
+                return new_user
+            user_data = load_user_profile(storage, user_uid)
+    
+    # ✅ 이 프로세스에서 처음 보는 사용자면 인덱스 보충
+    if user_index.remember(email, user_uid):
+        storage.write_index_entry(email, user_uid)
+    return user_data
+
+# ✅ 워커 준비 상태 (warm_up이 끝난 프로세스만 ready)
+WARM_USER_INDEX_LIMIT = int(os.environ.get('WARM_USER_INDEX_LIMIT', 5000))  # 0이면 인덱스를 미리 읽지 않음
+readiness = {'pid': None, 'ready': False, 'warmed_at': None, 'steps': {}, 'failures': 0, 'retry_at': 0.0}
+readiness_lock = threading.Lock()
+# 저장소 연결 실패 시 재시도 간격 (1, 2, 4, ... 최대 30초) - 부팅 때 한 번 실패해도 워커가 계속 503이지 않도록
+WARM_RETRY_SECONDS = 1.0
+WARM_RETRY_MAX_SECONDS = 30.0
+
+def warm_storage(steps):
+    """저장소 연결 확인 + 변경 구독(SSE 이벤트) + 인덱스 미리 채우기 (warm_up과 재시도에서 공용)"""
+    storage = get_storage()
+    try:
+        steps['storage'] = bool(storage and storage.ping())
     except Exception as e:
-        print(f"User profile error: {e}")
-        default_role = 'admin' if email == '2411224@jeohyeon.hs.kr' else 'student'
-        default_stamps = {stamp: False for stamp in STAMP_IDS}
-        return {
-            'email': email, 
-            'display_name': name, 
-            'stamps': default_stamps,
-            'role': default_role
-        }
-
-@app.route('/health', methods=['GET'])
+        print(f"Warm-up storage error: {e}")
+        steps['storage'] = False
+    
+    if steps['storage']:
+        try:
+            steps['event_feed'] = user_feed.start(storage)
+        except Exception as e:
+            print(f"Warm-up event feed error: {e}")
+            steps['event_feed'] = False
+    
+    if steps['storage'] and WARM_USER_INDEX_LIMIT:
+        try:
+            steps['user_index'] = user_index.prime(storage, WARM_USER_INDEX_LIMIT)
+        except Exception as e:
+            print(f"Warm-up user index error: {e}")
+            steps['user_index'] = False
+
+def record_readiness(steps):
+    """준비 결과 저장 (실패면 다음 재시도 시각을 지수 백오프로)"""
+    failures = 0 if steps['storage'] else readiness['failures'] + 1
+    retry_delay = min(WARM_RETRY_SECONDS * 2 ** max(failures - 1, 0), WARM_RETRY_MAX_SECONDS)
+    readiness.update(pid=os.getpid(), ready=steps['storage'], steps=steps, failures=failures,
+                     retry_at=time.monotonic() + retry_delay,
+                     warmed_at=datetime.datetime.now(datetime.timezone.utc).isoformat())
+
+def warm_up():
+    """
+    워커가 요청을 받기 전 준비 (gunicorn post_worker_init, 아니면 프로세스의 첫 요청에서 한 번)
+    1. 이 프로세스의 저장소 연결 (Firestore: 클라이언트 생성 + 채널 열기)
+    2. Firebase 서명 인증서 받기 + 갱신 스레드 시작
+    3. 이메일/학번 → uid 인덱스 미리 채우기
+    
+    이미 준비한 프로세스에서 저장소 연결이 실패한 상태면 재시도 시각이 지난 경우 1, 3만 다시 시도합니다.
+    
+    Returns:
+        bool: 준비 완료 여부 (저장소 연결 기준)
+    """
+    with readiness_lock:
+        if readiness['pid'] == os.getpid():
+            if readiness['ready'] or time.monotonic() < readiness['retry_at']:
+                return readiness['ready']
+            steps = dict(readiness['steps'])
+            warm_storage(steps)
+            record_readiness(steps)
+            print(f"Worker {os.getpid()} warm-up retry: storage {'ok' if steps['storage'] else 'failed'}")
+            return readiness['ready']
+        
+        started = time.monotonic()
+        steps = {}
+        warm_storage(steps)
+        
+        try:
+            cert_cache.get()
+            cert_cache.start()
+            steps['firebase_certs'] = True
+        except Exception as e:
+            # 인증서는 로그인 시 auth.verify_id_token으로 대체 가능 → 준비 상태에는 영향 없음
+            print(f"Warm-up cert fetch error: {e}")
+            steps['firebase_certs'] = False
+        
+        try:
+            audit_log.start()
+            steps['audit_log'] = True
+        except Exception as e:
+            print(f"Warm-up audit log error: {e}")
+            steps['audit_log'] = False
+        
+        steps['seconds'] = round(time.monotonic() - started, 3)
+        record_readiness(steps)
+        print(f"Worker {os.getpid()} warm-up: {steps}")
+        return readiness['ready']
+
+def needs_warm_up():
+    """이 프로세스에서 아직 준비하지 않았거나, 저장소 연결 실패 후 재시도 시각이 지남"""
+    if readiness['pid'] != os.getpid():
+        return True
+    return not readiness['ready'] and time.monotonic() >= readiness['retry_at']
+
+def ensure_warm():
+    # post_worker_init 없이 실행된 경우(개발 서버 등) 첫 요청에서 준비, 실패했으면 백오프 후 재시도
+    if needs_warm_up():
+        warm_up()
+
+# ✅ 요청 수락 제어 - (초당 요청, 버스트)
+# 역할별 사용자 한도는 RATE_LIMITS, 엔드포인트 한도는 ENDPOINT_RATE_LIMITS 환경 변수(JSON)로 덮어쓸 수 있음
+# 예: RATE_LIMITS='{"manager": [10, 60]}'
+DEFAULT_ROLE_LIMITS = {
+    'student': (2, 20),
+    'manager': (5, 30),
+    'admin': (10, 60),
+}
+DEFAULT_ENDPOINT_LIMITS = {
+    'POST /api/login': (30, 100),
+    'POST /api/stamps': (50, 100),
+    'POST /api/stamps/batch': (5, 10),
+    'GET /api/users': (10, 20),
+    'POST /api/reset-all-stamps': (0.1, 2),
+    'POST /api/profiler': (0.1, 2),
+}
+# IP 한도는 기본 꺼짐: Streamlit 서버를 거친 요청은 모두 같은 IP라 학생 전체가 버킷 하나를 나눠 씀
+# 직접 호출하는 클라이언트만 있는 배포에서 IP_RATE_LIMIT='{"ip": [50, 200]}'로 켜기
+DEFAULT_IP_LIMIT = None
+# 앞단 프록시 수 (Render 로드 밸런서 1개) - X-Forwarded-For의 오른쪽에서 이만큼째가 프록시가 본 클라이언트 주소
+# (왼쪽 값은 클라이언트가 마음대로 보낼 수 있음), 0이면 remote_addr만 사용
+TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', 1))
+# 동시 처리 제한에서 제외 (오래 열려 있는 SSE는 MAX_EVENT_STREAMS로 따로 제한)
+CONCURRENCY_EXEMPT = {'/api/events'}
+ADMISSION_EXEMPT = {'/health', '/metrics'}
+
+def load_limits(env_name, defaults):
+    limits = dict(defaults)
+    try:
+        overrides = json.loads(os.environ.get(env_name) or '{}')
+        limits.update({key: tuple(value) for key, value in overrides.items()})
+    except (ValueError, TypeError) as e:
+        print(f"{env_name} 설정 오류, 기본값 사용: {e}")
+    return limits
+
+admission = AdmissionController(
+    role_limits=load_limits('RATE_LIMITS', DEFAULT_ROLE_LIMITS),
+    ip_limit=load_limits('IP_RATE_LIMIT', {'ip': DEFAULT_IP_LIMIT})['ip'],
+    endpoint_limits=load_limits('ENDPOINT_RATE_LIMITS', DEFAULT_ENDPOINT_LIMITS),
+    max_in_flight=int(os.environ.get('MAX_IN_FLIGHT', 64)),
+    max_queue=int(os.environ.get('MAX_QUEUED_REQUESTS', 128)),
+    queue_timeout=float(os.environ.get('QUEUE_TIMEOUT_SECONDS', 2.0))
+)
+
+def request_principal():
+    """
+    Authorization 토큰의 (이메일, 역할) - 없거나 유효하지 않으면 (None, None) (라우트에서 401 처리)
+    요청 한도 확인용이라 서명만 확인 (저장소 역할 조회는 허용된 요청의 token_required에서)
+    """
+    token = request.headers.get('Authorization', '')
+    if token.startswith('Bearer '):
+        token = token[7:]
+    if not token:
+        return None, None
+    try:
+        claims = token_claims.peek(token, decode_jwt)
+    except Exception:
+        return None, None
+    return claims.get('email'), claims.get('role')
+
+def client_ip():
+    """신뢰하는 프록시가 덧붙인 X-Forwarded-For 항목 (오른쪽에서 TRUSTED_PROXY_HOPS번째)"""
+    if TRUSTED_PROXY_HOPS:
+        hops = [hop.strip() for hop in request.headers.get('X-Forwarded-For', '').split(',') if hop.strip()]
+        if len(hops) >= TRUSTED_PROXY_HOPS:
+            return hops[-TRUSTED_PROXY_HOPS]
+    return request.remote_addr
+
+def shed_response(message, status, retry_after):
+    response = jsonify({'message': message})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, status
+
+def admit_request():
+    """Firestore 호출 전에 한도 확인 → 초과면 429, 동시 처리 한도/대기열 초과면 503"""
+    path = request.url_rule.rule if request.url_rule else None
+    if not path or path in ADMISSION_EXEMPT or request.method == 'OPTIONS':
+        return None
+    
+    principal, role = request_principal()
+    scope, retry_after = admission.check_rates(endpoint=f"{request.method} {path}", ip=client_ip(),
+                                               principal=principal, role=role)
+    if scope:
+        return shed_response('요청이 너무 많습니다. 잠시 후 다시 시도하세요.', 429, retry_after)
+    
+    if path not in CONCURRENCY_EXEMPT:
+        if not admission.acquire():
+            return shed_response('서버가 혼잡합니다. 잠시 후 다시 시도하세요.', 503, 1)
+        g.admission_slot = True
+    return None
+
+def release_request(exc=None):
+    if g.pop('admission_slot', False):
+        admission.release()
+
+def start_request_metrics():
+    g.metrics_started = time.perf_counter()
+    http_in_flight.inc()
+
+def record_request_metrics(response):
+    started = g.get('metrics_started')
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        http_requests.labels(route, request.method, str(response.status_code)).inc()
+        http_latency.labels(route, request.method).observe(time.perf_counter() - started)
+    return response
+
+def finish_request_metrics(exc=None):
+    if g.pop('metrics_started', None) is not None:
+        http_in_flight.dec()
+
+# ✅ 요청별 저장소 작업 수 (storage_ops.py) - 워밍업/거절된 요청은 제외
+STORAGE_OPS_DEBUG = os.environ.get('STORAGE_OPS_DEBUG', '0') == '1'
+
+def start_storage_ops():
+    g.storage_ops = start_counting()
+
+def add_storage_ops_header(response):
+    # 스트리밍 응답은 헤더를 보낼 때까지의 작업만 (전체 수는 로그/메트릭)
+    counts = g.get('storage_ops')
+    if counts is not None and STORAGE_OPS_DEBUG:
+        response.headers['X-Storage-Ops'] = counts.header_value()
+    return response
+
+def finish_storage_ops(exc=None):
+    counts = g.pop('storage_ops', None)
+    if counts is None:
+        return
+    stop_counting(counts)
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    for kind in OP_KINDS:
+        amount = getattr(counts, kind)
+        if amount:
+            storage_request_ops.labels(route, request.method, kind).inc(amount)
+    
+    exceeded = counts.over_budget(ENDPOINT_BUDGETS.get(f"{request.method} {route}"))
+    if exceeded:
+        storage_budget_exceeded.labels(route, request.method).inc()
+        print(f"Storage ops over budget {request.method} {route}: " +
+              ', '.join(f"{kind} {actual} > {limit}" for kind, (actual, limit) in exceeded.items()))
+    elif STORAGE_OPS_DEBUG:
+        print(f"Storage ops {request.method} {route}: {counts.header_value()}")
+
+def compress_api_response(response):
+    # ✅ Accept-Encoding 협상 후 gzip/br 압축 (스트리밍/작은 응답 제외 - compression.py)
+    return compress_response(response, request.accept_encodings)
+
+def count_profiled_request(exc=None):
+    # 프로파일러가 꺼져 있으면 bool 확인 하나 (요청 수 제한 모드용, 프로파일 조회 요청은 제외)
+    if profiler.active and not request.path.startswith('/api/profiler'):
+        profiler.request_finished()
+
+@REGISTRY.collector
+def collect_server_stats():
+    """이미 다른 곳에서 세고 있는 값들 (스크랩할 때만 읽음)"""
+    caches = {
+        'profile': profile_cache.stats(),
+        'token_claims': token_claims.stats(),
+        'idempotency': idempotency_store.stats(),
+    }
+    admission_stats = admission.stats()
+    audit_stats = audit_log.stats()
+    with transaction_stats_lock:
+        stamp_transactions = dict(transaction_stats)
+    return [
+        ('cache_hits_total', 'counter', '캐시 히트 수', {(('cache', name),): stats['hits'] for name, stats in caches.items()}),
+        ('cache_misses_total', 'counter', '캐시 미스 수', {(('cache', name),): stats['misses'] for name, stats in caches.items()}),
+        ('cache_hit_ratio', 'gauge', '캐시 히트 비율', {(('cache', name),): stats['hit_ratio'] for name, stats in caches.items()}),
+        ('cache_entries', 'gauge', '캐시 항목 수', {(('cache', name),): stats['size'] for name, stats in caches.items()}),
+        ('admission_shed_total', 'counter', '요청 수락 제어로 거절한 요청 수',
+         {(('scope', scope),): count for scope, count in admission_stats['shed'].items()}),
+        ('admission_queue_depth', 'gauge', '동시 처리 한도로 대기 중인 요청 수', {(): admission_stats['queue_depth']}),
+        ('stamp_transaction_events_total', 'counter', '스탬프 트랜잭션 (성공/실행/재시도/경합 실패)',
+         {(('kind', kind),): count for kind, count in stamp_transactions.items()}),
+        ('event_stream_subscribers', 'gauge', '열려 있는 SSE 연결 수', {(): event_bus.stats()['subscribers']}),
+        ('audit_log_queued', 'gauge', '기록 대기 중인 감사 이벤트 수', {(): audit_stats['queued']}),
+        ('audit_log_spilled_total', 'counter', 'spill 파일로 보낸 감사 이벤트 수', {(): audit_stats['spilled']}),
+    ]
+
+@api.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus 텍스트 형식 메트릭 (METRICS_TOKEN이 설정되어 있으면 Bearer 토큰 필요)"""
+    metrics_token = os.environ.get('METRICS_TOKEN')
+    if metrics_token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {metrics_token}'):
+        return jsonify({'message': 'Unauthorized'}), 401
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+@api.route('/health', methods=['GET'])
 def health_check():
+    """liveness + readiness (이 워커의 warm_up이 끝나지 않았거나 실패했으면 503, 실패 상태면 백오프 후 재시도)"""
+    if needs_warm_up():
+        warm_up()
+    ready = readiness['ready'] and readiness['pid'] == os.getpid()
     return jsonify({
-        'status': 'healthy',
+        'status': 'healthy' if ready else 'starting',
+        'ready': ready,
+        'pid': os.getpid(),
+        'warmed_at': readiness['warmed_at'],
+        'warmup': readiness['steps'],
+        'storage': os.environ.get('STORAGE_BACKEND', 'firestore'),
         'firebase_initialized': firebase_admin._apps != {},
         'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat()
-    })
+    }), 200 if ready else 503
 
-@app.route('/')
+@api.route('/')
 def home():
     return jsonify({'message': 'Flask Auth Server is running!'})
 
-@app.route('/api/login', methods=['POST'])
+@api.route('/api/login', methods=['POST'])
 def login():
     id_token = request.json.get('id_token')
     if not id_token:
         return jsonify({'message': 'ID token is required'}), 400
     
     try:
-        decoded_token = auth.verify_id_token(id_token)
+        decoded_token = verify_firebase_id_token(id_token)
         user_uid = decoded_token['uid']
         email = decoded_token['email']
         name = decoded_token.get('name', '')
@@ -227,54 +792,63 @@ def login():
         return jsonify({
             'message': 'Login successful',
             'access_token': jwt_token,
-            'user': {
+            'user': present_stamps({
                 'email': email,
                 'display_name': user_profile['display_name'],
                 'role': user_profile['role'],
-                'stamps': user_profile['stamps']
-            }
+                'stamp_bits': user_stamp_bits(user_profile)
+            }, requested_stamp_format())
         }), 200
         
     except auth.ExpiredIdTokenError:
         return jsonify({'message': '로그인 세션이 만료되었습니다.'}), 401
     except auth.InvalidIdTokenError:
         return jsonify({'message': '유효하지 않은 로그인 정보입니다.'}), 401
+    except EmailInUse as e:
+        # Firebase 계정을 다시 만들어 uid가 바뀐 경우 → 기존 스탬프 기록을 덮어쓰지 않고 관리자 확인
+        print(f"Login email conflict: {e.email} already belongs to uid {e.existing_uid}")
+        return jsonify({'message': '이 이메일로 가입된 다른 계정이 이미 있습니다. 관리자에게 문의하세요.'}), 409
     except Exception as e:
         return jsonify({'message': f'로그인 처리 중 오류가 발생했습니다: {str(e)}'}), 500
 
-@app.route('/api/profile', methods=['GET'])
+@api.route('/api/profile', methods=['GET'])
 @token_required
 def get_profile(current_user):
+    etag = versions.user_etag(current_user['user_uid'], requested_stamp_format())
+    if etag_matches(etag):
+        return not_modified(etag)
+    return with_etag(build_profile_response(current_user), etag)
+
+def build_profile_response(current_user):
     try:
         user_uid = current_user['user_uid']
-        if db:
-            user_ref = db.collection('users').document(user_uid)
-            user_doc = user_ref.get()
-            if user_doc.exists:
-                user_data = user_doc.to_dict()
-                return jsonify({'user': user_data}), 200
-        
-        default_stamps = {stamp: False for stamp in STAMP_IDS}
+        storage = get_storage()
+        if storage:
+            user_data = load_user_profile(storage, user_uid)
+            if user_data is not None:
+                return jsonify({'user': present_stamps(user_data, requested_stamp_format())}), 200
+        
         return jsonify({
-            'user': {
+            'user': present_stamps({
                 'email': current_user['email'],
                 'display_name': current_user.get('display_name', current_user['email'].split('@')[0]),
                 'role': current_user['role'],
-                'stamps': default_stamps
-            }
+                'stamp_bits': 0
+            }, requested_stamp_format())
         }), 200
         
     except Exception as e:
         return jsonify({'message': str(e)}), 500
 
 # ✅ 수정된 스탬프 관리 API (Manager 제약 추가)
-@app.route('/api/stamps', methods=['POST'])
+@api.route('/api/stamps', methods=['POST'])
 @token_required
+@idempotent
 def update_stamps(current_user):
     user_role = current_user['role']
     user_email = current_user['email']  # ✅ 부여하는 사람의 이메일
-    data = request.json
-    target_email = data.get('target_email')
+    data = json_body()
+    target_email = target_identifier(data.get('target_email'))  # 학번만 입력해도 허용
     stamp_id = data.get('stamp_id')
     action = data.get('action')
     auto_grant = data.get('auto_grant', False)
@@ -283,68 +857,22 @@ def update_stamps(current_user):
         return jsonify({'message': 'target_email, action은 필수 입력값입니다.'}), 400
     
     try:
-        if not db:
+        storage = get_storage()
+        if not storage:
             return jsonify({'message': '데이터베이스 연결에 실패했습니다.'}), 500
             
-        users_ref = db.collection('users')
-        query = users_ref.where('email', '==', target_email).limit(1)
-        target_docs = query.get()
+        target_uid = find_user_uid(storage, target_email)
         
-        if not target_docs:
+        if not target_uid:
             return jsonify({'message': '대상 사용자를 찾을 수 없습니다.'}), 404
-            
-        target_doc = target_docs[0]
-        target_data = target_doc.to_dict()
-        
-        new_stamps = target_data.get('stamps', {})
         
+        # ✅ 요청 검증 (저장소 쓰기 전)
         if action == 'grant':
-            # ✅ 부장은 순차적 부여만 가능 + 1인당 1회 제한
-            if user_role == 'manager':
-                if not auto_grant:
-                    return jsonify({'message': '부장은 순차적 스탬프 부여만 가능합니다.'}), 400
-                
-                # ✅ 핵심: Manager가 이미 이 사람에게 스탬프를 부여했는지 확인
-                already_granted, previous_stamp = check_manager_grant_limit(db, user_email, target_email)
-                
-                if already_granted:
-                    return jsonify({
-                        'message': f'이미 {target_email}에게 {previous_stamp}를 부여했습니다. 각 계정에는 1개의 스탬프만 부여할 수 있습니다.'
-                    }), 400
-                
-                next_stamp, stamp_number = get_next_stamp_number(new_stamps)
-                if not next_stamp:
-                    return jsonify({'message': '모든 스탬프가 이미 부여되었습니다.'}), 400
-                
-                stamp_id = next_stamp
-                action_text = "순차적 부여"
-            
-            # ✅ 관리자는 특정 스탬프 또는 순차적 부여 가능 (제한 없음)
-            elif user_role == 'admin':
-                if auto_grant:
-                    next_stamp, stamp_number = get_next_stamp_number(new_stamps)
-                    if not next_stamp:
-                        return jsonify({'message': '모든 스탬프가 이미 부여되었습니다.'}), 400
-                    stamp_id = next_stamp
-                    action_text = "순차적 부여"
-                else:
-                    if not stamp_id:
-                        return jsonify({'message': '스탬프 ID를 선택하세요.'}), 400
-                    if stamp_id not in STAMP_IDS:
-                        return jsonify({'message': '유효하지 않은 스탬프 ID입니다.'}), 400
-                    action_text = "특정 부여"
-            else:
-                return jsonify({'message': '권한이 없습니다.'}), 403
-            
-            # ✅ 스탬프 부여 처리
-            new_stamps[stamp_id] = True
-            target_doc.reference.update({'stamps': new_stamps})
-            
-            # ✅ Manager인 경우 부여 내역 기록 (Admin은 기록하지 않음)
-            if user_role == 'manager':
-                if not record_stamp_grant(db, user_email, target_email, stamp_id):
-                    print(f"Warning: Failed to record grant for {user_email} -> {target_email}")
-            
+            if user_role == 'admin' and not auto_grant:
+                if not stamp_id:
+                    return jsonify({'message': '스탬프 ID를 선택하세요.'}), 400
+                if stamp_id not in STAMP_IDS:
+                    return jsonify({'message': '유효하지 않은 스탬프 ID입니다.'}), 400
         else:  # revoke
             if user_role not in ['admin']:
                 return jsonify({'message': '스탬프 회수는 관리자만 가능합니다.'}), 403
@@ -353,24 +881,22 @@ def update_stamps(current_user):
                 return jsonify({'message': '회수할 스탬프 ID를 선택하세요.'}), 400
             if stamp_id not in STAMP_IDS:
                 return jsonify({'message': '유효하지 않은 스탬프 ID입니다.'}), 400
-            
-            new_stamps[stamp_id] = False
-            target_doc.reference.update({'stamps': new_stamps})
-            
-            # ✅ 회수 시 grant 기록도 삭제
-            try:
-                grants_ref = db.collection('stamp_grants')
-                query = grants_ref.where('target_email', '==', target_email)\
-                                 .where('stamp_id', '==', stamp_id)\
-                                 .limit(1)
-                grants_to_delete = query.get()
-                for grant in grants_to_delete:
-                    grant.reference.delete()
-            except Exception as e:
-                print(f"Grant deletion error: {e}")
-            
-            action_text = "회수"
         
+        # ✅ 사용자 업데이트 + 부여 기록을 한 트랜잭션으로 커밋
+        try:
+            stamp_id, action_text, updated_user = run_stamp_transaction(
+                storage, target_uid, action, stamp_id, auto_grant, user_role, user_email, target_email)
+        except StampChangeError as e:
+            if e.status == 404:
+                user_index.forget(target_email)
+            return jsonify({'message': e.message}), e.status
+        
+        profile_cache.set(target_uid, updated_user)
+        versions.bump_user(target_uid)
+        publish_stamp_change(target_uid, stamp_id, action == 'grant', updated_user)
+        audit_log.record(f'stamp_{action}', actor=user_email, actor_role=user_role,
+                         target_email=target_email, target_uid=target_uid,
+                         stamp_id=stamp_id, mode=action_text)
         return jsonify({
             'message': f'{target_email}에게 {stamp_id} 스탬프를 {action_text}했습니다.',
             'stamp_id': stamp_id
@@ -380,32 +906,172 @@ def update_stamps(current_user):
         print(f"Stamps update error: {e}")
         return jsonify({'message': str(e)}), 500
 
-@app.route('/api/role', methods=['POST'])
+# ✅ 일괄 부여 한 번에 처리할 최대 대상 수
+MAX_BATCH_TARGETS = 100
+
+@api.route('/api/stamps/batch', methods=['POST'])
 @token_required
+@idempotent
+def batch_grant_stamps(current_user):
+    """
+    여러 대상에게 스탬프 일괄 부여 (부장/관리자)
+    - targets: 학번 또는 이메일 목록
+    - stamp_id: 관리자 특정 부여 시에만 (없으면 순차적 부여)
+    대상별 결과 목록을 반환합니다.
+    """
+    user_role = current_user['role']
+    user_email = current_user['email']
+    data = json_body()
+    targets = data.get('targets')
+    stamp_id = data.get('stamp_id')
+    
+    if user_role not in ['manager', 'admin']:
+        return jsonify({'message': '권한이 없습니다.'}), 403
+    if not isinstance(targets, list) or not targets:
+        return jsonify({'message': 'targets는 필수 입력값입니다.'}), 400
+    if len(targets) > MAX_BATCH_TARGETS:
+        return jsonify({'message': f'한 번에 최대 {MAX_BATCH_TARGETS}명까지 부여할 수 있습니다.'}), 400
+    invalid = [index for index, target in enumerate(targets) if target_identifier(target) is None]
+    if invalid:
+        return jsonify({'message': 'targets에는 학번 또는 이메일만 넣을 수 있습니다.', 'invalid_indexes': invalid}), 400
+    if stamp_id:
+        if user_role != 'admin':
+            return jsonify({'message': '부장은 순차적 스탬프 부여만 가능합니다.'}), 400
+        if stamp_id not in STAMP_IDS:
+            return jsonify({'message': '유효하지 않은 스탬프 ID입니다.'}), 400
+    
+    try:
+        storage = get_storage()
+        if not storage:
+            return jsonify({'message': '데이터베이스 연결에 실패했습니다.'}), 500
+        
+        results = grant_stamps_batch(storage, targets, user_role, user_email, stamp_id)
+        granted = sum(1 for result in results if result['status'] == 'granted')
+        
+        return jsonify({
+            'message': f'{len(results)}명 중 {granted}명에게 스탬프를 부여했습니다.',
+            'granted': granted,
+            'failed': len(results) - granted,
+            'results': results
+        }), 200
+        
+    except Exception as e:
+        print(f"Batch grant error: {e}")
+        return jsonify({'message': str(e)}), 500
+
+def grant_stamps_batch(storage, targets, user_role, user_email, stamp_id=None):
+    """
+    일괄 부여
+    1. 대상 uid 조회 (인덱스, 모르는 대상만 한 번에)
+    2. 대상 사용자 + (부장) 부여 기록을 한 번에 읽기
+    3. 1인당 1회 제한/다음 스탬프 계산은 메모리에서
+    4. 한 번에 커밋 (읽은 뒤 바뀐 대상이 있으면 해당 대상들은 개별 트랜잭션으로 처리)
+    
+    Returns:
+        list: 대상별 결과 {'target_email', 'status': granted|error, 'stamp_id' 또는 'message'}
+    """
+    auto_grant = not stamp_id
+    manager_email = user_email if user_role == 'manager' else None
+    emails = list(dict.fromkeys(target_identifier(t) for t in targets))   # 라우트에서 검증한 목록
+    results = {email: {'target_email': email, 'status': 'error'} for email in emails}
+    
+    uids = user_index.lookup_many(storage, emails)
+    found = []
+    for email in emails:
+        if uids.get(email):
+            found.append(email)
+        else:
+            results[email]['message'] = '대상 사용자를 찾을 수 없습니다.'
+    
+    users = storage.get_users([uids[email] for email in found])
+    existing_grants = storage.get_manager_grants(manager_email, found) if manager_email else {}
+    
+    planned = []
+    emails_by_uid = {}
+    for email in found:
+        if uids[email] not in users:
+            user_index.forget(email)
+            results[email]['message'] = '대상 사용자를 찾을 수 없습니다.'
+            continue
+        
+        if email in existing_grants:
+            results[email]['message'] = f'이미 {email}에게 {existing_grants[email]}를 부여했습니다.'
+            continue
+        
+        target_data, version = users[uids[email]]
+        try:
+            granted_stamp, _ = plan_stamp_grant(user_stamp_bits(target_data), user_role, auto_grant, stamp_id)
+        except StampChangeError as e:
+            results[email]['message'] = e.message
+            continue
+        planned.append((uids[email], email, target_data, version, granted_stamp))
+        emails_by_uid[uids[email]] = (email, granted_stamp)
+    
+    updated, conflicted = storage.commit_grants(planned, manager_email=manager_email) if planned else ({}, [])
+    for uid, updated_user in updated.items():
+        email, granted_stamp = emails_by_uid[uid]
+        record_batch_grant(results[email], uid, granted_stamp, updated_user, user_role, user_email)
+    
+    # ✅ 읽은 뒤 다른 요청이 대상/부여 기록을 바꿈 → 대상별 트랜잭션으로 다시 처리
+    for uid in conflicted:
+        email, _ = emails_by_uid[uid]
+        try:
+            granted_stamp, _, updated_user = run_stamp_transaction(
+                storage, uid, 'grant', stamp_id, auto_grant, user_role, user_email, email)
+            record_batch_grant(results[email], uid, granted_stamp, updated_user, user_role, user_email)
+        except StampChangeError as change_error:
+            results[email]['message'] = change_error.message
+        except Exception as retry_error:
+            results[email]['message'] = str(retry_error)
+    
+    return [results[email] for email in emails]
+
+def record_batch_grant(result, user_uid, granted_stamp, updated_user, user_role, user_email):
+    """일괄 부여 성공 결과 기록 + 캐시/버전 갱신 + 감사 로그 (개별 부여와 같은 항목)"""
+    result.update({'status': 'granted', 'stamp_id': granted_stamp})
+    profile_cache.set(user_uid, updated_user)
+    versions.bump_user(user_uid)
+    publish_stamp_change(user_uid, granted_stamp, True, updated_user)
+    audit_log.record('stamp_grant', actor=user_email, actor_role=user_role,
+                     target_email=result['target_email'], target_uid=user_uid,
+                     stamp_id=granted_stamp, mode='일괄 부여')
+
+@api.route('/api/role', methods=['POST'])
+@token_required
+@idempotent
 def update_role(current_user):
     if current_user['role'] != 'admin':
         return jsonify({'message': '관리자만 접근 가능합니다.'}), 403
     
-    data = request.json
-    target_email = data.get('target_email')
+    data = json_body()
+    target_email = target_identifier(data.get('target_email'))  # 학번만 입력해도 허용
     new_role = data.get('new_role')
     
     if not target_email or new_role not in ['student', 'manager', 'admin']:
         return jsonify({'message': '유효하지 않은 입력값입니다.'}), 400
     
     try:
-        if not db:
+        storage = get_storage()
+        if not storage:
             return jsonify({'message': '데이터베이스 연결에 실패했습니다.'}), 500
             
-        users_ref = db.collection('users')
-        query = users_ref.where('email', '==', target_email).limit(1)
-        target_docs = query.get()
+        target_uid = find_user_uid(storage, target_email)
         
-        if not target_docs:
+        if not target_uid:
             return jsonify({'message': '대상 사용자를 찾을 수 없습니다.'}), 404
-            
-        target_doc = target_docs[0]
-        target_doc.reference.update({'role': new_role})
+        
+        try:
+            storage.update_user(target_uid, {'role': new_role})
+        except UserNotFound:
+            user_index.forget(target_email)
+            return jsonify({'message': '대상 사용자를 찾을 수 없습니다.'}), 404
+        
+        profile_cache.update(target_uid, lambda user_data: {**user_data, 'role': new_role})
+        token_claims.record_role_change(target_email, new_role)
+        versions.bump_user(target_uid)
+        publish_role_change(target_uid, new_role)
+        audit_log.record('role_change', actor=current_user['email'], actor_role=current_user['role'],
+                         target_email=target_email, target_uid=target_uid, new_role=new_role)
         return jsonify({
             'message': f'{target_email}의 역할을 {new_role}로 변경했습니다.'
         }), 200
@@ -413,79 +1079,442 @@ def update_role(current_user):
     except Exception as e:
         return jsonify({'message': str(e)}), 500
 
-@app.route('/api/users', methods=['GET'])
+# ✅ /api/users 한 페이지 최대 크기
+MAX_USERS_PAGE_SIZE = 1000
+
+@api.route('/api/events', methods=['GET'])
+@token_required
+def stream_events(current_user):
+    """
+    스탬프/역할 변경 SSE 스트림
+    - 로그인한 사용자 본인의 변경만 전달 (관리자는 ?all=1이면 모든 사용자)
+    - EVENT_STREAM_SECONDS 후 연결을 닫음 → 클라이언트가 재연결
+    """
+    if event_bus.subscriber_count() >= MAX_EVENT_STREAMS:
+        response = jsonify({'message': '실시간 연결이 너무 많습니다. 잠시 후 다시 시도하세요.'})
+        response.headers['Retry-After'] = '30'
+        return response, 503
+    
+    include_all = current_user['role'] == 'admin' and request.args.get('all') == '1'
+    subscription = event_bus.subscribe(current_user['user_uid'], include_all)
+    
+    def generate():
+        deadline = time.monotonic() + EVENT_STREAM_SECONDS
+        try:
+            yield "retry: 3000\n\n"
+            yield format_sse('ready', {'uid': current_user['user_uid']})
+            while not subscription.closed:
+                # 이벤트가 없어도 deadline에 맞춰 닫히도록 남은 시간까지만 대기
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                message = subscription.get(timeout=min(HEARTBEAT_SECONDS, remaining))
+                if message is None:
+                    if time.monotonic() < deadline:
+                        yield ": keepalive\n\n"
+                    continue
+                event_id, event, data = message
+                yield format_sse(event, data, event_id)
+        finally:
+            subscription.close()
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@api.route('/api/users', methods=['GET'])
 @token_required
 def get_all_users(current_user):
+    """
+    사용자 목록 조회
+    - page_size, cursor: 문서 ID 순 커서 페이지네이션 (page_size 없으면 전체)
+    - fields: 쉼표로 구분한 필드 목록 (저장소에서 필요한 필드만 읽음)
+    - format=ndjson: 한 줄에 사용자 하나씩 스트리밍, 마지막 줄은 {"next_cursor": ...}
+    - format=columns: 필드별 배열 {"columns": {"id": [...], "email": [...], "stamp_bits": [...]}} (스탬프는 항상 정수)
+    (Accept-Encoding에 따라 gzip/br 압축 - compression.py)
+    """
     if current_user['role'] != 'admin':
         return jsonify({'message': '관리자만 접근 가능합니다.'}), 403
     
+    page_size = request.args.get('page_size')
+    cursor = request.args.get('cursor')
+    fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()]
+    
+    # 숫자가 아닌 값을 None(전체 조회)으로 취급하지 않도록 직접 변환
+    if page_size is not None:
+        try:
+            page_size = int(page_size)
+        except ValueError:
+            page_size = 0
+        if not 1 <= page_size <= MAX_USERS_PAGE_SIZE:
+            return jsonify({'message': f'page_size는 1~{MAX_USERS_PAGE_SIZE} 사이의 정수여야 합니다.'}), 400
+    
+    etag = versions.collection_etag(request.query_string.decode())
+    if etag_matches(etag):
+        return not_modified(etag)
+    return with_etag(list_users_response(page_size, cursor, fields), etag)
+
+def list_users_response(page_size, cursor, fields):
     try:
-        if not db:
-            return jsonify({'users': []}), 200
+        storage = get_storage()
+        if not storage:
+            return jsonify({'message': '데이터베이스 연결에 실패했습니다.'}), 500
+        
+        rows = storage.list_users(page_size, cursor, fields)
+        stamp_format = requested_stamp_format()
+        
+        if request.args.get('format') == 'ndjson':
+            def generate():
+                last_id, row_count = None, 0
+                try:
+                    for user_uid, user_data in rows:
+                        last_id, row_count = user_uid, row_count + 1
+                        yield current_app.json.dumps(present_user_row(user_uid, user_data, stamp_format, fields)) + '\n'
+                except Exception as e:
+                    print(f"User stream error: {e}")
+                    yield current_app.json.dumps({'error': str(e)}) + '\n'
+                    return
+                next_cursor = last_id if page_size and row_count == page_size else None
+                yield current_app.json.dumps({'next_cursor': next_cursor}) + '\n'
             
-        users_ref = db.collection('users')
-        docs = users_ref.stream()
-        users = []
-        for doc in docs:
-            user_data = doc.to_dict()
-            user_data['id'] = doc.id
-            if 'stamps' not in user_data:
-                user_data['stamps'] = {stamp: False for stamp in STAMP_IDS}
-            users.append(user_data)
-        
-        return jsonify({'users': users}), 200
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+        
+        if request.args.get('format') == 'columns':
+            columns, row_count = user_columns(rows, fields)
+            next_cursor = columns['id'][-1] if page_size and row_count == page_size else None
+            return jsonify({'format': 'columns', 'count': row_count, 'stamp_ids': STAMP_IDS,
+                            'columns': columns, 'next_cursor': next_cursor}), 200
+        
+        users = [present_user_row(user_uid, user_data, stamp_format, fields) for user_uid, user_data in rows]
+        next_cursor = users[-1]['id'] if page_size and len(users) == page_size else None
+        
+        return jsonify({'users': users, 'next_cursor': next_cursor}), 200
         
     except Exception as e:
         return jsonify({'message': str(e)}), 500
 
-@app.route('/api/stamps', methods=['GET'])
+STAMP_FIELDS = ('stamps', 'stamp_bits')
+
+def present_user_row(user_uid, user_data, stamp_format, fields=None):
+    """
+    목록 응답용 사용자 한 명 (요청한 필드 + id)
+    저장소는 변환용으로 스탬프 필드를 항상 돌려주지만, 응답에는 stamps/stamp_bits를 요청했을 때만
+    요청한 형식으로 넣음 (map 형식 클라이언트에 저장된 stamp_bits가 그대로 나가지 않도록)
+    """
+    if not fields or any(field in fields for field in STAMP_FIELDS):
+        row = present_stamps(user_data, stamp_format)
+    else:
+        row = {k: v for k, v in user_data.items() if k not in STAMP_FIELDS}
+    if fields:
+        row = {k: v for k, v in row.items() if k in fields or k in STAMP_FIELDS}
+    row['id'] = user_uid
+    return row
+
+def user_columns(rows, fields=None):
+    """
+    사용자 목록 → 필드별 배열 (사용자마다 키 이름을 반복하지 않음)
+    stamp_bits: 비트 i = STAMP_IDS[i], 없는 필드는 None
+
+    Returns:
+        tuple: ({'id': [...], 필드: [...]}, 사용자 수)
+    """
+    columns = {'id': []}
+    row_count = 0
+    for user_uid, user_data in rows:
+        row = present_user_row(user_uid, user_data, FORMAT_BITS, fields)
+        for name, value in row.items():
+            if name not in columns:
+                columns[name] = [None] * row_count   # 앞 사용자들에게는 없던 필드
+            columns[name].append(value)
+        row_count += 1
+        for values in columns.values():
+            if len(values) < row_count:
+                values.append(None)
+    return columns, row_count
+
+@api.route('/api/stamps', methods=['GET'])
 @token_required
 def get_stamps(current_user):
-    return jsonify({'stamps': STAMP_IDS}), 200
+    etag = make_etag(*STAMP_IDS)
+    if etag_matches(etag):
+        return not_modified(etag)
+    return with_etag((jsonify({'stamps': STAMP_IDS}), 200), etag)
 
-@app.route('/api/reset-all-stamps', methods=['POST'])
+def serving_mode():
+    """gevent 워커(gunicorn.conf.py SERVER_MODE=gevent)로 실행 중인지 확인"""
+    try:
+        from gevent import monkey
+        return 'gevent' if monkey.is_module_patched('socket') else 'sync'
+    except ImportError:
+        return 'sync'
+
+@api.route('/api/server-stats', methods=['GET'])
+@token_required
+def get_server_stats(current_user):
+    """서버 내부 통계 (트랜잭션 재시도/경합 등) - admin 전용"""
+    if current_user['role'] != 'admin':
+        return jsonify({'message': '관리자만 접근 가능합니다.'}), 403
+    
+    with transaction_stats_lock:
+        stamp_transactions = dict(transaction_stats)
+    return jsonify({
+        'pid': os.getpid(),
+        'serving_mode': serving_mode(),
+        'stamp_transactions': stamp_transactions,
+        'profile_cache': profile_cache.stats(),
+        'token_claims': token_claims.stats(),
+        'events': event_bus.stats(),
+        'event_feed': user_feed.stats(),
+        'admission': admission.stats(),
+        'idempotency': idempotency_store.stats(),
+        'audit_log': audit_log.stats()
+    }), 200
+
+@api.route('/api/jobs', methods=['GET'])
 @token_required
+def list_jobs(current_user):
+    """이 서버 프로세스의 최근 작업 목록 - admin 전용"""
+    if current_user['role'] != 'admin':
+        return jsonify({'message': '관리자만 접근 가능합니다.'}), 403
+    return jsonify({'jobs': job_runner.list(request.args.get('kind'))}), 200
+
+@api.route('/api/jobs/<job_id>', methods=['GET'])
+@token_required
+def get_job(current_user, job_id):
+    """작업 진행 상황/결과 조회 - admin 전용 (다른 워커의 작업은 저장소에서 조회)"""
+    if current_user['role'] != 'admin':
+        return jsonify({'message': '관리자만 접근 가능합니다.'}), 403
+    
+    try:
+        job = job_runner.get(job_id)
+        storage = get_storage()
+        if not job and storage:
+            job = storage.get_job(job_id)
+        
+        if not job:
+            return jsonify({'message': '작업을 찾을 수 없습니다.'}), 404
+        return jsonify({'job': job}), 200
+        
+    except Exception as e:
+        return jsonify({'message': str(e)}), 500
+
+@api.route('/api/stats', methods=['GET'])
+@token_required
+def get_stats(current_user):
+    """
+    스탬프별 보유 학생 수, 완성도 분포, 부장별 부여 수 (manager/admin)
+    전체 스캔 없이 통계 카운터만 읽습니다. (Firestore: 샤드 문서)
+    """
+    if current_user['role'] not in ['manager', 'admin']:
+        return jsonify({'message': '권한이 없습니다.'}), 403
+    
+    try:
+        storage = get_storage()
+        if not storage:
+            return jsonify({'message': '데이터베이스 연결에 실패했습니다.'}), 500
+        return jsonify(storage.read_stats()), 200
+        
+    except Exception as e:
+        return jsonify({'message': str(e)}), 500
+
+@api.route('/api/stats/rebuild', methods=['POST'])
+@token_required
+def rebuild_stats_job(current_user):
+    """통계 카운터를 users/stamp_grants 전체 스캔으로 다시 계산 (백그라운드 작업) - admin 전용"""
+    if current_user['role'] != 'admin':
+        return jsonify({'message': '관리자만 접근 가능합니다.'}), 403
+    
+    if not get_storage():
+        return jsonify({'message': '데이터베이스 연결에 실패했습니다.'}), 500
+    
+    try:
+        job = job_runner.submit('rebuild_stats', run_rebuild_stats_job,
+                                created_by=current_user['email'], exclusive=True)
+    except JobAlreadyRunning as e:
+        return jsonify({
+            'message': '이미 통계 재계산 작업이 진행 중입니다.',
+            'job_id': e.job['job_id'],
+            'status_url': f"/api/jobs/{e.job['job_id']}"
+        }), 409
+    except JobQueueFull as e:
+        return jsonify({'message': str(e)}), 503
+    
+    return jsonify({
+        'message': '통계 재계산 작업이 시작되었습니다.',
+        'job_id': job.id,
+        'status_url': f'/api/jobs/{job.id}'
+    }), 202
+
+def run_rebuild_stats_job(job):
+    audit_log.record('stats_rebuild', actor=job.created_by, job_id=job.id)
+    return get_storage().rebuild_stats()
+
+@api.route('/api/reset-all-stamps', methods=['POST'])
+@token_required
+@idempotent
 def reset_all_stamps(current_user):
     """
     모든 사용자의 스탬프 기록과 stamp_grants 컬렉션 초기화
     admin만 접근 가능
+    작업은 백그라운드에서 실행되고 job_id를 바로 반환합니다. (GET /api/jobs/<job_id>로 진행 상황 확인)
     """
     if current_user['role'] != 'admin':
         return jsonify({'message': '관리자만 접근 가능합니다.'}), 403
     
+    if not get_storage():
+        return jsonify({'message': '데이터베이스 연결에 실패했습니다.'}), 500
+    
     try:
-        if not db:
-            return jsonify({'message': '데이터베이스 연결에 실패했습니다.'}), 500
-        
-        # 1. 모든 사용자의 stamps 필드 초기화
-        users_ref = db.collection('users')
-        users = users_ref.stream()
-        
-        user_count = 0
-        default_stamps = {stamp: False for stamp in STAMP_IDS}
-        
-        for user_doc in users:
-            user_doc.reference.update({'stamps': default_stamps})
-            user_count += 1
-        
-        # 2. stamp_grants 컬렉션의 모든 문서 삭제
-        grants_ref = db.collection('stamp_grants')
-        grants = grants_ref.stream()
-        
-        grant_count = 0
-        for grant_doc in grants:
-            grant_doc.reference.delete()
-            grant_count += 1
-        
+        job = job_runner.submit('reset_all_stamps', run_reset_job,
+                                created_by=current_user['email'], exclusive=True)
+    except JobAlreadyRunning as e:
         return jsonify({
-            'message': f'모든 스탬프 기록이 초기화되었습니다. (사용자: {user_count}명, 부여기록: {grant_count}건)',
-            'users_reset': user_count,
-            'grants_deleted': grant_count
-        }), 200
-        
-    except Exception as e:
-        print(f"Reset all stamps error: {e}")
-        return jsonify({'message': f'초기화 중 오류 발생: {str(e)}'}), 500
+            'message': '이미 초기화 작업이 진행 중입니다.',
+            'job_id': e.job['job_id'],
+            'status_url': f"/api/jobs/{e.job['job_id']}"
+        }), 409
+    except JobQueueFull as e:
+        return jsonify({'message': str(e)}), 503
+    
+    return jsonify({
+        'message': '초기화 작업이 시작되었습니다.',
+        'job_id': job.id,
+        'status_url': f'/api/jobs/{job.id}'
+    }), 202
+
+@api.route('/api/profiler', methods=['POST'])
+@token_required
+def start_profiler(current_user):
+    """
+    이 요청을 받은 워커에서 샘플링 프로파일러 실행 - admin 전용
+    - seconds: N초 동안, 또는 requests: 다음 요청 N개가 끝날 때까지 (최대 MAX_PROFILE_SECONDS초)
+    - interval_ms: 샘플 간격 (기본 10ms)
+    결과(라우트별 collapsed stacks)는 GET /api/profiler/<job_id>로 조회합니다.
+    """
+    if current_user['role'] != 'admin':
+        return jsonify({'message': '관리자만 접근 가능합니다.'}), 403
+    
+    data = request.json or {}
+    try:
+        seconds = float(data['seconds']) if data.get('seconds') is not None else None
+        max_requests = int(data['requests']) if data.get('requests') is not None else None
+        interval = float(data.get('interval_ms') or 10) / 1000
+    except (TypeError, ValueError):
+        return jsonify({'message': 'seconds, requests, interval_ms는 숫자여야 합니다.'}), 400
+    if seconds is None and max_requests is None:
+        return jsonify({'message': 'seconds 또는 requests는 필수 입력값입니다.'}), 400
+    if seconds is not None and not 0 < seconds <= MAX_PROFILE_SECONDS:
+        return jsonify({'message': f'seconds는 0보다 크고 {MAX_PROFILE_SECONDS} 이하여야 합니다.'}), 400
+    if max_requests is not None and not 0 < max_requests <= MAX_PROFILE_REQUESTS:
+        return jsonify({'message': f'requests는 1 이상 {MAX_PROFILE_REQUESTS} 이하여야 합니다.'}), 400
+    if not 0.001 <= interval <= 1:
+        return jsonify({'message': 'interval_ms는 1 이상 1000 이하여야 합니다.'}), 400
+    
+    try:
+        job = job_runner.submit('profile', run_profile_job, current_app._get_current_object(), seconds,
+                                max_requests, interval, created_by=current_user['email'], exclusive='worker')
+    except JobAlreadyRunning as e:
+        return jsonify({
+            'message': '이 워커에서 이미 프로파일 중입니다.',
+            'job_id': e.job['job_id'],
+            'status_url': f"/api/jobs/{e.job['job_id']}"
+        }), 409
+    except JobQueueFull as e:
+        return jsonify({'message': str(e)}), 503
+    
+    return jsonify({
+        'message': '프로파일을 시작했습니다.',
+        'job_id': job.id,
+        'worker': os.getpid(),
+        'status_url': f'/api/jobs/{job.id}',
+        'profile_url': f'/api/profiler/{job.id}'
+    }), 202
+
+def run_profile_job(job, app, seconds, max_requests, interval):
+    audit_log.record('profiler_start', actor=job.created_by, job_id=job.id,
+                     seconds=seconds, requests=max_requests)
+    result = profiler.run(app, seconds=seconds, max_requests=max_requests, interval=interval)
+    stacks = result.pop('stacks')
+    profiler.save(job.id, stacks)
+    print(f"Profile {job.id}: {result['samples']} samples, {result['requests']} requests, {result['seconds']}s")
+    return {**result, 'worker': os.getpid(), 'stacks': len(stacks), 'profile_url': f'/api/profiler/{job.id}'}
+
+@api.route('/api/profiler/<profile_id>', methods=['GET'])
+@token_required
+def get_profiler_result(current_user, profile_id):
+    """
+    프로파일 결과 (collapsed stacks, text/plain) - admin 전용
+    한 줄에 '라우트;프레임;...;프레임 샘플수' → flamegraph.pl, speedscope 등에 그대로 입력
+    ?route=POST /api/stamps 로 라우트 하나만 볼 수 있습니다. (결과 파일은 PROFILE_DIR에 있어 어느 워커에서든 조회 가능)
+    """
+    if current_user['role'] != 'admin':
+        return jsonify({'message': '관리자만 접근 가능합니다.'}), 403
+    
+    try:
+        stacks = profiler.load(profile_id, request.args.get('route'))
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    if stacks is not None:
+        return Response(stacks, mimetype='text/plain')
+    
+    job = job_runner.get(profile_id)
+    storage = get_storage()
+    if not job and storage:
+        job = storage.get_job(profile_id)
+    if job and job['status'] in (QUEUED, RUNNING):
+        return jsonify({'message': '프로파일 중입니다.', 'job': job}), 202
+    return jsonify({'message': '프로파일을 찾을 수 없습니다.'}), 404
+
+def run_reset_job(job):
+    audit_log.record('reset_all_stamps', actor=job.created_by, job_id=job.id)
+    result = reset_all_stamp_data(get_storage(), progress=job.update)
+    print(f"Reset all stamps: users {result['users_reset']}, grants {result['grants_deleted']}")
+    audit_log.record('reset_all_stamps_finished', actor=job.created_by, job_id=job.id,
+                     users_reset=result['users_reset'], grants_deleted=result['grants_deleted'],
+                     failed=result['failed'])
+    return result
+
+def reset_all_stamp_data(storage, progress=None):
+    """
+    1. 모든 사용자의 스탬프 초기화
+    2. 모든 부여 기록 삭제
+    3. 통계 카운터 초기화
+    (Firestore: 문서 ID만 읽고 batch 단위로 일괄 커밋)
+    
+    Returns:
+        dict: users_reset, grants_deleted, failed, errors
+    """
+    try:
+        return storage.reset_all_stamps(progress=progress)
+    finally:
+        profile_cache.clear()
+        versions.bump_all()
+        event_bus.publish('reset', {})
+
+def create_app():
+    """
+    Flask 앱 생성
+    저장소(Firebase/Firestore 클라이언트, SQLite 연결)는 여기서 만들지 않고 워커 프로세스에서 처음 필요할 때 만듭니다. (fork 안전)
+    """
+    app = Flask(__name__)
+    app.secret_key = os.environ.get('FLASK_SECRET_KEY', 'fallback-secret-key-for-development')
+    CORS(app, origins=allowed_origins)
+    app.register_blueprint(api)
+    app.before_request(start_request_metrics)
+    app.before_request(admit_request)      # 거절할 요청은 워밍업/저장소 작업 전에 거절
+    app.before_request(ensure_warm)
+    app.before_request(start_storage_ops)
+    app.after_request(record_request_metrics)
+    app.after_request(add_storage_ops_header)
+    app.after_request(compress_api_response)
+    app.teardown_request(release_request)
+    app.teardown_request(finish_request_metrics)
+    app.teardown_request(finish_storage_ops)
+    app.teardown_request(count_profiled_request)
+    return app
+
+app = create_app()
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
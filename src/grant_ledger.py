@@ -0,0 +1,39 @@
+"""
+stamp_grants 부여 기록 문서 키 규칙
+- stamp_grants/{manager}|{target}      : 부장 1인당 대상 1회 제한 (create()로 중복 방지)
+- stamp_grant_keys/{target}|{stamp_id} : 회수 시 부여 기록을 찾기 위한 보조 키
+쿼리 없이 포인트 조회/삭제만으로 제한 확인과 회수를 처리합니다.
+"""
+
+GRANTS_COLLECTION = 'stamp_grants'
+GRANT_KEYS_COLLECTION = 'stamp_grant_keys'
+
+
+def grant_doc_id(manager_email, target_email):
+    return f"{manager_email}|{target_email}"
+
+
+def grant_key_id(target_email, stamp_id):
+    return f"{target_email}|{stamp_id}"
+
+
+def grant_ref(db, manager_email, target_email):
+    return db.collection(GRANTS_COLLECTION).document(grant_doc_id(manager_email, target_email))
+
+
+def grant_key_ref(db, target_email, stamp_id):
+    return db.collection(GRANT_KEYS_COLLECTION).document(grant_key_id(target_email, stamp_id))
+
+
+def grant_key_data(manager_email, target_email, stamp_id):
+    return {
+        'grant_id': grant_doc_id(manager_email, target_email),
+        'manager_email': manager_email,
+        'target_email': target_email,
+        'stamp_id': stamp_id,
+    }
+
+
+def is_keyed_grant(doc_id, grant_data):
+    """이미 결정적 키로 저장된 부여 기록인지 확인"""
+    return doc_id == grant_doc_id(grant_data.get('manager_email'), grant_data.get('target_email'))
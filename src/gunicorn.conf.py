@@ -0,0 +1,43 @@
+"""
+gunicorn 설정 (src에서 `gunicorn flask_auth_server:app` 실행 시 자동으로 읽음)
+- SERVER_MODE=gevent (기본): 요청마다 greenlet → Firestore 응답을 기다리는 동안 같은 워커가 다른 요청 처리
+  워커 하나가 WORKER_CONNECTIONS개까지 동시에 처리 (SSE /api/events 연결도 워커를 점유하지 않음)
+- SERVER_MODE=sync: 기존 동기 워커 (요청 하나가 워커 하나를 점유)
+"""
+
+import os
+
+SERVER_MODE = os.environ.get('SERVER_MODE', 'gevent')
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+
+if SERVER_MODE == 'gevent':
+    worker_class = 'gevent'
+    # SSE 연결(MAX_EVENT_STREAMS, 기본 학생 1000명 기준 1200)도 연결 하나씩 차지 → 일반 요청 몫을 더해 잡음
+    worker_connections = int(os.environ.get('WORKER_CONNECTIONS', 2000))
+
+    # ✅ 앱(firebase_admin/grpc)을 import하기 전에 패치해야 Firestore 호출이 greenlet을 양보함
+    from gevent import monkey
+    monkey.patch_all()
+
+    import grpc.experimental.gevent as grpc_gevent
+    grpc_gevent.init_gevent()
+else:
+    worker_class = 'sync'
+
+# 클라이언트는 워커에서 지연 생성하므로 --preload(앱 코드 공유)도 안전
+preload_app = os.environ.get('GUNICORN_PRELOAD') == '1'
+
+
+def post_worker_init(worker):
+    # ✅ 요청을 받기 전에 워커마다 Firestore 채널/인증서/인덱스 준비
+    from flask_auth_server import warm_up
+    warm_up()
+
+
+def worker_exit(server, worker):
+    # ✅ 종료 전 남은 감사 로그 기록 (실패분은 spill 파일로)
+    from flask_auth_server import audit_log
+    audit_log.shutdown()
@@ -0,0 +1,75 @@
+"""
+Idempotency-Key 저장소
+같은 키로 다시 온 요청(클라이언트 재시도)에는 처음 요청의 응답을 그대로 돌려줍니다. (Firestore 접근 없음)
+- 키는 (요청한 사용자, 경로, Idempotency-Key) 단위, 최대 개수/보관 시간 제한 (LRU + TTL)
+- 같은 키인데 요청 본문이 다르면 거절
+- 처음 요청이 아직 처리 중이면 잠시 기다렸다가 그 결과를 돌려줌
+프로세스 메모리에 저장하므로 여러 워커로 실행하면 같은 워커로 온 재시도만 재사용됩니다.
+"""
+
+import hashlib
+import threading
+
+from cache import LRUCache
+
+DEFAULT_MAXSIZE = 10000
+DEFAULT_TTL_SECONDS = 24 * 3600
+MAX_KEY_LENGTH = 255
+
+
+def request_fingerprint(body):
+    return hashlib.sha256(body or b'').hexdigest()
+
+
+class IdempotencyEntry:
+    def __init__(self, fingerprint):
+        self.fingerprint = fingerprint
+        self.done = threading.Event()
+        self.response = None     # (body bytes, status, headers)
+
+    def wait(self, timeout):
+        """처음 요청이 끝날 때까지 대기 (끝났으면 저장된 응답, 시간 초과면 None)"""
+        if self.done.wait(timeout):
+            return self.response
+        return None
+
+
+class IdempotencyStore:
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, ttl=DEFAULT_TTL_SECONDS):
+        self._lock = threading.Lock()
+        self.entries = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.replays = 0
+        self.conflicts = 0
+
+    def begin(self, key, fingerprint):
+        """
+        Returns:
+            tuple: (entry, 새로 시작한 요청인지)
+        """
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                return entry, False
+            entry = IdempotencyEntry(fingerprint)
+            self.entries.set(key, entry)
+            return entry, True
+
+    def complete(self, key, entry, body, status, headers):
+        entry.response = (body, status, headers)
+        entry.done.set()
+
+    def abandon(self, key, entry):
+        """처리 실패(5xx/예외) → 키를 지워서 재시도가 다시 실행되도록"""
+        with self._lock:
+            if self.entries.get(key) is entry:
+                self.entries.pop(key)
+        entry.done.set()
+
+    def count(self, outcome):
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def stats(self):
+        with self._lock:
+            replays, conflicts = self.replays, self.conflicts
+        return {**self.entries.stats(), 'replays': replays, 'conflicts': conflicts}
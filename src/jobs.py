@@ -0,0 +1,209 @@
+"""
+백그라운드 작업 실행기
+오래 걸리는 관리자 작업(전체 초기화, 내보내기, 일괄 역할 변경 등)을 요청 스레드 밖에서 실행합니다.
+- 서버 프로세스 안의 제한된 스레드 풀에서 실행
+- 작업 ID로 진행 상황/결과/오류 조회
+- persist 콜백이 있으면 상태 변화를 외부 저장소(Firestore jobs 컬렉션)에 기록 → 다른 워커에서도 조회 가능
+- acquire_lease/release_lease 콜백이 있으면 exclusive 작업은 저장소 임대도 잡음 → 다른 워커에서도 같은 종류 작업 거부
+  (임대는 LEASE_SECONDS 동안 유효하고 진행 상황을 저장할 때마다 연장, 워커가 죽으면 만료 후 다시 실행 가능)
+"""
+
+import datetime
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_MAX_WORKERS = 2
+DEFAULT_MAX_PENDING = 10          # 대기+실행 중 작업 최대 수
+DEFAULT_MAX_JOBS_KEPT = 100       # 메모리에 보관하는 최근 작업 수
+PERSIST_INTERVAL_SECONDS = 2.0    # 진행 상황 저장 최소 간격
+LEASE_SECONDS = 600               # exclusive 작업 임대 유효 시간 (진행 상황 저장 때 연장)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobAlreadyRunning(Exception):
+    def __init__(self, job):
+        super().__init__(f"{job['kind']} 작업이 이미 진행 중입니다.")
+        self.job = job
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+class Job:
+    def __init__(self, runner, kind, created_by=None):
+        self._runner = runner
+        self._last_persist = 0.0
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.created_by = created_by
+        self.leased = False
+        self.status = QUEUED
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.created_at = _now()
+        self.started_at = None
+        self.finished_at = None
+
+    def update(self, stage, counts):
+        """작업 함수에서 진행 상황 보고 (stage별 카운트)"""
+        with self._runner._lock:
+            self.progress[stage] = counts
+        now = time.monotonic()
+        if now - self._last_persist >= PERSIST_INTERVAL_SECONDS:
+            self._last_persist = now
+            self._runner._persist(self)
+            self._runner._renew_lease(self)
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'created_by': self.created_by,
+            'progress': dict(self.progress),
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class JobRunner:
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, max_pending=DEFAULT_MAX_PENDING,
+                 max_jobs_kept=DEFAULT_MAX_JOBS_KEPT, persist=None, acquire_lease=None, release_lease=None):
+        """
+        Args:
+            persist: job_data → None (상태 저장)
+            acquire_lease: (kind, job_id, seconds) → None (잡음) 또는 임대 중인 작업 dict
+            release_lease: (kind, job_id) → None
+        """
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._jobs = OrderedDict()
+        self.max_pending = max_pending
+        self.max_jobs_kept = max_jobs_kept
+        self.persist = persist
+        self.acquire_lease = acquire_lease
+        self.release_lease = release_lease
+
+    def submit(self, kind, fn, *args, created_by=None, exclusive=False, **kwargs):
+        """
+        fn(job, *args, **kwargs)를 백그라운드에서 실행
+
+        Args:
+            exclusive: True - 같은 종류 작업이 이 워커나 (임대 콜백이 있으면) 다른 워커에서 진행 중이면 거부
+                       'worker' - 이 워커에서만 확인 (워커마다 따로 도는 작업)
+        Returns:
+            Job
+        Raises:
+            JobQueueFull: 대기 중인 작업이 너무 많을 때
+            JobAlreadyRunning: exclusive인데 같은 종류의 작업이 대기/실행 중일 때
+        """
+        job = Job(self, kind, created_by)
+        with self._lock:
+            self._check_submit(kind, exclusive)
+        if exclusive is True and self.acquire_lease:
+            # 저장소 호출은 잠금 밖에서 (같은 워커의 동시 제출은 임대에서 한쪽만 성공)
+            holder = self.acquire_lease(kind, job.id, LEASE_SECONDS)
+            if holder is not None:
+                raise JobAlreadyRunning(holder)
+            job.leased = True
+        try:
+            with self._lock:
+                self._check_submit(kind, exclusive)
+                self._jobs[job.id] = job
+                self._trim()
+        except (JobAlreadyRunning, JobQueueFull):
+            self._release_lease(job)
+            raise
+        self._persist(job)
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.to_dict() if job else None
+
+    def list(self, kind=None):
+        with self._lock:
+            return [job.to_dict() for job in reversed(self._jobs.values()) if not kind or job.kind == kind]
+
+    def _check_submit(self, kind, exclusive):
+        if exclusive:
+            for active_job in self._active_jobs():
+                if active_job.kind == kind:
+                    raise JobAlreadyRunning(active_job.to_dict())
+        if len(self._active_jobs()) >= self.max_pending:
+            raise JobQueueFull(f'대기 중인 작업이 너무 많습니다. (최대 {self.max_pending}개)')
+
+    def _active_jobs(self):
+        return [job for job in self._jobs.values() if job.status in (QUEUED, RUNNING)]
+
+    def _trim(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in (SUCCEEDED, FAILED)]
+        while len(self._jobs) > self.max_jobs_kept and finished:
+            del self._jobs[finished.pop(0)]
+
+    def _run(self, job, fn, args, kwargs):
+        with self._lock:
+            job.status = RUNNING
+            job.started_at = _now()
+        self._persist(job)
+        self._renew_lease(job)   # 대기열에서 기다린 시간만큼 임대가 줄어 있음
+        try:
+            result = fn(job, *args, **kwargs)
+            with self._lock:
+                job.result = result
+                job.status = SUCCEEDED
+        except Exception as e:
+            print(f"Job {job.kind} {job.id} failed: {e}")
+            with self._lock:
+                job.error = str(e)
+                job.status = FAILED
+        finally:
+            with self._lock:
+                job.finished_at = _now()
+            self._persist(job)
+            self._release_lease(job)
+
+    def _persist(self, job):
+        if not self.persist:
+            return
+        try:
+            with self._lock:
+                job_data = job.to_dict()
+            self.persist(job_data)
+        except Exception as e:
+            print(f"Job persist error: {e}")
+
+    def _renew_lease(self, job):
+        if not job.leased:
+            return
+        try:
+            self.acquire_lease(job.kind, job.id, LEASE_SECONDS)
+        except Exception as e:
+            print(f"Job lease renew error: {e}")
+
+    def _release_lease(self, job):
+        if not job.leased or not self.release_lease:
+            return
+        job.leased = False
+        try:
+            self.release_lease(job.kind, job.id)
+        except Exception as e:
+            print(f"Job lease release error: {e}")
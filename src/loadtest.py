@@ -0,0 +1,411 @@
+"""
+축제 당일 트래픽 부하 테스트 (Firebase 없이 로컬 저장소로 실행)
+학생 1,000명 + 부장 34명 + 관리자가 동시에 접속한 상황을 흉내 내어
+/api/login, /api/profile, /api/stamps(부장 순차 부여, 관리자 부여/회수), /api/users 를 호출하고
+엔드포인트별 처리량과 p50/p95/p99 지연 시간을 JSON 파일로 저장합니다. (실행 결과끼리 비교용)
+
+- 저장소: --backend memory | sqlite | firestore (firestore는 FIRESTORE_EMULATOR_HOST 등 설정 필요)
+- 로그인: flask_auth_server.verify_firebase_id_token을 가짜 토큰 검증으로 교체 (이 프로세스 안에서만)
+- 전송: --transport inprocess (Flask test_client) | http (로컬 HTTP 서버를 띄워 requests로 호출)
+- 도착: 개방형(open-loop) 포아송 도착 --rate 요청/초, 지연 시간은 예정된 도착 시각부터 측정
+  (서버가 밀리면 대기 시간도 지연에 포함됨)
+
+실행 (src에서):
+    python loadtest.py --backend sqlite --duration 60 --rate 200 --output loadtest_results.json
+"""
+
+import argparse
+import datetime
+import json
+import math
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+from stamp_codec import STAMP_IDS
+
+ADMIN_EMAIL = '2411224@jeohyeon.hs.kr'
+FIRST_STUDENT_NUMBER = 2400001
+SETUP_MAX_RETRIES = 50
+SETUP_RETRY_SECONDS = 0.2
+
+# 작업 이름 → (엔드포인트, 기본 비중)
+OPERATIONS = {
+    'login': ('POST /api/login', 10),
+    'profile': ('GET /api/profile', 50),
+    'manager_grant': ('POST /api/stamps', 30),
+    'admin_grant': ('POST /api/stamps', 4),
+    'admin_revoke': ('POST /api/stamps', 2),
+    'users': ('GET /api/users', 1),
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='flask_auth_server 오프라인 부하 테스트')
+    parser.add_argument('--backend', default='memory', choices=['memory', 'sqlite', 'firestore'])
+    parser.add_argument('--sqlite-path', default='loadtest.sqlite3')
+    parser.add_argument('--transport', default='inprocess', choices=['inprocess', 'http'])
+    parser.add_argument('--students', type=int, default=1000)
+    parser.add_argument('--managers', type=int, default=34)
+    parser.add_argument('--duration', type=float, default=30, help='측정 시간(초)')
+    parser.add_argument('--rate', type=float, default=200, help='초당 평균 도착 요청 수')
+    parser.add_argument('--concurrency', type=int, default=32, help='동시에 요청을 보내는 스레드 수')
+    parser.add_argument('--mix', default='', help='작업 비중 덮어쓰기 (예: profile=70,manager_grant=20)')
+    parser.add_argument('--users-page-size', type=int, default=0, help='/api/users page_size (0이면 전체)')
+    parser.add_argument('--no-rate-limits', action='store_true', help='요청 수락 제어 한도 해제 (최대 처리량 측정)')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--output', default='loadtest_results.json')
+    return parser.parse_args(argv)
+
+
+def parse_mix(mix):
+    weights = {name: weight for name, (_, weight) in OPERATIONS.items()}
+    for item in filter(None, (part.strip() for part in mix.split(','))):
+        name, _, weight = item.partition('=')
+        if name not in OPERATIONS:
+            raise ValueError(f"알 수 없는 작업: {name} (가능: {', '.join(OPERATIONS)})")
+        weights[name] = float(weight)
+    return {name: weight for name, weight in weights.items() if weight > 0}
+
+
+def configure_environment(args):
+    """flask_auth_server import 전에 저장소/한도 설정"""
+    os.environ['STORAGE_BACKEND'] = args.backend
+    if args.backend == 'sqlite':
+        os.environ['SQLITE_PATH'] = args.sqlite_path
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(args.sqlite_path + suffix):
+                os.remove(args.sqlite_path + suffix)
+    if args.no_rate_limits:
+        unlimited = [1e9, 1e9]
+        os.environ['RATE_LIMITS'] = json.dumps({role: unlimited for role in ('student', 'manager', 'admin')})
+        os.environ['IP_RATE_LIMIT'] = json.dumps({'ip': unlimited})
+        os.environ['ENDPOINT_RATE_LIMITS'] = json.dumps({endpoint: unlimited for endpoint, _ in OPERATIONS.values()})
+        os.environ['MAX_IN_FLIGHT'] = str(max(args.concurrency, 64))
+
+
+def fake_id_token(uid, email):
+    return f"loadtest:{uid}:{email}"
+
+
+def verify_fake_id_token(id_token):
+    """부하 테스트용 ID 토큰 검증 (loadtest:{uid}:{email})"""
+    _, uid, email = id_token.split(':', 2)
+    return {'uid': uid, 'email': email, 'name': uid}
+
+
+class InProcessTransport:
+    """Flask test_client 호출 (네트워크 없음, 스레드마다 클라이언트 하나)"""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, token=None, body=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        response = client.open(path, method=method, json=body, headers=headers)
+        return response.status_code, response.get_json(silent=True)
+
+    def close(self):
+        pass
+
+
+class HttpTransport:
+    """같은 프로세스에서 로컬 HTTP 서버(werkzeug, 스레드)를 띄우고 requests.Session으로 호출"""
+
+    def __init__(self, app):
+        import requests
+        from werkzeug.serving import make_server
+        self.requests = requests
+        self.server = make_server('127.0.0.1', 0, app, threaded=True)
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+        self.thread = threading.Thread(target=self.server.serve_forever, name='loadtest-http', daemon=True)
+        self.thread.start()
+        self._local = threading.local()
+
+    def request(self, method, path, token=None, body=None):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = self.requests.Session()
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        response = session.request(method, self.base_url + path, json=body, headers=headers, timeout=60)
+        try:
+            return response.status_code, response.json()
+        except ValueError:
+            return response.status_code, None
+
+    def close(self):
+        self.server.shutdown()
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)   # 작업 → 지연(ms, 예정 도착 시각부터)
+        self.service = defaultdict(list)     # 작업 → 처리 시간(ms, 실제 요청 시작부터)
+        self.statuses = defaultdict(Counter)
+
+    def add(self, name, status, latency, service):
+        with self._lock:
+            self.latencies[name].append(latency * 1000)
+            self.service[name].append(service * 1000)
+            self.statuses[name][str(status)] += 1
+
+
+def percentile(sorted_values, p):
+    """nearest-rank 백분위수"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return round(sorted_values[rank - 1], 3)
+
+
+def summarize(values):
+    values = sorted(values)
+    if not values:
+        return {}
+    return {
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        'mean': round(sum(values) / len(values), 3),
+        'max': round(values[-1], 3),
+    }
+
+
+class FestivalSimulation:
+    def __init__(self, args, transport):
+        self.args = args
+        self.transport = transport
+        self.rng = random.Random(args.seed)
+        self.rng_lock = threading.Lock()
+        self.recorder = Recorder()
+        self.tokens = {}
+        self.students = [(f'student{n}', f'{n}@jeohyeon.hs.kr')
+                         for n in range(FIRST_STUDENT_NUMBER, FIRST_STUDENT_NUMBER + args.students)]
+        self.managers = [(f'manager{n}', f'manager{n}@jeohyeon.hs.kr') for n in range(1, args.managers + 1)]
+        self.admin = ('admin', ADMIN_EMAIL)
+
+    def choice(self, items):
+        with self.rng_lock:
+            return self.rng.choice(items)
+
+    def setup_request(self, method, path, token=None, body=None):
+        """준비 단계 요청 (측정하지 않음, 429면 잠시 기다렸다가 재시도)"""
+        for _ in range(SETUP_MAX_RETRIES):
+            status, response = self.transport.request(method, path, token, body)
+            if status != 429:
+                return status, response
+            time.sleep(SETUP_RETRY_SECONDS)
+        return status, response
+
+    def setup_login(self, account):
+        uid, email = account
+        status, body = self.setup_request('POST', '/api/login', body={'id_token': fake_id_token(uid, email)})
+        if status == 200:
+            self.tokens[uid] = body['access_token']
+        return status
+
+    def setup(self):
+        """모든 계정 로그인(가입) → 부장 역할 지정 → 부장 재로그인 (요청 수락 제어 한도 안에서)"""
+        started = time.perf_counter()
+        failed = Counter()
+        for account in [self.admin] + self.students + self.managers:
+            status = self.setup_login(account)
+            if status != 200:
+                failed[str(status)] += 1
+        for _, email in self.managers:
+            status, _ = self.setup_request('POST', '/api/role', self.tokens.get('admin'),
+                                           {'target_email': email, 'new_role': 'manager'})
+            if status != 200:
+                failed[str(status)] += 1
+        for account in self.managers:
+            self.setup_login(account)
+        return {
+            'accounts': 1 + len(self.students) + len(self.managers),
+            'seconds': round(time.perf_counter() - started, 3),
+            'failed': dict(failed),
+        }
+
+    def run_operation(self, name):
+        """작업 하나 실행 → HTTP 상태 코드"""
+        if name == 'login':
+            account = self.choice(self.students)
+            status, body = self.transport.request('POST', '/api/login',
+                                                  body={'id_token': fake_id_token(*account)})
+            if status == 200:
+                self.tokens[account[0]] = body['access_token']
+            return status
+        if name == 'profile':
+            uid, _ = self.choice(self.students)
+            return self.transport.request('GET', '/api/profile', self.tokens.get(uid))[0]
+        if name == 'manager_grant':
+            manager_uid, _ = self.choice(self.managers)
+            _, target_email = self.choice(self.students)
+            return self.transport.request('POST', '/api/stamps', self.tokens.get(manager_uid), {
+                'target_email': target_email, 'action': 'grant', 'auto_grant': True})[0]
+        if name in ('admin_grant', 'admin_revoke'):
+            _, target_email = self.choice(self.students)
+            return self.transport.request('POST', '/api/stamps', self.tokens.get('admin'), {
+                'target_email': target_email,
+                'action': 'grant' if name == 'admin_grant' else 'revoke',
+                'stamp_id': self.choice(STAMP_IDS)})[0]
+        if name == 'users':
+            path = '/api/users'
+            if self.args.users_page_size:
+                path += f'?page_size={self.args.users_page_size}'
+            return self.transport.request('GET', path, self.tokens.get('admin'))[0]
+        raise ValueError(name)
+
+    def run(self, weights):
+        """
+        개방형 도착: 스케줄러 스레드가 지수 분포 간격으로 (작업, 예정 시각)을 큐에 넣고
+        concurrency개의 스레드가 꺼내서 실행
+        """
+        names = list(weights)
+        weight_values = list(weights.values())
+        arrivals = queue.Queue()
+        stop = object()
+
+        def worker():
+            while True:
+                item = arrivals.get()
+                if item is stop:
+                    return
+                name, scheduled = item
+                started = time.perf_counter()
+                try:
+                    status = self.run_operation(name)
+                except Exception as e:
+                    print(f"{name} 요청 오류: {e}")
+                    status = 'exception'
+                finished = time.perf_counter()
+                self.recorder.add(name, status, finished - scheduled, finished - started)
+
+        workers = [threading.Thread(target=worker, name=f'loadtest-{i}', daemon=True)
+                   for i in range(self.args.concurrency)]
+        for thread in workers:
+            thread.start()
+
+        started = time.perf_counter()
+        deadline = started + self.args.duration
+        next_arrival = started
+        offered = 0
+        while True:
+            with self.rng_lock:
+                next_arrival += self.rng.expovariate(self.args.rate)
+                name = self.rng.choices(names, weights=weight_values)[0]
+            if next_arrival >= deadline:
+                break
+            delay = next_arrival - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            arrivals.put((name, next_arrival))
+            offered += 1
+
+        backlog_at_deadline = arrivals.qsize()
+        for _ in workers:
+            arrivals.put(stop)
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        return {'offered': offered, 'backlog_at_deadline': backlog_at_deadline, 'elapsed': elapsed}
+
+
+def build_report(args, weights, setup, run, recorder, server_stats):
+    endpoints = {}
+    for name in sorted(recorder.latencies):
+        count = len(recorder.latencies[name])
+        endpoints[name] = {
+            'endpoint': OPERATIONS[name][0],
+            'count': count,
+            'throughput': round(count / run['elapsed'], 2),
+            'status': dict(recorder.statuses[name]),
+            'latency_ms': summarize(recorder.latencies[name]),
+            'service_ms': summarize(recorder.service[name]),
+        }
+    total = sum(endpoint['count'] for endpoint in endpoints.values())
+    return {
+        'started_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'config': {
+            'backend': args.backend,
+            'transport': args.transport,
+            'students': args.students,
+            'managers': args.managers,
+            'duration': args.duration,
+            'rate': args.rate,
+            'concurrency': args.concurrency,
+            'mix': weights,
+            'rate_limits': not args.no_rate_limits,
+            'seed': args.seed,
+            'python': sys.version.split()[0],
+        },
+        'setup': setup,
+        'offered_requests': run['offered'],
+        'completed_requests': total,
+        'backlog_at_deadline': run['backlog_at_deadline'],
+        'elapsed_seconds': round(run['elapsed'], 3),
+        'throughput': round(total / run['elapsed'], 2),
+        'endpoints': endpoints,
+        'server': server_stats,
+    }
+
+
+def print_report(report):
+    print("\n" + "="*92)
+    print(f"📊 부하 테스트 결과 ({report['config']['backend']}, {report['config']['transport']}, "
+          f"{report['elapsed_seconds']}초, {report['throughput']} req/s)")
+    print("="*92)
+    print(f"{'작업':<14}{'엔드포인트':<20}{'요청':>7}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}  상태")
+    for name, result in report['endpoints'].items():
+        latency = result['latency_ms']
+        statuses = ', '.join(f"{status}:{n}" for status, n in sorted(result['status'].items()))
+        print(f"{name:<14}{result['endpoint']:<20}{result['count']:>7}{result['throughput']:>9}"
+              f"{latency.get('p50', 0):>10}{latency.get('p95', 0):>10}{latency.get('p99', 0):>10}  {statuses}")
+    if report['backlog_at_deadline']:
+        print(f"\n⚠️  측정 종료 시 대기 중이던 요청 {report['backlog_at_deadline']}건 (도착률이 처리량보다 높음)")
+    print("="*92)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    weights = parse_mix(args.mix)
+    configure_environment(args)
+
+    import flask_auth_server as server
+    server.verify_firebase_id_token = verify_fake_id_token
+    server.warm_up()
+
+    transport = HttpTransport(server.app) if args.transport == 'http' else InProcessTransport(server.app)
+    simulation = FestivalSimulation(args, transport)
+    try:
+        print(f"👥 계정 준비: 학생 {args.students}명, 부장 {args.managers}명, 관리자 1명")
+        setup = simulation.setup()
+        print(f"   {setup['seconds']}초, 실패 {setup['failed'] or '없음'}")
+
+        print(f"🚀 {args.duration}초 동안 초당 {args.rate}건 도착, 동시 {args.concurrency}")
+        run = simulation.run(weights)
+        status, server_stats = transport.request('GET', '/api/server-stats', simulation.tokens.get('admin'))
+    finally:
+        transport.close()
+
+    report = build_report(args, weights, setup, run, simulation.recorder, server_stats if status == 200 else None)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print_report(report)
+    print(f"💾 결과 파일: {args.output}")
+    return report
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n\n⚠️  사용자에 의해 중단되었습니다.")
@@ -0,0 +1,217 @@
+"""
+Prometheus 텍스트 형식 메트릭 (/metrics)
+- Counter, Gauge, Histogram: 라벨 조합(child)마다 작은 잠금 하나 → 요청 스레드끼리 거의 경합 없음
+  (child 생성 시에만 메트릭 잠금, 이후 조회는 dict.get)
+- 캐시/큐 상태처럼 이미 다른 곳에서 세고 있는 값은 스크랩할 때 콜백으로 읽음 (요청당 비용 없음)
+값은 프로세스(워커)별입니다. 모든 시계열에 worker 라벨(pid)이 붙습니다.
+"""
+
+import bisect
+import os
+import threading
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in pairs) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return repr(value)
+    return str(value)
+
+
+class _CounterChild:
+    __slots__ = ('_lock', 'value')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+
+class _HistogramChild:
+    __slots__ = ('_lock', 'bounds', 'counts', 'sum')
+
+    def __init__(self, bounds):
+        self._lock = threading.Lock()
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)   # 마지막 칸: +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum
+
+
+class _Metric:
+    kind = None
+    child_class = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new_child(self):
+        return self.child_class()
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def samples(self):
+        """(이름 접미사, 라벨 값 튜플, 추가 라벨, 값) 목록"""
+        with self._lock:
+            children = list(self._children.items())
+        return [('', values, (), child.value) for values, child in children]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+    child_class = _CounterChild
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+    child_class = _GaugeChild
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def dec(self, amount=1):
+        self._default.dec(amount)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def samples(self):
+        with self._lock:
+            children = list(self._children.items())
+        samples = []
+        for values, child in children:
+            counts, total = child.snapshot()
+            cumulative = 0
+            for bound, count in zip(self.bounds + (float('inf'),), counts):
+                cumulative += count
+                samples.append(('_bucket', values, (('le', format_value(float(bound))),), cumulative))
+            samples.append(('_sum', values, (), total))
+            samples.append(('_count', values, (), cumulative))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def collector(self, fn):
+        """
+        스크랩 시 호출할 콜백 등록 (데코레이터로 사용 가능)
+        fn() → [(이름, 종류, 설명, {라벨 튜플(('이름', 값), ...): 값})]
+        """
+        with self._lock:
+            self._collectors.append(fn)
+        return fn
+
+    def render(self):
+        """Prometheus 텍스트 노출 형식"""
+        worker = (('worker', str(os.getpid())),)
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for suffix, values, extra, value in metric.samples():
+                labels = format_labels(metric.labelnames, values, extra + worker)
+                lines.append(f'{metric.name}{suffix}{labels} {format_value(value)}')
+
+        for collect in collectors:
+            try:
+                families = collect()
+            except Exception as e:
+                print(f"Metrics collector error: {e}")
+                continue
+            for name, kind, documentation, series in families:
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in series.items():
+                    if value is None:
+                        continue
+                    lines.append(f'{name}{format_labels((), (), tuple(labels) + worker)} {format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+# 서버 전체가 공유하는 기본 레지스트리
+REGISTRY = Registry()
@@ -3,23 +3,41 @@ Firestore 데이터베이스 마이그레이션 스크립트
 booth1-34 → stamp1-34 변환 및 데이터 구조 정리
 """
 
-import firebase_admin
-from firebase_admin import credentials, firestore
+from firebase_admin import firestore
+from firebase_clients import initialize_firebase, get_db
 import json
 from datetime import datetime
+from bulk_writes import bulk_apply
 
 # Firebase Admin SDK 초기화
-cred = credentials.Certificate("serviceAccountKey.json")
-firebase_admin.initialize_app(cred)
-
-db = firestore.client()
+initialize_firebase("serviceAccountKey.json")
+db = get_db()
 
 # 스탬프 ID 목록
 STAMP_IDS = [f"stamp{i}" for i in range(1, 35)]
 
+def booth_to_stamp_op(batch, doc):
+    """
+    booth1-34 키가 있는 문서를 stamp1-34로 변환하는 batch 쓰기
+    (이미 마이그레이션된 문서는 False 반환 → 스킵)
+    """
+    current_stamps = doc.to_dict().get('stamps', {})
+    
+    # booth로 시작하는 키가 있는지 확인
+    has_booth_keys = any(key.startswith('booth') for key in current_stamps.keys())
+    if not has_booth_keys:
+        return False
+    
+    # 새로운 스탬프 구조 생성 (기존 데이터가 있으면 유지, 없으면 False)
+    new_stamps = {}
+    for i in range(1, 35):
+        new_stamps[f"stamp{i}"] = current_stamps.get(f"booth{i}", False)
+    
+    batch.update(doc.reference, {'stamps': new_stamps})
+
 def migrate_booth_to_stamp():
     """
-    booth1-34를 stamp1-34로 변환
+    booth1-34를 stamp1-34로 변환 (batch 일괄 쓰기)
     """
     print("\n" + "="*60)
     print("🔄 스탬프 ID 마이그레이션 시작 (booth → stamp)")
@@ -27,46 +45,16 @@ def migrate_booth_to_stamp():
     
     try:
         users_ref = db.collection('users')
-        docs = users_ref.stream()
+        docs = users_ref.select(['stamps']).stream()
         
-        migrated_count = 0
-        skipped_count = 0
-        error_count = 0
+        def progress(counts):
+            print(f"   ⏳ 처리 {counts['processed']}건 (변환 {counts['written']}, 스킵 {counts['skipped']}, 실패 {counts['failed']})")
         
-        for doc in docs:
-            try:
-                user_data = doc.to_dict()
-                email = user_data.get('email', 'Unknown')
-                current_stamps = user_data.get('stamps', {})
-                
-                # booth로 시작하는 키가 있는지 확인
-                has_booth_keys = any(key.startswith('booth') for key in current_stamps.keys())
-                
-                if not has_booth_keys:
-                    print(f"⏭️  {email} - 이미 마이그레이션 완료 (스킵)")
-                    skipped_count += 1
-                    continue
-                
-                # 새로운 스탬프 구조 생성
-                new_stamps = {}
-                for i in range(1, 35):
-                    old_key = f"booth{i}"
-                    new_key = f"stamp{i}"
-                    
-                    # 기존 데이터가 있으면 유지, 없으면 False
-                    new_stamps[new_key] = current_stamps.get(old_key, False)
-                
-                # 문서 업데이트
-                doc.reference.update({'stamps': new_stamps})
-                
-                # 진행 상황 표시
-                stamp_count = sum(1 for v in new_stamps.values() if v)
-                print(f"✅ {email} - {stamp_count}개 스탬프 마이그레이션 완료")
-                migrated_count += 1
-                
-            except Exception as e:
-                print(f"❌ {doc.id} 마이그레이션 실패: {e}")
-                error_count += 1
+        result = bulk_apply(db, docs, booth_to_stamp_op, progress=progress)
+        for error in result.errors:
+            print(f"❌ {error}")
+        
+        migrated_count, skipped_count, error_count = result.written, result.skipped, result.failed
         
         print("\n" + "="*60)
         print("📊 마이그레이션 결과")
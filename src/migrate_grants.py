@@ -0,0 +1,213 @@
+"""
+stamp_grants 부여 기록 마이그레이션 스크립트
+자동 생성 ID 문서 → {manager}|{target} 결정적 키 문서 + stamp_grant_keys 보조 키
+(bulk_writes: 최대 500개 쓰기 batch, 병렬 커밋, 재시도)
+"""
+
+from firebase_clients import initialize_firebase, get_db
+import json
+from datetime import datetime
+from bulk_writes import bulk_apply
+from grant_ledger import (GRANTS_COLLECTION, GRANT_KEYS_COLLECTION, grant_doc_id,
+                          grant_key_ref, grant_key_data, is_keyed_grant)
+from user_index import normalize_email
+
+# Firebase Admin SDK 초기화
+initialize_firebase("serviceAccountKey.json")
+db = get_db()
+
+def granted_at_sort_key(grant_doc):
+    granted_at = grant_doc.to_dict().get('granted_at')
+    return granted_at.timestamp() if granted_at else float('inf')
+
+class GrantMigration:
+    """
+    부여 기록 하나의 처리 계획 (bulk_apply에 넘기는 항목)
+    action: backfill(보조 키만 보충) | duplicate(중복 삭제) | migrate(키 문서로 변환)
+    """
+    def __init__(self, doc, action, manager, target, stamp_id):
+        self.reference = doc.reference    # bulk_writes가 오류 메시지에 쓰는 문서 참조
+        self.grant_data = doc.to_dict()
+        self.action = action
+        self.manager = manager
+        self.target = target
+        self.stamp_id = stamp_id
+
+def plan_grant_migrations(docs):
+    """
+    granted_at 순으로 정렬된 문서 → 처리 계획 목록
+    같은 (manager, target) 조합이 여러 건이면 가장 먼저 부여된 기록만 남기도록
+    중복 판정은 병렬 커밋 전에 여기서 순서대로 합니다.
+    """
+    existing_ids = {doc.id for doc in docs}
+    plans = []
+    for doc in docs:
+        grant_data = doc.to_dict()
+        manager = normalize_email(grant_data.get('manager_email'))
+        target = normalize_email(grant_data.get('target_email'))
+        stamp_id = grant_data.get('stamp_id')
+        new_id = grant_doc_id(manager, target)
+
+        if is_keyed_grant(doc.id, grant_data):
+            action = 'backfill'
+        elif new_id in existing_ids:
+            action = 'duplicate'
+        else:
+            action = 'migrate'
+            existing_ids.add(new_id)
+        plans.append(GrantMigration(doc, action, manager, target, stamp_id))
+    return plans
+
+def grant_migration_op(batch, plan):
+    """
+    계획 하나의 batch 쓰기 (문서당 최대 3개)
+    변환은 키 문서 create + 보조 키 + 기존 문서 삭제가 같은 batch → 일부만 반영되지 않음
+    (키 문서가 이미 있으면 create가 batch 전체를 실패시키므로 덮어쓰지 않음 → 다시 실행하면 중복으로 정리)
+    """
+    key_ref = grant_key_ref(db, plan.target, plan.stamp_id)
+    key_data = grant_key_data(plan.manager, plan.target, plan.stamp_id)
+
+    if plan.action == 'backfill':
+        batch.set(key_ref, key_data)
+    elif plan.action == 'duplicate':
+        batch.delete(plan.reference)
+    else:
+        grant_data = {**plan.grant_data, 'manager_email': plan.manager, 'target_email': plan.target}
+        batch.create(db.collection(GRANTS_COLLECTION).document(grant_doc_id(plan.manager, plan.target)), grant_data)
+        batch.set(key_ref, key_data)
+        batch.delete(plan.reference)
+
+def migrate_grants_to_keyed():
+    """
+    기존 stamp_grants 문서를 결정적 키로 변환 (bulk_writes로 batch 일괄 쓰기)
+    같은 (manager, target) 조합이 여러 건이면 가장 먼저 부여된 기록만 남깁니다.
+    """
+    print("\n" + "="*60)
+    print("🔄 stamp_grants 키 마이그레이션 시작")
+    print("="*60)
+
+    try:
+        docs = sorted(db.collection(GRANTS_COLLECTION).stream(), key=granted_at_sort_key)
+        plans = plan_grant_migrations(docs)
+
+        def progress(counts):
+            print(f"   ⏳ 처리 {counts['processed']}건 (완료 {counts['written']}, 실패 {counts['failed']})")
+
+        # 종류별로 따로 커밋 → 결과 건수를 종류별로 정확히 집계
+        results = {}
+        for action in ('migrate', 'duplicate', 'backfill'):
+            action_plans = [plan for plan in plans if plan.action == action]
+            results[action] = bulk_apply(db, action_plans, grant_migration_op, writes_per_doc=3, progress=progress)
+            for error in results[action].errors:
+                print(f"❌ {error}")
+
+        migrated_count = results['migrate'].written
+        duplicate_count = results['duplicate'].written
+        backfilled_count = results['backfill'].written
+        error_count = sum(result.failed for result in results.values())
+
+        print("\n" + "="*60)
+        print("📊 마이그레이션 결과")
+        print("="*60)
+        print(f"✅ 변환: {migrated_count}건")
+        print(f"🗑️  중복 삭제: {duplicate_count}건")
+        print(f"🔧 보조 키 보충: {backfilled_count}건")
+        print(f"❌ 실패: {error_count}건 (실패한 batch의 기록은 다시 실행하면 처리됩니다)")
+        print("="*60)
+
+        return migrated_count, duplicate_count, error_count
+
+    except Exception as e:
+        print(f"\n❌ 마이그레이션 중 치명적 오류 발생: {e}")
+        return 0, 0, 0
+
+def verify_grants():
+    """
+    모든 부여 기록이 키 문서이고 보조 키가 있는지 검증
+    """
+    print("\n" + "="*60)
+    print("🔍 stamp_grants 검증")
+    print("="*60)
+
+    try:
+        key_ids = {doc.id for doc in db.collection(GRANT_KEYS_COLLECTION).stream()}
+
+        total = 0
+        legacy = 0
+        missing_keys = 0
+
+        for doc in db.collection(GRANTS_COLLECTION).stream():
+            grant_data = doc.to_dict()
+            total += 1
+            if not is_keyed_grant(doc.id, grant_data):
+                legacy += 1
+            elif grant_key_ref(db, grant_data.get('target_email'), grant_data.get('stamp_id')).id not in key_ids:
+                missing_keys += 1
+
+        print(f"전체 부여 기록: {total}건")
+        print(f"자동 ID 기록 잔존: {legacy}건 {'⚠️' if legacy else '✅'}")
+        print(f"보조 키 누락: {missing_keys}건 {'⚠️' if missing_keys else '✅'}")
+        print("="*60)
+
+        return legacy == 0 and missing_keys == 0
+
+    except Exception as e:
+        print(f"\n❌ 검증 중 오류 발생: {e}")
+        return False
+
+def backup_grants():
+    """
+    현재 stamp_grants를 JSON 파일로 백업
+    """
+    try:
+        backup_data = []
+        for doc in db.collection(GRANTS_COLLECTION).stream():
+            grant_data = doc.to_dict()
+            grant_data['doc_id'] = doc.id
+            if 'granted_at' in grant_data:
+                grant_data['granted_at'] = str(grant_data['granted_at'])
+            backup_data.append(grant_data)
+
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"grants_backup_{timestamp}.json"
+
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(backup_data, f, ensure_ascii=False, indent=2)
+
+        print(f"✅ 백업 완료: {filename} ({len(backup_data)}건)")
+        return filename
+
+    except Exception as e:
+        print(f"❌ 백업 실패: {e}")
+        return None
+
+def main():
+    print("\nSTEP 1: 현재 상태 확인")
+    verify_grants()
+
+    print("\nSTEP 2: 백업 생성")
+    backup_file = backup_grants()
+
+    if not backup_file:
+        response = input("백업 없이 계속 진행하시겠습니까? (y/N): ")
+        if response.lower() != 'y':
+            print("마이그레이션을 취소합니다.")
+            return
+
+    response = input("\n마이그레이션을 시작하시겠습니까? (y/N): ")
+    if response.lower() != 'y':
+        print("마이그레이션을 취소했습니다.")
+        return
+
+    print("\nSTEP 3: 키 변환")
+    migrate_grants_to_keyed()
+
+    print("\nSTEP 4: 최종 검증")
+    success = verify_grants()
+    print(f"최종 상태: {'✅ 성공' if success else '⚠️  확인 필요'}")
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n\n⚠️  사용자에 의해 중단되었습니다.")
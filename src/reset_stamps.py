@@ -3,22 +3,34 @@ Firestore 스탬프 및 grant 기록 완전 초기화 스크립트
 모든 사용자의 스탬프를 0으로 리셋하고 부여 이력을 삭제합니다.
 """
 
-import firebase_admin
-from firebase_admin import credentials, firestore
+from firebase_admin import firestore
+from firebase_clients import initialize_firebase, get_db
 from datetime import datetime
+from grant_ledger import GRANT_KEYS_COLLECTION
+from bulk_writes import bulk_update, bulk_delete
+from stats_counters import reset_stats
+from stamp_codec import user_stamp_bits, count_stamps
 
 # Firebase Admin SDK 초기화
-cred = credentials.Certificate("serviceAccountKey.json")
-firebase_admin.initialize_app(cred)
-
-db = firestore.client()
+initialize_firebase("serviceAccountKey.json")
+db = get_db()
 
 # 스탬프 ID 목록
 STAMP_IDS = [f"stamp{i}" for i in range(1, 35)]
 
+def print_progress(label):
+    """batch 커밋마다 진행 상황 출력"""
+    def progress(counts):
+        print(f"   ⏳ {label}: {counts['written']}건 완료, {counts['failed']}건 실패 (재시도 {counts['retries']}회)")
+    return progress
+
+def report_errors(result):
+    for error in result.errors:
+        print(f"❌ {error}")
+
 def reset_all_user_stamps():
     """
-    모든 사용자의 스탬프를 False로 초기화
+    모든 사용자의 스탬프를 False로 초기화 (batch 일괄 쓰기)
     """
     print("\n" + "="*60)
     print("🔄 사용자 스탬프 초기화 시작")
@@ -26,30 +38,20 @@ def reset_all_user_stamps():
     
     try:
         users_ref = db.collection('users')
-        docs = users_ref.stream()
+        docs = users_ref.select([]).stream()
         
-        reset_count = 0
         default_stamps = {stamp: False for stamp in STAMP_IDS}
         
-        for doc in docs:
-            try:
-                user_data = doc.to_dict()
-                email = user_data.get('email', 'Unknown')
-                
-                # 스탬프를 모두 False로 설정
-                doc.reference.update({'stamps': default_stamps})
-                
-                reset_count += 1
-                print(f"✅ {email} - 스탬프 초기화 완료")
-                
-            except Exception as e:
-                print(f"❌ {doc.id} 초기화 실패: {e}")
+        # 스탬프를 모두 False로 설정 (비트마스크 저장 필드는 삭제)
+        result = bulk_update(db, docs, {'stamps': default_stamps, 'stamp_bits': firestore.DELETE_FIELD},
+                             progress=print_progress("사용자 스탬프 초기화"))
+        report_errors(result)
         
         print("\n" + "="*60)
-        print(f"✅ 사용자 스탬프 초기화 완료: {reset_count}명")
+        print(f"✅ 사용자 스탬프 초기화 완료: {result.written}명 (실패 {result.failed}명)")
         print("="*60)
         
-        return reset_count
+        return result.written
         
     except Exception as e:
         print(f"\n❌ 사용자 스탬프 초기화 중 오류: {e}")
@@ -57,7 +59,7 @@ def reset_all_user_stamps():
 
 def delete_all_stamp_grants():
     """
-    stamp_grants 컬렉션의 모든 문서 삭제
+    stamp_grants 컬렉션의 모든 문서 삭제 (stamp_grant_keys 보조 키 포함, batch 일괄 삭제)
     """
     print("\n" + "="*60)
     print("🗑️  stamp_grants 기록 삭제 시작")
@@ -65,31 +67,20 @@ def delete_all_stamp_grants():
     
     try:
         grants_ref = db.collection('stamp_grants')
-        docs = grants_ref.stream()
-        
-        delete_count = 0
+        result = bulk_delete(db, grants_ref.select([]).stream(),
+                             progress=print_progress("stamp_grants 삭제"))
+        report_errors(result)
         
-        for doc in docs:
-            try:
-                grant_data = doc.to_dict()
-                manager = grant_data.get('manager_email', 'Unknown')
-                target = grant_data.get('target_email', 'Unknown')
-                stamp_id = grant_data.get('stamp_id', 'Unknown')
-                
-                # 문서 삭제
-                doc.reference.delete()
-                
-                delete_count += 1
-                print(f"🗑️  {manager} → {target} ({stamp_id}) 삭제")
-                
-            except Exception as e:
-                print(f"❌ {doc.id} 삭제 실패: {e}")
+        # 보조 키 삭제
+        key_result = bulk_delete(db, db.collection(GRANT_KEYS_COLLECTION).select([]).stream(),
+                                 progress=print_progress("보조 키 삭제"))
+        report_errors(key_result)
         
         print("\n" + "="*60)
-        print(f"✅ stamp_grants 기록 삭제 완료: {delete_count}건")
+        print(f"✅ stamp_grants 기록 삭제 완료: {result.written}건 (보조 키 {key_result.written}건)")
         print("="*60)
         
-        return delete_count
+        return result.written
         
     except Exception as e:
         print(f"\n❌ stamp_grants 삭제 중 오류: {e}")
@@ -115,8 +106,8 @@ def verify_reset():
             user_data = user_doc.to_dict()
             total_users += 1
             
-            stamps = user_data.get('stamps', {})
-            stamp_count = sum(1 for has_stamp in stamps.values() if has_stamp)
+            # stamps 맵 / stamp_bits 정수 어느 방식으로 저장돼 있어도 같은 기준으로 확인
+            stamp_count = count_stamps(user_stamp_bits(user_data))
             
             if stamp_count > 0:
                 users_with_stamps += 1
@@ -243,6 +234,9 @@ def main():
     print("\nSTEP 3: stamp_grants 기록 삭제")
     grant_count = delete_all_stamp_grants()
     
+    # ✅ 통계 카운터도 초기화 상태로 (모든 사용자 스탬프 0개)
+    reset_stats(db, user_count)
+    
     # 5. 검증
     print("\nSTEP 4: 초기화 결과 검증")
     success = verify_reset()
@@ -0,0 +1,195 @@
+"""
+운영 서버용 샘플링 프로파일러 (/api/profiler)
+- 켜져 있는 동안만 네이티브 스레드 하나가 interval마다 sys._current_frames()로 스택을 읽음
+  (요청 코드에는 아무것도 끼워 넣지 않음 → 꺼져 있을 때 비용 없음, 요청 수 제한 모드만 요청 끝에 bool 확인 하나)
+- 스택의 뷰 함수 코드로 라우트를 구분 → 'METHOD /route;프레임;프레임 개수' (flamegraph.pl / speedscope 입력 형식)
+  Flask.wsgi_app 아래에 있는 스택만 기록 (gevent 허브 대기, 백그라운드 스레드 제외)
+- gevent 워커: 스레드 모듈이 패치되어 있으면 원래의 스레드/sleep으로 샘플러를 실행
+  (실행 중인 greenlet 하나만 보이므로 I/O 대기 시간이 아니라 CPU 시간 프로파일)
+프로파일은 요청을 받은 워커 프로세스 하나만 대상으로 하고, 결과는 PROFILE_DIR(기본 /tmp)에 파일로 남겨
+같은 서버의 어느 워커에서든 조회할 수 있습니다.
+"""
+
+import _thread
+import inspect
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from flask import Flask
+
+DEFAULT_INTERVAL = 0.01     # 초 (100Hz)
+MAX_SECONDS = 300
+MAX_REQUESTS = 10000
+MAX_STACK_DEPTH = 128
+PROFILE_SUFFIX = '.collapsed'
+NO_ROUTE = '(no route)'     # before_request/after_request 훅, 404 등 뷰 함수 밖
+
+_WSGI_APP_CODE = Flask.wsgi_app.__code__
+
+
+def native_thread_api():
+    """
+    (start_new_thread, get_ident, sleep) - gevent가 패치했으면 원래 구현
+    (샘플러가 greenlet이면 다른 greenlet이 양보할 때만 실행되어 샘플이 의미 없음)
+    """
+    try:
+        from gevent import monkey
+        if monkey.is_module_patched('threading'):
+            start_new_thread, get_ident = monkey.get_original('_thread', ['start_new_thread', 'get_ident'])
+            return start_new_thread, get_ident, monkey.get_original('time', 'sleep')
+    except ImportError:
+        pass
+    return _thread.start_new_thread, _thread.get_ident, time.sleep
+
+
+def view_routes(app):
+    """뷰 함수 코드 객체 → 'METHOD /route' (데코레이터는 __wrapped__로 벗겨냄)"""
+    routes = {}
+    for rule in app.url_map.iter_rules():
+        view = app.view_functions.get(rule.endpoint)
+        if view is None:
+            continue
+        methods = ','.join(sorted(rule.methods - {'HEAD', 'OPTIONS'}))
+        routes[inspect.unwrap(view).__code__] = f"{methods} {rule.rule}"
+    return routes
+
+
+def frame_label(code):
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class SamplingProfiler:
+    """프로세스당 하나, 한 번에 프로파일 하나"""
+
+    def __init__(self, profile_dir=None):
+        self.profile_dir = profile_dir or os.path.join(tempfile.gettempdir(), 'jeohyeon_profiles')
+        self._lock = threading.Lock()
+        self.active = False         # 요청 끝 훅이 확인하는 값 (꺼져 있으면 이것만)
+        self._stop = False
+        self._done = True
+        self._max_requests = None
+        self._requests = 0
+        self._samples = Counter()   # (라우트, 스택 튜플) → 샘플 수 (샘플러 스레드만 씀, 끝난 뒤 읽음)
+
+    # ---- 요청 훅 ----
+    def request_finished(self):
+        """요청 수 제한 모드에서 요청 하나가 끝날 때 (active일 때만 호출)"""
+        with self._lock:
+            self._requests += 1
+            if self._max_requests and self._requests >= self._max_requests:
+                self._stop = True
+
+    # ---- 실행 ----
+    def run(self, app, seconds=None, max_requests=None, interval=DEFAULT_INTERVAL):
+        """
+        seconds초 동안 또는 요청 max_requests개가 끝날 때까지 샘플링 (호출한 스레드는 끝날 때까지 대기)
+
+        Returns:
+            dict: samples, requests, seconds, routes {라우트: 샘플 수}, stacks [(줄, 개수)]
+        Raises:
+            RuntimeError: 이미 프로파일 중일 때
+        """
+        seconds = min(seconds or MAX_SECONDS, MAX_SECONDS)
+        with self._lock:
+            if self.active:
+                raise RuntimeError('이미 프로파일 중입니다.')
+            self._stop, self._done = False, False
+            self._max_requests = min(max_requests, MAX_REQUESTS) if max_requests else None
+            self._requests = 0
+            self._samples = Counter()
+            self.active = True
+
+        routes = view_routes(app)
+        start_new_thread, get_ident, native_sleep = native_thread_api()
+        started = time.monotonic()
+        start_new_thread(self._sample_loop, (routes, started + seconds, interval, get_ident, native_sleep))
+        try:
+            # 대기하는 쪽은 일반 sleep (gevent면 greenlet 양보)
+            while not self._done:
+                time.sleep(0.05)
+        finally:
+            self._stop = True
+            with self._lock:
+                self.active = False
+        return self._summary(time.monotonic() - started)
+
+    def _sample_loop(self, routes, deadline, interval, get_ident, native_sleep):
+        own_ident = get_ident()
+        try:
+            while not self._stop and time.monotonic() < deadline:
+                frames = sys._current_frames()
+                for ident, frame in frames.items():
+                    if ident != own_ident:
+                        self._record(frame, routes)
+                del frames
+                native_sleep(interval)
+        finally:
+            self._done = True
+
+    def _record(self, frame, routes):
+        labels = []
+        route = None
+        while frame is not None:
+            code = frame.f_code
+            if code is _WSGI_APP_CODE:
+                break
+            route = routes.get(code, route)
+            labels.append(frame_label(code))
+            frame = frame.f_back
+        if frame is None:
+            return      # 요청 처리 중이 아닌 스레드/greenlet
+        # 루트(wsgi_app 바로 아래)부터, 너무 깊으면 말단 쪽을 자름
+        stack = tuple(reversed(labels))[:MAX_STACK_DEPTH]
+        self._samples[(route or NO_ROUTE, stack)] += 1
+
+    def _summary(self, elapsed):
+        samples = dict(self._samples)
+        with self._lock:
+            requests = self._requests
+        per_route = Counter()
+        for (route, _), count in samples.items():
+            per_route[route] += count
+        stacks = sorted(((';'.join((route,) + stack), count) for (route, stack), count in samples.items()),
+                        key=lambda item: -item[1])
+        return {
+            'samples': sum(samples.values()),
+            'requests': requests,
+            'seconds': round(elapsed, 3),
+            'routes': dict(per_route.most_common()),
+            'stacks': stacks,
+        }
+
+    # ---- 결과 파일 (워커끼리 공유) ----
+    def profile_path(self, profile_id):
+        if not profile_id or not profile_id.isalnum():
+            raise ValueError('잘못된 프로파일 ID입니다.')
+        return os.path.join(self.profile_dir, profile_id + PROFILE_SUFFIX)
+
+    def save(self, profile_id, stacks):
+        """collapsed stacks를 임시 파일에 쓴 뒤 이름 변경 (다른 워커가 쓰다 만 파일을 읽지 않도록)"""
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = self.profile_path(profile_id)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for line, count in stacks:
+                f.write(f"{line} {count}\n")
+        os.replace(temp_path, path)
+        return path
+
+    def load(self, profile_id, route=None):
+        """
+        Returns:
+            str or None: collapsed stacks (route가 있으면 해당 라우트만)
+        """
+        try:
+            with open(self.profile_path(profile_id), encoding='utf-8') as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return None
+        if route:
+            lines = [line for line in lines if line.startswith(route + ';')]
+        return ''.join(lines)
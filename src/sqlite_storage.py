@@ -0,0 +1,387 @@
+"""
+SQLite 저장소 (Firebase 없이 서버 전체를 로컬에서 실행 - 개발/부하 테스트/프로파일링)
+- users          : uid PK, email UNIQUE 인덱스 (= 이메일 인덱스), stamp_bits 정수
+- stamp_grants   : (manager_email, target_email) PK → 1인당 1회 제한, (target_email, stamp_id) 인덱스 → 회수
+- stats          : (kind, key) → 카운터 (스탬프 변경과 같은 트랜잭션에서 증감)
+- jobs, job_leases, audit_log
+연결은 스레드(및 프로세스)마다 하나, WAL 모드로 여러 워커가 같은 파일을 공유할 수 있습니다.
+쓰기는 BEGIN IMMEDIATE 트랜잭션 → 읽고 쓰는 동안 다른 쓰기는 대기 (경합 재시도 없음)
+작업 수(count_ops)는 행 단위로 집계하되 통계 테이블은 문서 하나로 셉니다 (다른 저장소와 같은 기준).
+"""
+
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from stamp_codec import stamp_bit
+from stats_counters import StatsDelta, baseline_delta, rebuild_summary, summarize_stats
+from storage import Storage, UserNotFound, GrantExists, EmailInUse, TransactionContention, new_user_data, now_iso
+from storage_ops import count_ops
+from user_index import normalize_email
+
+DEFAULT_PATH = 'jeohyeon_local.sqlite3'
+BUSY_TIMEOUT_SECONDS = 30
+WATCH_POLL_SECONDS = 1.0      # watch_users: 다른 워커의 변경을 확인하는 주기
+USER_COLUMNS = ('email', 'display_name', 'role', 'stamp_bits', 'created_at')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    uid TEXT PRIMARY KEY,
+    email TEXT NOT NULL,
+    display_name TEXT,
+    role TEXT NOT NULL DEFAULT 'student',
+    stamp_bits INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT,
+    version INTEGER NOT NULL DEFAULT 1
+);
+CREATE UNIQUE INDEX IF NOT EXISTS users_email ON users (email);
+
+CREATE TABLE IF NOT EXISTS stamp_grants (
+    manager_email TEXT NOT NULL,
+    target_email TEXT NOT NULL,
+    stamp_id TEXT NOT NULL,
+    granted_at TEXT,
+    PRIMARY KEY (manager_email, target_email)
+);
+CREATE INDEX IF NOT EXISTS stamp_grants_target ON stamp_grants (target_email, stamp_id);
+
+CREATE TABLE IF NOT EXISTS stats (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value INTEGER NOT NULL,
+    PRIMARY KEY (kind, key)
+);
+
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS job_leases (
+    kind TEXT PRIMARY KEY,
+    job_id TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS audit_log (
+    event_id TEXT PRIMARY KEY,
+    action TEXT,
+    actor TEXT,
+    at TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS audit_log_at ON audit_log (at);
+"""
+
+
+def user_from_row(row):
+    return {column: row[column] for column in USER_COLUMNS}
+
+
+class SQLiteStorage(Storage):
+    name = 'sqlite'
+
+    def __init__(self, path=None):
+        self.path = path or DEFAULT_PATH
+        self._local = threading.local()
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        # isolation_level=None: 트랜잭션은 _transaction()에서 직접 시작
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None,
+                               check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+        except sqlite3.OperationalError as e:
+            # busy timeout 동안 쓰기 잠금을 얻지 못함
+            raise TransactionContention(str(e)) from e
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def ping(self):
+        self._connect().execute('SELECT 1').fetchone()
+        return True
+
+    # ---- 사용자 ----
+    def get_user(self, uid):
+        row = self._connect().execute('SELECT * FROM users WHERE uid = ?', (uid,)).fetchone()
+        count_ops(reads=1)
+        return user_from_row(row) if row else None
+
+    def watch_users(self, on_change):
+        """WATCH_POLL_SECONDS마다 users.version이 바뀐 행만 전달 (폴링 스레드, 자체 연결)"""
+        stop = threading.Event()
+
+        def poll():
+            versions = {}
+            while not stop.is_set():
+                try:
+                    for row in self._connect().execute('SELECT * FROM users'):
+                        if versions.get(row['uid']) != row['version']:
+                            versions[row['uid']] = row['version']
+                            on_change(row['uid'], user_from_row(row))
+                except Exception as e:
+                    print(f"SQLite user watch error: {e}")
+                stop.wait(WATCH_POLL_SECONDS)
+
+        threading.Thread(target=poll, name='sqlite-user-watch', daemon=True).start()
+        return stop.set
+
+    def get_users(self, uids):
+        if not uids:
+            return {}
+        placeholders = ','.join('?' * len(uids))
+        rows = self._connect().execute(f'SELECT * FROM users WHERE uid IN ({placeholders})', list(uids))
+        count_ops(reads=len(uids))
+        return {row['uid']: (user_from_row(row), row['version']) for row in rows}
+
+    def create_user(self, uid, user_data):
+        new_user = new_user_data(user_data)
+        new_user['email'] = normalize_email(new_user['email'])
+        with self._transaction() as conn:
+            # users.email UNIQUE 충돌을 IntegrityError(500)로 두지 않고 다른 저장소와 같은 예외로
+            row = conn.execute('SELECT uid FROM users WHERE email = ?', (new_user['email'],)).fetchone()
+            count_ops(reads=1)
+            if row and row['uid'] != uid:
+                raise EmailInUse(new_user['email'], row['uid'])
+            cursor = conn.execute(
+                'INSERT INTO users (uid, email, display_name, role, stamp_bits, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (uid) DO NOTHING',
+                (uid, *(new_user[column] for column in USER_COLUMNS)))
+            if not cursor.rowcount:
+                return None
+            delta = StatsDelta()
+            delta.user_created()
+            self._add_stats(conn, delta)
+        count_ops(writes=2)     # 사용자(이메일 인덱스 포함) + 통계
+        return new_user
+
+    def update_user(self, uid, fields):
+        columns = [column for column in fields if column in USER_COLUMNS]
+        assignments = ''.join(f'{column} = ?, ' for column in columns)
+        with self._transaction() as conn:
+            cursor = conn.execute(f'UPDATE users SET {assignments}version = version + 1 WHERE uid = ?',
+                                  (*(fields[column] for column in columns), uid))
+            if not cursor.rowcount:
+                raise UserNotFound(uid)
+        count_ops(writes=1)
+
+    def list_users(self, page_size=None, cursor=None, fields=None):
+        columns = [column for column in USER_COLUMNS if not fields or column in fields or column == 'stamp_bits']
+        query = f"SELECT uid, {', '.join(columns)} FROM users"
+        params = []
+        if cursor:
+            query += ' WHERE uid > ?'
+            params.append(cursor)
+        query += ' ORDER BY uid'
+        if page_size:
+            query += ' LIMIT ?'
+            params.append(page_size)
+        rows = self._connect().execute(query, params).fetchall()
+        count_ops(queries=1, reads=len(rows))
+        return [(row['uid'], {column: row[column] for column in columns}) for row in rows]
+
+    # ---- 이메일 인덱스 (users.email UNIQUE 인덱스를 그대로 사용) ----
+    def get_index_uids(self, emails):
+        if not emails:
+            return {}
+        placeholders = ','.join('?' * len(emails))
+        rows = self._connect().execute(f'SELECT email, uid FROM users WHERE email IN ({placeholders})', list(emails))
+        count_ops(reads=len(emails))
+        return {row['email']: row['uid'] for row in rows}
+
+    def find_uid_by_email(self, email):
+        return self.get_index_uids([email]).get(email)
+
+    def write_index_entry(self, email, uid):
+        pass  # users.email 인덱스가 항상 최신
+
+    def iter_index(self, limit=None):
+        query = 'SELECT email, uid FROM users'
+        params = []
+        if limit:
+            query += ' LIMIT ?'
+            params.append(limit)
+        entries = [(row['email'], row['uid']) for row in self._connect().execute(query, params)]
+        count_ops(queries=1, reads=len(entries))
+        return entries
+
+    # ---- 스탬프 ----
+    def change_stamp(self, uid, target_email, value, choose_stamp, manager_email=None, attempts=None):
+        with self._transaction() as conn:
+            if attempts is not None:
+                attempts[0] += 1
+            row = conn.execute('SELECT * FROM users WHERE uid = ?', (uid,)).fetchone()
+            count_ops(reads=1)
+            if row is None:
+                raise UserNotFound(uid)
+            old_bits = row['stamp_bits']
+            stamp_id = choose_stamp(old_bits)
+            new_bits = old_bits | stamp_bit(stamp_id) if value else old_bits & ~stamp_bit(stamp_id)
+            delta = StatsDelta()
+
+            if value and manager_email:
+                try:
+                    conn.execute('INSERT INTO stamp_grants (manager_email, target_email, stamp_id, granted_at) '
+                                 'VALUES (?, ?, ?, ?)', (manager_email, target_email, stamp_id, now_iso()))
+                except sqlite3.IntegrityError:
+                    previous = conn.execute('SELECT stamp_id FROM stamp_grants '
+                                            'WHERE manager_email = ? AND target_email = ?',
+                                            (manager_email, target_email)).fetchone()
+                    count_ops(reads=1)
+                    raise GrantExists(previous['stamp_id'] if previous else None)
+                delta.manager_grant(manager_email)
+            elif not value:
+                managers = conn.execute('SELECT manager_email FROM stamp_grants '
+                                        'WHERE target_email = ? AND stamp_id = ?',
+                                        (target_email, stamp_id)).fetchall()
+                count_ops(reads=1, deletes=len(managers))
+                conn.execute('DELETE FROM stamp_grants WHERE target_email = ? AND stamp_id = ?',
+                             (target_email, stamp_id))
+                for manager in managers:
+                    delta.manager_grant(manager['manager_email'], -1)
+
+            conn.execute('UPDATE users SET stamp_bits = ?, version = version + 1 WHERE uid = ?', (new_bits, uid))
+            delta.stamps_changed(old_bits, new_bits)
+            self._add_stats(conn, delta)
+        count_ops(writes=1 + int(bool(value and manager_email)) + int(delta.changed()))
+        return stamp_id, {**user_from_row(row), 'stamp_bits': new_bits}
+
+    def get_manager_grants(self, manager_email, target_emails):
+        if not target_emails:
+            return {}
+        placeholders = ','.join('?' * len(target_emails))
+        rows = self._connect().execute(
+            f'SELECT target_email, stamp_id FROM stamp_grants '
+            f'WHERE manager_email = ? AND target_email IN ({placeholders})',
+            (manager_email, *target_emails))
+        count_ops(reads=len(target_emails))
+        return {row['target_email']: row['stamp_id'] for row in rows}
+
+    def commit_grants(self, grants, manager_email=None):
+        updated, conflicted = {}, []
+        with self._transaction() as conn:
+            delta = StatsDelta()
+            for uid, target_email, user_data, version, stamp_id in grants:
+                count_ops(reads=int(bool(manager_email)))
+                if manager_email and conn.execute('SELECT 1 FROM stamp_grants WHERE manager_email = ? AND target_email = ?',
+                                                  (manager_email, target_email)).fetchone():
+                    conflicted.append(uid)
+                    continue
+                old_bits = user_data['stamp_bits']
+                new_bits = old_bits | stamp_bit(stamp_id)
+                # 읽은 뒤 바뀌지 않은 경우에만 (version 비교)
+                cursor = conn.execute('UPDATE users SET stamp_bits = ?, version = version + 1 '
+                                      'WHERE uid = ? AND version = ?', (new_bits, uid, version))
+                if not cursor.rowcount:
+                    conflicted.append(uid)
+                    continue
+                if manager_email:
+                    conn.execute('INSERT INTO stamp_grants (manager_email, target_email, stamp_id, granted_at) '
+                                 'VALUES (?, ?, ?, ?)', (manager_email, target_email, stamp_id, now_iso()))
+                    delta.manager_grant(manager_email)
+                delta.stamps_changed(old_bits, new_bits)
+                updated[uid] = {**user_data, 'stamp_bits': new_bits}
+            self._add_stats(conn, delta)
+        count_ops(writes=len(updated) * (2 if manager_email else 1) + int(delta.changed()))
+        return updated, conflicted
+
+    # ---- 통계 ----
+    def _add_stats(self, conn, delta):
+        rows = [(name, key, amount) for name in ('stamp_holders', 'completion', 'manager_grants')
+                for key, amount in getattr(delta, name).items() if amount]
+        conn.executemany('INSERT INTO stats (kind, key, value) VALUES (?, ?, ?) '
+                         'ON CONFLICT (kind, key) DO UPDATE SET value = value + excluded.value', rows)
+
+    def _write_baseline(self, conn, delta):
+        conn.execute('DELETE FROM stats')
+        self._add_stats(conn, delta)
+
+    def read_stats(self):
+        totals = {'stamp_holders': {}, 'completion': {}, 'manager_grants': {}}
+        count_ops(reads=1)
+        for row in self._connect().execute('SELECT kind, key, value FROM stats'):
+            if row['kind'] in totals:
+                totals[row['kind']][row['key']] = row['value']
+        return summarize_stats(totals['stamp_holders'], totals['completion'], totals['manager_grants'])
+
+    def rebuild_stats(self):
+        with self._transaction() as conn:
+            user_bits = [row['stamp_bits'] for row in conn.execute('SELECT stamp_bits FROM users')]
+            managers = [row['manager_email'] for row in conn.execute('SELECT manager_email FROM stamp_grants')]
+            delta = baseline_delta(user_bits, managers)
+            self._write_baseline(conn, delta)
+            count_ops(queries=2, reads=len(user_bits) + len(managers), writes=1)
+        return rebuild_summary(delta)
+
+    # ---- 전체 초기화 ----
+    def reset_all_stamps(self, progress=None):
+        with self._transaction() as conn:
+            users_reset = conn.execute('UPDATE users SET stamp_bits = 0, version = version + 1').rowcount
+            grants_deleted = conn.execute('DELETE FROM stamp_grants').rowcount
+            delta = StatsDelta()
+            delta.completion['0'] = users_reset
+            self._write_baseline(conn, delta)
+            count_ops(writes=users_reset + 1, deletes=grants_deleted)
+        if progress:
+            progress('users', {'processed': users_reset, 'written': users_reset, 'failed': 0})
+            progress('grants', {'processed': grants_deleted, 'written': grants_deleted, 'failed': 0})
+        return {'users_reset': users_reset, 'grants_deleted': grants_deleted, 'failed': 0, 'errors': []}
+
+    # ---- 작업 / 감사 로그 ----
+    def save_job(self, job_data):
+        with self._transaction() as conn:
+            conn.execute('INSERT INTO jobs (job_id, data) VALUES (?, ?) '
+                         'ON CONFLICT (job_id) DO UPDATE SET data = excluded.data',
+                         (job_data['job_id'], json.dumps(job_data, ensure_ascii=False, default=str)))
+        count_ops(writes=1)
+
+    def get_job(self, job_id):
+        row = self._connect().execute('SELECT data FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        count_ops(reads=1)
+        return json.loads(row['data']) if row else None
+
+    def acquire_job_lease(self, kind, job_id, seconds):
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute('SELECT job_id, expires_at FROM job_leases WHERE kind = ?', (kind,)).fetchone()
+            count_ops(reads=1)
+            if row and row['job_id'] != job_id and row['expires_at'] > now:
+                return row['job_id']
+            conn.execute('INSERT INTO job_leases (kind, job_id, expires_at) VALUES (?, ?, ?) '
+                         'ON CONFLICT (kind) DO UPDATE SET job_id = excluded.job_id, expires_at = excluded.expires_at',
+                         (kind, job_id, now + seconds))
+        count_ops(writes=1)
+        return None
+
+    def release_job_lease(self, kind, job_id):
+        with self._transaction() as conn:
+            deleted = conn.execute('DELETE FROM job_leases WHERE kind = ? AND job_id = ?', (kind, job_id)).rowcount
+        count_ops(deletes=deleted)
+
+    def append_audit(self, events):
+        with self._transaction() as conn:
+            conn.executemany('INSERT INTO audit_log (event_id, action, actor, at, data) VALUES (?, ?, ?, ?, ?) '
+                             'ON CONFLICT (event_id) DO NOTHING',
+                             [(event['event_id'], event.get('action'), event.get('actor'), event.get('at'),
+                               json.dumps(event, ensure_ascii=False, default=str)) for event in events])
+        count_ops(writes=len(events))
@@ -0,0 +1,79 @@
+"""
+스탬프 비트마스크 인코딩
+stamp{n} (구버전 booth{n}) → 정수의 (n-1)번째 비트
+- 저장: users/{uid}.stamp_bits (STAMP_STORAGE=bitmask 일 때)
+- 응답: 기본은 기존 stamps 맵, stamp_format=bits 를 요청한 클라이언트에만 stamp_bits 정수
+"""
+
+STAMP_COUNT = 34
+STAMP_IDS = [f"stamp{i}" for i in range(1, STAMP_COUNT + 1)]
+FULL_MASK = (1 << STAMP_COUNT) - 1
+
+STORAGE_MAP = 'map'
+STORAGE_BITMASK = 'bitmask'
+
+FORMAT_MAP = 'map'
+FORMAT_BITS = 'bits'
+
+
+def stamp_number(stamp_id):
+    """stamp7 / booth7 → 7 (잘못된 ID면 None)"""
+    for prefix in ('stamp', 'booth'):
+        if stamp_id.startswith(prefix) and stamp_id[len(prefix):].isdigit():
+            number = int(stamp_id[len(prefix):])
+            if 1 <= number <= STAMP_COUNT:
+                return number
+    return None
+
+
+def stamp_bit(stamp_id):
+    return 1 << (stamp_number(stamp_id) - 1)
+
+
+def stamps_to_bits(stamps):
+    """{'stamp1': True, ...} 맵 → 비트마스크"""
+    bits = 0
+    for stamp_id, has_stamp in (stamps or {}).items():
+        if has_stamp and stamp_number(stamp_id):
+            bits |= stamp_bit(stamp_id)
+    return bits
+
+
+def bits_to_stamps(bits):
+    """비트마스크 → {'stamp1': bool, ..., 'stamp34': bool} 맵"""
+    return {stamp_id: bool(bits >> i & 1) for i, stamp_id in enumerate(STAMP_IDS)}
+
+
+def user_stamp_bits(user_data):
+    """사용자 문서의 스탬프를 저장 방식과 관계없이 비트마스크로 읽기"""
+    if 'stamp_bits' in user_data:
+        return int(user_data['stamp_bits'] or 0) & FULL_MASK
+    return stamps_to_bits(user_data.get('stamps', {}))
+
+
+def get_next_stamp_number(bits):
+    """가장 낮은 빈 비트 = 다음 순차 스탬프"""
+    lowest_clear = ~bits & (bits + 1)
+    number = lowest_clear.bit_length()
+    if number > STAMP_COUNT:
+        return None, None  # 모든 스탬프가 이미 부여됨
+    return f"stamp{number}", number
+
+
+def count_stamps(bits):
+    return bin(bits & FULL_MASK).count('1')
+
+
+def present_stamps(user_data, stamp_format=FORMAT_MAP):
+    """
+    응답용 사용자 데이터 (저장 방식과 무관하게 요청한 형식으로 변환)
+    - map: 기존 JSON 형태 (stamps 맵)
+    - bits: stamp_bits 정수
+    """
+    bits = user_stamp_bits(user_data)
+    presented = {k: v for k, v in user_data.items() if k not in ('stamps', 'stamp_bits')}
+    if stamp_format == FORMAT_BITS:
+        presented['stamp_bits'] = bits
+    else:
+        presented['stamps'] = bits_to_stamps(bits)
+    return presented
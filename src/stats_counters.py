@@ -0,0 +1,148 @@
+"""
+분산(샤드) 통계 카운터
+스탬프 부여/회수/초기화와 같은 쓰기(트랜잭션·batch)에서 함께 증감하고, 조회는 샤드 문서만 읽습니다.
+- stamp_holders.{stamp_id}   : 스탬프별 보유 학생 수
+- completion.{n}             : 스탬프 n개를 가진 사용자 수 (완성도 분포)
+- manager_grants.{email}     : 부장별 부여 수 (stamp_grants 기록 수와 같음)
+샤드 하나에 쓰기가 몰리지 않도록 쓰기마다 임의의 샤드를 고릅니다. (문서당 초당 쓰기 한도 회피)
+"""
+
+import os
+import random
+from collections import Counter
+
+from firebase_admin import firestore
+
+from stamp_codec import STAMP_IDS, stamp_bit, count_stamps
+
+STATS_COLLECTION = 'stats_shards'
+NUM_SHARDS = int(os.environ.get('STATS_SHARDS', 10))
+
+
+def shard_ref(db, shard):
+    return db.collection(STATS_COLLECTION).document(f'shard_{shard}')
+
+
+class StatsDelta:
+    """한 번의 쓰기에 함께 커밋할 카운터 증감"""
+
+    def __init__(self):
+        self.stamp_holders = Counter()
+        self.completion = Counter()
+        self.manager_grants = Counter()
+
+    def stamps_changed(self, old_bits, new_bits):
+        """한 사용자의 스탬프 비트가 old_bits → new_bits로 바뀜"""
+        if old_bits == new_bits:
+            return
+        for stamp_id in STAMP_IDS:
+            bit = stamp_bit(stamp_id)
+            if (old_bits ^ new_bits) & bit:
+                self.stamp_holders[stamp_id] += 1 if new_bits & bit else -1
+        self.completion[str(count_stamps(old_bits))] -= 1
+        self.completion[str(count_stamps(new_bits))] += 1
+
+    def user_created(self):
+        self.completion['0'] += 1
+
+    def manager_grant(self, manager_email, amount=1):
+        self.manager_grants[manager_email] += amount
+
+    def changed(self):
+        """증감이 하나라도 있는지"""
+        return any(amount for name in ('stamp_holders', 'completion', 'manager_grants')
+                   for amount in getattr(self, name).values())
+
+    def fields(self):
+        """set(merge=True)용 중첩 맵 (값은 firestore.Increment)"""
+        fields = {}
+        for name in ('stamp_holders', 'completion', 'manager_grants'):
+            counts = {key: firestore.Increment(amount) for key, amount in getattr(self, name).items() if amount}
+            if counts:
+                fields[name] = counts
+        return fields
+
+    def write(self, db, writer):
+        """writer(트랜잭션 또는 batch)에 임의 샤드 증감 추가 (증감이 없으면 아무것도 안 함)"""
+        fields = self.fields()
+        if fields:
+            writer.set(shard_ref(db, random.randrange(NUM_SHARDS)), fields, merge=True)
+        return bool(fields)
+
+
+def summarize_stats(stamp_holders, completion, manager_grants):
+    """합산한 카운터 → /api/stats 응답 형식 (저장소 종류와 관계없이 같은 형식)"""
+    completion = Counter(completion)
+    manager_grants = Counter(manager_grants)
+    return {
+        'stamp_holders': {stamp_id: stamp_holders.get(stamp_id, 0) for stamp_id in STAMP_IDS},
+        'completion': {n: completion[n] for n in sorted(completion, key=int) if completion[n]},
+        'manager_grants': {email: n for email, n in manager_grants.most_common() if n},
+        'users': sum(completion.values()),
+    }
+
+
+def read_stats(db):
+    """모든 샤드를 get_all 한 번으로 읽어 합산"""
+    totals = {'stamp_holders': Counter(), 'completion': Counter(), 'manager_grants': Counter()}
+    shards = db.get_all([shard_ref(db, shard) for shard in range(NUM_SHARDS)])
+    for shard in shards:
+        if not shard.exists:
+            continue
+        shard_data = shard.to_dict()
+        for name, counts in totals.items():
+            counts.update(shard_data.get(name) or {})
+
+    return {**summarize_stats(totals['stamp_holders'], totals['completion'], totals['manager_grants']),
+            'shards': NUM_SHARDS}
+
+
+def write_baseline(db, delta):
+    """shard_0을 기준값으로 덮어쓰고 나머지 샤드 삭제 (초기화/재계산 후)"""
+    batch = db.batch()
+    fields = {name: dict(getattr(delta, name)) for name in ('stamp_holders', 'completion', 'manager_grants')}
+    batch.set(shard_ref(db, 0), fields)
+    for shard in range(1, NUM_SHARDS):
+        batch.delete(shard_ref(db, shard))
+    batch.commit()
+
+
+def reset_stats(db, user_count):
+    """전체 초기화 후: 모든 사용자가 스탬프 0개, 부여 기록 없음"""
+    delta = StatsDelta()
+    delta.completion['0'] = user_count
+    write_baseline(db, delta)
+
+
+def baseline_delta(user_bits, grant_managers):
+    """
+    전체 데이터로 계산한 카운터 기준값 (기존 데이터/카운터 도입 전 데이터 반영용)
+
+    Args:
+        user_bits: 사용자별 스탬프 비트마스크 iterable
+        grant_managers: 부여 기록별 manager_email iterable
+    """
+    delta = StatsDelta()
+    for bits in user_bits:
+        delta.completion[str(count_stamps(bits))] += 1
+        for stamp_id in STAMP_IDS:
+            if bits & stamp_bit(stamp_id):
+                delta.stamp_holders[stamp_id] += 1
+    for manager_email in grant_managers:
+        if manager_email:
+            delta.manager_grant(manager_email)
+    return delta
+
+
+def rebuild_summary(delta):
+    return {
+        'users': sum(delta.completion.values()),
+        'grants': sum(delta.manager_grants.values()),
+    }
+
+
+def rebuild_stats(db, user_bits, grant_managers):
+    """전체 재계산 후 샤드 기준값으로 기록"""
+    delta = baseline_delta(user_bits, grant_managers)
+    write_baseline(db, delta)
+    return rebuild_summary(delta)
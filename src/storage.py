@@ -0,0 +1,563 @@
+"""
+데이터 저장소 (사용자 / 이메일 인덱스 / 스탬프 부여 기록 / 통계 / 작업 / 감사 로그)
+flask_auth_server는 Firestore를 직접 호출하지 않고 get_storage()가 돌려주는 저장소만 사용합니다.
+STORAGE_BACKEND 환경 변수로 선택:
+- firestore (기본): FirestoreStorage (firestore_storage.py)
+- sqlite: SQLiteStorage (sqlite_storage.py, SQLITE_PATH 파일) - Firebase 없이 로컬 실행/부하 테스트/프로파일링
+- memory: MemoryStorage - 테스트/벤치마크용 (프로세스 메모리, 워커마다 따로, 재시작하면 사라짐)
+
+사용자 데이터는 dict {'email', 'display_name', 'role', 스탬프 필드('stamps' 또는 'stamp_bits'), ...}
+이고 스탬프는 stamp_codec.user_stamp_bits로 읽습니다.
+각 구현은 읽고 쓴 문서(행) 수를 storage_ops.count_ops()로 보고합니다 (요청별 작업 수 집계).
+"""
+
+import copy
+import datetime
+import os
+import threading
+import time
+import types
+from functools import wraps
+
+from stamp_codec import stamp_bit, user_stamp_bits
+from stats_counters import StatsDelta, baseline_delta, rebuild_summary, summarize_stats
+from storage_ops import count_ops
+from user_index import normalize_email
+
+DEFAULT_BACKEND = 'firestore'
+
+# 저장소 메서드 → 작업 종류 (메트릭 라벨)
+STORAGE_OPERATIONS = {
+    'ping': 'get',
+    'get_user': 'get',
+    'get_users': 'get',
+    'get_index_uids': 'get',
+    'get_manager_grants': 'get',
+    'get_job': 'get',
+    'read_stats': 'get',
+    'list_users': 'query',
+    'iter_index': 'query',
+    'find_uid_by_email': 'query',
+    'rebuild_stats': 'query',
+    'create_user': 'add',
+    'append_audit': 'add',
+    'update_user': 'update',
+    'change_stamp': 'update',
+    'commit_grants': 'update',
+    'write_index_entry': 'update',
+    'save_job': 'update',
+    'acquire_job_lease': 'update',
+    'release_job_lease': 'delete',
+    'reset_all_stamps': 'delete',
+}
+
+
+class StorageError(Exception):
+    pass
+
+
+class UserNotFound(StorageError):
+    pass
+
+
+class GrantExists(StorageError):
+    """부장이 이미 이 대상에게 스탬프를 부여함 (1인당 1회 제한)"""
+    def __init__(self, previous_stamp=None):
+        super().__init__(previous_stamp)
+        self.previous_stamp = previous_stamp
+
+
+class EmailInUse(StorageError):
+    """다른 uid의 사용자가 이미 이 이메일로 가입됨 (Firebase 계정을 지우고 같은 이메일로 다시 만든 경우 등)"""
+    def __init__(self, email, existing_uid):
+        super().__init__(f"{email} (uid {existing_uid})")
+        self.email = email
+        self.existing_uid = existing_uid
+
+
+class TransactionContention(StorageError):
+    """재시도 한도를 넘긴 쓰기 경합"""
+    pass
+
+
+class Storage:
+    """
+    저장소 인터페이스
+    - version: get_users가 돌려주는 문서 버전 (commit_grants에서 읽은 뒤 바뀌었는지 확인용)
+    - attempts: [0] 리스트 - change_stamp가 트랜잭션 함수 실행 횟수를 더함 (재시도 통계)
+    """
+    name = None
+
+    def ping(self):
+        """연결 확인 (실패하면 예외)"""
+        raise NotImplementedError
+
+    # 사용자
+    def get_user(self, uid):
+        """사용자 데이터 (없으면 None)"""
+        raise NotImplementedError
+
+    def get_users(self, uids):
+        """여러 사용자를 한 번에 조회 → {uid: (사용자 데이터, version)} (없는 사용자는 빠짐)"""
+        raise NotImplementedError
+
+    def create_user(self, uid, user_data):
+        """
+        사용자 + 이메일 인덱스 + 통계(user_created)를 함께 생성
+        user_data: email, display_name, role (스탬프 필드와 created_at은 저장소가 채움)
+
+        Returns:
+            dict: 저장된 사용자 데이터 (이미 있으면 None)
+        Raises:
+            EmailInUse: 다른 uid의 사용자가 같은 이메일을 쓰고 있을 때 (기존 사용자는 그대로 둠)
+        """
+        raise NotImplementedError
+
+    def update_user(self, uid, fields):
+        """필드 갱신 (없는 사용자면 UserNotFound)"""
+        raise NotImplementedError
+
+    def watch_users(self, on_change):
+        """
+        모든 워커의 사용자 변경 구독 (워커마다 이벤트 버스를 같은 출처로 채우기 위함)
+        on_change(uid, user_data)는 처음에 모든 사용자로 한 번, 이후 바뀐 사용자마다 백그라운드에서 호출됩니다.
+
+        Returns:
+            callable or None: 구독 해제 함수 (None이면 지원하지 않음 → 이 프로세스의 쓰기만 알림)
+        """
+        return None
+
+    def list_users(self, page_size=None, cursor=None, fields=None):
+        """uid 순으로 (uid, 사용자 데이터) iterable (cursor 다음부터, fields가 있으면 그 필드 + 스탬프 필드만)"""
+        raise NotImplementedError
+
+    # 이메일 → uid 인덱스
+    def get_index_uids(self, emails):
+        """{이메일: uid} (인덱스에 없는 이메일은 빠짐)"""
+        raise NotImplementedError
+
+    def find_uid_by_email(self, email):
+        """인덱스에 없는 사용자를 사용자 데이터에서 찾기 (찾으면 인덱스 보충)"""
+        raise NotImplementedError
+
+    def write_index_entry(self, email, uid):
+        raise NotImplementedError
+
+    def iter_index(self, limit=None):
+        """(이메일, uid) iterable"""
+        raise NotImplementedError
+
+    # 스탬프
+    def change_stamp(self, uid, target_email, value, choose_stamp, manager_email=None, attempts=None):
+        """
+        스탬프 부여(value=True)/회수(False)를 원자적으로 처리
+        - choose_stamp(stamp_bits) → stamp_id: 읽은 스탬프로 대상 스탬프 결정 (예외를 던지면 쓰기 없이 취소)
+        - manager_email: 부여 시 부장 부여 기록 추가 (이미 있으면 GrantExists)
+        - 회수 시 해당 스탬프의 부여 기록도 삭제
+        - 통계 카운터 증감도 함께 기록
+
+        Returns:
+            tuple: (stamp_id, 변경 후 사용자 데이터)
+        Raises:
+            UserNotFound, GrantExists, TransactionContention
+        """
+        raise NotImplementedError
+
+    def get_manager_grants(self, manager_email, target_emails):
+        """{대상 이메일: 부여한 stamp_id} (부여 기록이 있는 대상만)"""
+        raise NotImplementedError
+
+    def commit_grants(self, grants, manager_email=None):
+        """
+        get_users로 읽은 대상들에게 스탬프 일괄 부여
+        grants: [(uid, target_email, 사용자 데이터, version, stamp_id)]
+        읽은 뒤 바뀐 대상/이미 부여 기록이 생긴 대상은 쓰지 않고 conflicted로 돌려줌
+
+        Returns:
+            tuple: ({uid: 변경 후 사용자 데이터}, [conflicted uid])
+        """
+        raise NotImplementedError
+
+    # 통계
+    def read_stats(self):
+        raise NotImplementedError
+
+    def rebuild_stats(self):
+        """전체 데이터로 통계 카운터 재계산 → {'users', 'grants'}"""
+        raise NotImplementedError
+
+    # 전체 초기화
+    def reset_all_stamps(self, progress=None):
+        """
+        모든 사용자 스탬프 초기화 + 부여 기록 삭제 + 통계 초기화
+        progress(stage, counts): 단계별 진행 상황 콜백
+
+        Returns:
+            dict: users_reset, grants_deleted, failed, errors
+        """
+        raise NotImplementedError
+
+    # 작업 / 감사 로그
+    def save_job(self, job_data):
+        raise NotImplementedError
+
+    def get_job(self, job_id):
+        raise NotImplementedError
+
+    def acquire_job_lease(self, kind, job_id, seconds):
+        """
+        kind 작업 임대 (여러 워커에서 같은 종류 작업이 동시에 돌지 않도록)
+        비어 있거나, 만료됐거나, 이미 job_id의 임대면 job_id로 seconds초 동안 잡음 (같은 job_id로 다시 부르면 연장)
+
+        Returns:
+            str or None: 다른 작업이 임대 중이면 그 job_id, 잡았으면 None
+        """
+        raise NotImplementedError
+
+    def release_job_lease(self, kind, job_id):
+        """job_id가 가진 임대만 해제 (만료 후 다른 작업이 잡았으면 그대로)"""
+        raise NotImplementedError
+
+    def append_audit(self, events):
+        """감사 이벤트 추가 (event_id가 같으면 한 번만 기록)"""
+        raise NotImplementedError
+
+
+def new_user_data(user_data):
+    """create_user용 (스탬프 비트 0 + 생성 시각)"""
+    return {**user_data, 'stamp_bits': 0, 'created_at': now_iso()}
+
+
+def now_iso():
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+def select_fields(user_data, fields):
+    """list_users의 fields 선택 (스탬프 필드는 응답 형식으로 변환하도록 항상 포함 - 응답에서 거름)"""
+    if not fields:
+        return user_data
+    return {k: v for k, v in user_data.items() if k in fields or k in ('stamps', 'stamp_bits')}
+
+
+class MemoryStorage(Storage):
+    """프로세스 메모리 저장소 (잠금 하나로 모든 변경을 직렬화)"""
+    name = 'memory'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.users = {}          # uid → 사용자 데이터 (stamp_bits 정수)
+        self.user_versions = {}  # uid → 변경 횟수
+        self.index = {}          # 이메일 → uid
+        self.grants = {}         # (manager, target) → stamp_id
+        self.stats = StatsDelta()
+        self.jobs = {}
+        self.job_leases = {}     # kind → (job_id, 만료 시각)
+        self.audit = {}
+
+    def ping(self):
+        return True
+
+    def get_user(self, uid):
+        count_ops(reads=1)
+        with self._lock:
+            user_data = self.users.get(uid)
+            return copy.deepcopy(user_data) if user_data is not None else None
+
+    def get_users(self, uids):
+        count_ops(reads=len(uids))
+        with self._lock:
+            return {uid: (copy.deepcopy(self.users[uid]), self.user_versions[uid])
+                    for uid in uids if uid in self.users}
+
+    def create_user(self, uid, user_data):
+        with self._lock:
+            if uid in self.users:
+                return None
+            new_user = new_user_data(user_data)
+            existing_uid = self.index.get(normalize_email(new_user['email']))
+            if existing_uid and existing_uid != uid and existing_uid in self.users:
+                raise EmailInUse(normalize_email(new_user['email']), existing_uid)
+            self._put_user(uid, new_user)
+            self.index[normalize_email(new_user['email'])] = uid
+            self.stats.user_created()
+            count_ops(writes=3)     # 사용자 + 인덱스 + 통계
+            return copy.deepcopy(new_user)
+
+    def update_user(self, uid, fields):
+        with self._lock:
+            if uid not in self.users:
+                raise UserNotFound(uid)
+            self._put_user(uid, {**self.users[uid], **fields})
+            count_ops(writes=1)
+
+    def list_users(self, page_size=None, cursor=None, fields=None):
+        with self._lock:
+            uids = sorted(uid for uid in self.users if not cursor or uid > cursor)
+            if page_size:
+                uids = uids[:page_size]
+            count_ops(queries=1, reads=len(uids))
+            return [(uid, select_fields(copy.deepcopy(self.users[uid]), fields)) for uid in uids]
+
+    def get_index_uids(self, emails):
+        count_ops(reads=len(emails))
+        with self._lock:
+            return {email: self.index[email] for email in emails if email in self.index}
+
+    def find_uid_by_email(self, email):
+        count_ops(queries=1, reads=1)
+        with self._lock:
+            for uid, user_data in self.users.items():
+                if user_data.get('email') == email:
+                    self.index[email] = uid
+                    count_ops(writes=1)
+                    return uid
+        return None
+
+    def write_index_entry(self, email, uid):
+        count_ops(writes=1)
+        with self._lock:
+            self.index[normalize_email(email)] = uid
+
+    def iter_index(self, limit=None):
+        with self._lock:
+            entries = list(self.index.items())
+        entries = entries[:limit] if limit else entries
+        count_ops(queries=1, reads=len(entries))
+        return entries
+
+    def change_stamp(self, uid, target_email, value, choose_stamp, manager_email=None, attempts=None):
+        with self._lock:
+            if attempts is not None:
+                attempts[0] += 1
+            user_data = self.users.get(uid)
+            count_ops(reads=1 if value else 2)    # 회수: 부여 기록 보조 키도 읽음
+            if user_data is None:
+                raise UserNotFound(uid)
+            old_bits = user_stamp_bits(user_data)
+            stamp_id = choose_stamp(old_bits)
+            if value and manager_email and (manager_email, target_email) in self.grants:
+                raise GrantExists(self.grants[(manager_email, target_email)])
+
+            new_bits = old_bits | stamp_bit(stamp_id) if value else old_bits & ~stamp_bit(stamp_id)
+            delta = StatsDelta()
+            writes, deletes = 1, 0
+            if value and manager_email:
+                self.grants[(manager_email, target_email)] = stamp_id
+                delta.manager_grant(manager_email)
+                writes += 1
+            elif not value:
+                for key, granted in list(self.grants.items()):
+                    if key[1] == target_email and granted == stamp_id:
+                        del self.grants[key]
+                        delta.manager_grant(key[0], -1)
+                        deletes += 1
+            delta.stamps_changed(old_bits, new_bits)
+            self._put_user(uid, {**user_data, 'stamp_bits': new_bits})
+            self._add_stats(delta)
+            count_ops(writes=writes + int(delta.changed()), deletes=deletes)
+            return stamp_id, copy.deepcopy(self.users[uid])
+
+    def get_manager_grants(self, manager_email, target_emails):
+        count_ops(reads=len(target_emails))
+        with self._lock:
+            return {email: self.grants[(manager_email, email)]
+                    for email in target_emails if (manager_email, email) in self.grants}
+
+    def commit_grants(self, grants, manager_email=None):
+        updated, conflicted = {}, []
+        with self._lock:
+            for uid, target_email, _, version, stamp_id in grants:
+                if self.user_versions.get(uid) != version or (manager_email, target_email) in self.grants:
+                    conflicted.append(uid)
+                    continue
+                old_bits = user_stamp_bits(self.users[uid])
+                new_bits = old_bits | stamp_bit(stamp_id)
+                delta = StatsDelta()
+                delta.stamps_changed(old_bits, new_bits)
+                if manager_email:
+                    self.grants[(manager_email, target_email)] = stamp_id
+                    delta.manager_grant(manager_email)
+                self._put_user(uid, {**self.users[uid], 'stamp_bits': new_bits})
+                self._add_stats(delta)
+                updated[uid] = copy.deepcopy(self.users[uid])
+        count_ops(writes=len(updated) * (2 if manager_email else 1) + int(bool(updated)))
+        return updated, conflicted
+
+    def read_stats(self):
+        count_ops(reads=1)
+        with self._lock:
+            return summarize_stats(self.stats.stamp_holders, self.stats.completion, self.stats.manager_grants)
+
+    def rebuild_stats(self):
+        with self._lock:
+            count_ops(queries=2, reads=len(self.users) + len(self.grants), writes=1)
+            self.stats = baseline_delta((user_stamp_bits(user_data) for user_data in self.users.values()),
+                                        (manager for manager, _ in self.grants))
+            return rebuild_summary(self.stats)
+
+    def reset_all_stamps(self, progress=None):
+        with self._lock:
+            for uid, user_data in list(self.users.items()):
+                self._put_user(uid, {**user_data, 'stamp_bits': 0})
+            grants_deleted = len(self.grants)
+            self.grants.clear()
+            self.stats = StatsDelta()
+            self.stats.completion['0'] = len(self.users)
+            users_reset = len(self.users)
+            count_ops(queries=2, reads=users_reset + grants_deleted, writes=users_reset + 1, deletes=grants_deleted)
+        if progress:
+            progress('users', {'processed': users_reset, 'written': users_reset, 'failed': 0})
+            progress('grants', {'processed': grants_deleted, 'written': grants_deleted, 'failed': 0})
+        return {'users_reset': users_reset, 'grants_deleted': grants_deleted, 'failed': 0, 'errors': []}
+
+    def save_job(self, job_data):
+        count_ops(writes=1)
+        with self._lock:
+            self.jobs[job_data['job_id']] = copy.deepcopy(job_data)
+
+    def get_job(self, job_id):
+        count_ops(reads=1)
+        with self._lock:
+            return copy.deepcopy(self.jobs.get(job_id))
+
+    def acquire_job_lease(self, kind, job_id, seconds):
+        count_ops(reads=1)
+        now = time.time()
+        with self._lock:
+            holder, expires_at = self.job_leases.get(kind, (None, 0))
+            if holder and holder != job_id and expires_at > now:
+                return holder
+            self.job_leases[kind] = (job_id, now + seconds)
+        count_ops(writes=1)
+        return None
+
+    def release_job_lease(self, kind, job_id):
+        with self._lock:
+            if self.job_leases.get(kind, (None, 0))[0] == job_id:
+                del self.job_leases[kind]
+                count_ops(deletes=1)
+
+    def append_audit(self, events):
+        count_ops(writes=len(events))
+        with self._lock:
+            for event in events:
+                self.audit[event['event_id']] = event
+
+    def _put_user(self, uid, user_data):
+        self.users[uid] = user_data
+        self.user_versions[uid] = self.user_versions.get(uid, 0) + 1
+
+    def _add_stats(self, delta):
+        for name in ('stamp_holders', 'completion', 'manager_grants'):
+            getattr(self.stats, name).update(getattr(delta, name))
+
+
+class ObservedStorage:
+    """
+    저장소 호출마다 observer(backend, method, operation, seconds, error) 호출
+    제너레이터를 돌려주는 메서드(Firestore 스트리밍 등)는 끝까지 읽은 시간까지 포함합니다.
+    """
+
+    def __init__(self, storage, observers):
+        self.storage = storage
+        self.name = storage.name
+        self.observers = observers
+        for method, operation in STORAGE_OPERATIONS.items():
+            setattr(self, method, self._wrap(getattr(storage, method), method, operation))
+
+    def __getattr__(self, attr):
+        return getattr(self.storage, attr)
+
+    def _notify(self, method, operation, seconds, error):
+        for observer in self.observers:
+            observer(self.name, method, operation, seconds, error)
+
+    def _wrap(self, fn, method, operation):
+        @wraps(fn)
+        def call(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception:
+                self._notify(method, operation, time.perf_counter() - started, True)
+                raise
+            if isinstance(result, types.GeneratorType):
+                return self._observe_stream(result, method, operation, time.perf_counter() - started)
+            self._notify(method, operation, time.perf_counter() - started, False)
+            return result
+        return call
+
+    def _observe_stream(self, stream, method, operation, elapsed):
+        error = True
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    item = next(stream)
+                except StopIteration:
+                    break
+                finally:
+                    elapsed += time.perf_counter() - started
+                yield item
+            error = False
+        except GeneratorExit:
+            error = False   # 호출한 쪽이 중간에 그만 읽음
+            stream.close()
+            raise
+        finally:
+            self._notify(method, operation, elapsed, error)
+
+
+_storage = None
+_storage_pid = None
+_storage_lock = threading.Lock()
+_observers = []
+
+
+def add_storage_observer(observer):
+    """저장소 호출 관찰 함수 등록 (get_storage 전에 - 메트릭, 요청별 집계)"""
+    _observers.append(observer)
+
+
+def observed(storage):
+    return ObservedStorage(storage, _observers) if storage is not None and _observers else storage
+
+
+def create_storage(backend=None):
+    """
+    Returns:
+        Storage or None (Firestore 연결 실패)
+    """
+    backend = backend or os.environ.get('STORAGE_BACKEND', DEFAULT_BACKEND)
+    if backend == 'memory':
+        return MemoryStorage()
+    if backend == 'sqlite':
+        from sqlite_storage import SQLiteStorage
+        return SQLiteStorage(os.environ.get('SQLITE_PATH'))
+    if backend == 'firestore':
+        from firestore_storage import FirestoreStorage
+        storage = FirestoreStorage()
+        return storage if storage.available() else None
+    raise ValueError(f"알 수 없는 STORAGE_BACKEND: {backend}")
+
+
+def get_storage():
+    """현재 프로세스의 저장소 (없으면 생성, Firestore 연결 실패 시 None)"""
+    global _storage, _storage_pid
+    pid = os.getpid()
+    if _storage is not None and _storage_pid == pid:
+        return _storage
+    with _storage_lock:
+        if _storage is None or _storage_pid != pid:
+            storage = observed(create_storage())
+            if storage is None:
+                return None
+            _storage, _storage_pid = storage, pid
+    return _storage
+
+
+def set_storage(storage):
+    """저장소 직접 지정 (부하 테스트/스크립트용)"""
+    global _storage, _storage_pid
+    with _storage_lock:
+        _storage, _storage_pid = observed(storage), os.getpid()
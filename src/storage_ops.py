@@ -0,0 +1,131 @@
+"""
+요청별 저장소 작업 수 집계 (문서 읽기/쓰기/삭제, 쿼리)
+- 저장소 구현이 실제로 읽고 쓴 문서 수를 count_ops()로 보고 (Firestore 과금 단위와 같음)
+- 서버는 요청마다 start_counting()/stop_counting()으로 집계해 로그와 메트릭으로 남기고,
+  STORAGE_OPS_DEBUG=1이면 모든 요청을 로그에 남기고 X-Storage-Ops 헤더로도 돌려줌
+- ENDPOINT_BUDGETS: 엔드포인트별 한도 → 넘으면 로그 경고, assert_within_budget()은 AssertionError
+  (O(1) 경로가 전체 스캔으로 바뀌는 변경을 CI에서 잡기 위한 용도 - budget_check.py)
+집계는 contextvars로 하므로 요청 스레드/greenlet별로 분리되고, 백그라운드 작업에서는 아무것도 하지 않습니다.
+"""
+
+import contextlib
+import contextvars
+
+from stats_counters import NUM_SHARDS
+
+OP_KINDS = ('reads', 'writes', 'deletes', 'queries')
+
+# 'METHOD 라우트' → 요청 한 번의 최대 작업 수 (None: 스캔이 정상인 엔드포인트라 제한 없음)
+# Firestore 기준 최악의 경우 (인덱스 미스, 트랜잭션 재시도 1회 포함)
+ENDPOINT_BUDGETS = {
+    'POST /api/login': {'reads': 2, 'writes': 4, 'deletes': 0, 'queries': 0},
+    'GET /api/profile': {'reads': 2, 'writes': 1, 'deletes': 0, 'queries': 0},
+    'POST /api/stamps': {'reads': 6, 'writes': 4, 'deletes': 2, 'queries': 1},
+    'POST /api/stamps/batch': {'reads': 400, 'writes': 310, 'deletes': 0, 'queries': 100},
+    'POST /api/role': {'reads': 2, 'writes': 2, 'deletes': 0, 'queries': 1},
+    'GET /api/users': None,
+    'GET /api/stats': {'reads': NUM_SHARDS, 'writes': 0, 'deletes': 0, 'queries': 0},
+    # 작업 임대 + 상태 저장만 (이미 진행 중이면 임대 + 그 작업 조회)
+    'POST /api/stats/rebuild': {'reads': 2, 'writes': 2, 'deletes': 0, 'queries': 0},
+    'POST /api/reset-all-stamps': {'reads': 2, 'writes': 2, 'deletes': 0, 'queries': 0},
+    'GET /api/jobs/<job_id>': {'reads': 1, 'writes': 0, 'deletes': 0, 'queries': 0},
+    'GET /api/stamps': {'reads': 0, 'writes': 0, 'deletes': 0, 'queries': 0},
+}
+
+_current = contextvars.ContextVar('storage_op_counts', default=None)
+
+
+class OpCounts:
+    __slots__ = ('reads', 'writes', 'deletes', 'queries', 'parent')
+
+    def __init__(self, parent=None):
+        self.reads = 0
+        self.writes = 0
+        self.deletes = 0
+        self.queries = 0
+        self.parent = parent    # 바깥 counting()에도 함께 더함 (budget_check가 요청 전체를 감쌀 때)
+
+    def add(self, reads=0, writes=0, deletes=0, queries=0):
+        counts = self
+        while counts is not None:
+            counts.reads += reads
+            counts.writes += writes
+            counts.deletes += deletes
+            counts.queries += queries
+            counts = counts.parent
+
+    def to_dict(self):
+        return {kind: getattr(self, kind) for kind in OP_KINDS}
+
+    def header_value(self):
+        return ';'.join(f'{kind}={getattr(self, kind)}' for kind in OP_KINDS)
+
+    def over_budget(self, budget):
+        """한도를 넘은 항목 {종류: (실제, 한도)} (budget이 None이면 빈 dict)"""
+        if budget is None:
+            return {}
+        return {kind: (getattr(self, kind), limit) for kind, limit in budget.items()
+                if getattr(self, kind) > limit}
+
+
+def count_ops(reads=0, writes=0, deletes=0, queries=0):
+    """저장소 구현에서 호출 (집계 중인 요청이 없으면 아무것도 안 함)"""
+    counts = _current.get()
+    if counts is not None:
+        counts.add(reads, writes, deletes, queries)
+
+
+def count_stream(stream, reads_per_item=1):
+    """쿼리 결과 스트림을 읽는 만큼 reads 집계"""
+    for item in stream:
+        count_ops(reads=reads_per_item)
+        yield item
+
+
+def start_counting():
+    counts = OpCounts(parent=_current.get())
+    _current.set(counts)
+    return counts
+
+
+def stop_counting(counts):
+    # 토큰(reset) 대신 부모로 되돌림 → 스트리밍 응답처럼 teardown이 다른 컨텍스트에서 실행되어도 안전
+    _current.set(counts.parent)
+
+
+@contextlib.contextmanager
+def counting():
+    counts = start_counting()
+    try:
+        yield counts
+    finally:
+        stop_counting(counts)
+
+
+def parse_header(value):
+    """X-Storage-Ops 헤더 → dict"""
+    counts = {}
+    for part in filter(None, (value or '').split(';')):
+        kind, _, number = part.partition('=')
+        counts[kind] = int(number)
+    return counts
+
+
+def assert_within_budget(counts, endpoint, budget=None):
+    """
+    CI/스크립트용: 한도를 넘으면 AssertionError
+
+    Args:
+        counts: OpCounts 또는 dict
+        endpoint: 'METHOD 라우트' (ENDPOINT_BUDGETS 키)
+        budget: 직접 지정할 한도 (없으면 ENDPOINT_BUDGETS)
+    """
+    if isinstance(counts, dict):
+        counts_obj = OpCounts()
+        counts_obj.add(**counts)
+        counts = counts_obj
+    budget = budget if budget is not None else ENDPOINT_BUDGETS[endpoint]
+    exceeded = counts.over_budget(budget)
+    assert not exceeded, (
+        f"{endpoint}: 저장소 작업 한도 초과 " +
+        ', '.join(f"{kind} {actual} > {limit}" for kind, (actual, limit) in exceeded.items()))
@@ -7,6 +7,12 @@ from dotenv import load_dotenv
 from streamlit.components.v1 import html
 import json
 import base64
+import threading
+import time
+import uuid
+import random
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlencode
 
 load_dotenv()
 
@@ -17,6 +23,19 @@ STREAMLIT_APP_URL = "https://jeohyeongoweb.streamlit.app"
 # ✅ 스탬프 ID 목록 (부스 → 스탬프로 변경)
 STAMP_IDS = [f"stamp{i}" for i in range(1, 34)]
 
+# ✅ 관리자 사용자 목록 페이지 크기 / 필요한 필드만 요청 (필드별 배열 형식, 스탬프는 정수 비트)
+ADMIN_USERS_PAGE_SIZE = 200
+ADMIN_USER_FIELDS = "email,display_name,role,stamps"
+ADMIN_USER_COLUMNS = ('id', 'email', 'display_name', 'role', 'stamp_bits')
+
+# ✅ 실시간 스탬프 알림 (SSE) - 받은 이벤트 확인 주기 / 재연결 대기(실패할 때마다 2배, 최대값) / 세션이 사라졌다고 볼 시간
+EVENT_CHECK_SECONDS = 2
+EVENT_RETRY_SECONDS = 3
+EVENT_RETRY_MAX_SECONDS = 60
+EVENT_LISTENER_IDLE_SECONDS = 60
+# ✅ 스트림이 끊겼거나 서버가 거절(503 등)한 동안에는 /api/profile 주기 조회로 대신
+PROFILE_POLL_SECONDS = 15
+
 # 세션 상태 초기화
 session_defaults = {
     'auth_token': None,
@@ -27,7 +46,13 @@ session_defaults = {
     'show_presentation_clubs': False,
     'show_exhibition_activities': False,
     'show_academic_web': False,
-    'admin_users': None
+    'admin_users': None,
+    'admin_users_cursor': None,
+    'etag_cache': {},
+    'event_listener': None,
+    'profile_polled_at': 0.0,
+    'seen_event_connections': 0,
+    'submission_keys': {}
 }
 
 for key, default in session_defaults.items():
@@ -58,17 +83,49 @@ def format_email_input(user_input):
     else:
         return f"{user_input}@jeohyeon.hs.kr"
 
-def make_flask_request(endpoint, method='GET', data=None, token=None):
+def submission_key(form_key, data):
+    """
+    폼 제출별 Idempotency-Key
+    실패/시간 초과 후 같은 내용으로 다시 제출하면 같은 키 → 서버가 처음 결과를 돌려줌 (중복 부여 방지)
+    """
+    payload = json.dumps(data, sort_keys=True)
+    saved = st.session_state.submission_keys.get(form_key)
+    if not saved or saved[1] != payload:
+        saved = (uuid.uuid4().hex, payload)
+        st.session_state.submission_keys[form_key] = saved
+    return saved[0]
+
+def finish_submission(form_key, response):
+    # 서버가 처리를 끝낸 응답(5xx 제외)을 받았으면 다음 제출은 새 키
+    if response is not None and response.status_code < 500:
+        st.session_state.submission_keys.pop(form_key, None)
+
+def make_flask_request(endpoint, method='GET', data=None, token=None, form_key=None):
     headers = {'Content-Type': 'application/json'}
     if token:
         headers['Authorization'] = f'Bearer {token}'
+    if form_key:
+        headers['Idempotency-Key'] = submission_key(form_key, data)
     
     try:
         url = f"{FLASK_SERVER_URL}{endpoint}"
         if method == 'GET':
+            # ✅ 이전 응답의 ETag로 조건부 요청 → 304면 저장된 응답 재사용
+            cache_key = (url, token)
+            cached = st.session_state.etag_cache.get(cache_key)
+            if cached is not None:
+                headers['If-None-Match'] = cached.headers['ETag']
             response = requests.get(url, headers=headers)
+            if response.status_code == 304 and cached is not None:
+                return cached
+            if response.status_code == 200 and response.headers.get('ETag'):
+                st.session_state.etag_cache[cache_key] = response
+            elif response.status_code == 200:
+                st.session_state.etag_cache.pop(cache_key, None)   # 서버가 ETag를 끔 (워커 여러 개)
         elif method == 'POST':
             response = requests.post(url, json=data, headers=headers)
+            if form_key:
+                finish_submission(form_key, response)
         return response
     except requests.exceptions.ConnectionError:
         st.error("🚨 Flask 서버에 연결할 수 없습니다.")
@@ -77,6 +134,200 @@ def make_flask_request(endpoint, method='GET', data=None, token=None):
         st.error(f"요청 중 오류 발생: {e}")
         return None
 
+def fetch_users_page(token, cursor=None):
+    """
+    사용자 목록 한 페이지 조회 (format=columns, 압축은 requests가 Accept-Encoding으로 협상/해제)
+    → ({필드: [...]}, next_cursor), 실패 시 (None, None)
+    """
+    params = {'page_size': ADMIN_USERS_PAGE_SIZE, 'fields': ADMIN_USER_FIELDS, 'format': 'columns'}
+    if cursor:
+        params['cursor'] = cursor
+    response = make_flask_request(f"/api/users?{urlencode(params)}", 'GET', token=token)
+    if response and response.status_code == 200:
+        data = response.json()
+        columns = data.get('columns', {})
+        count = data.get('count', 0)
+        return {name: columns.get(name) or [None] * count for name in ADMIN_USER_COLUMNS}, data.get('next_cursor')
+    return None, None
+
+def load_admin_users(token, more=False):
+    """관리자 사용자 목록 첫 페이지 로드 (more=True면 다음 페이지를 이어 붙임)"""
+    cursor = st.session_state.admin_users_cursor if more else None
+    users, next_cursor = fetch_users_page(token, cursor)
+    if users is None:
+        return
+    if more and st.session_state.admin_users:
+        users = {name: st.session_state.admin_users[name] + values for name, values in users.items()}
+    st.session_state.admin_users = users
+    st.session_state.admin_users_cursor = next_cursor
+
+def parse_retry_after(value):
+    """Retry-After 헤더 (초 또는 HTTP 날짜) → 초, 없거나 잘못된 값이면 None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+def retry_delay(failures, retry_after=None):
+    """
+    SSE 재연결 대기 시간
+    - 정상 종료 후(failures=0): EVENT_RETRY_SECONDS
+    - 연속 실패: 지수 백오프 + 지터 (여러 세션이 같은 순간에 다시 몰리지 않도록)
+    - 서버가 Retry-After를 주면 그보다 먼저 재연결하지 않음
+    """
+    backoff = min(EVENT_RETRY_SECONDS * 2 ** max(failures - 1, 0), EVENT_RETRY_MAX_SECONDS)
+    if failures:
+        backoff = random.uniform(backoff / 2, backoff)
+    if retry_after is not None:
+        backoff = max(backoff, retry_after)
+    return backoff
+
+class StampEventListener:
+    """
+    /api/events SSE 스트림을 읽는 백그라운드 스레드
+    받은 이벤트는 pending에 모아 두고, 화면 갱신은 watch_stamp_events가 합니다. (스레드에서 st.* 호출 안 함)
+    """
+    def __init__(self, token):
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.token = token
+        self.pending = []
+        self.last_drained = time.monotonic()
+        self.connected = False      # 지금 스트림을 읽는 중인지 (아니면 화면은 주기 조회로)
+        self.connections = 0        # 연결 성공 횟수 (새 연결마다 끊긴 동안의 변경을 프로필로 확인)
+        self._thread = threading.Thread(target=self._run, name='stamp-events', daemon=True)
+        self._thread.start()
+
+    def drain(self):
+        with self._lock:
+            self.last_drained = time.monotonic()
+            events, self.pending = self.pending, []
+        return events
+
+    def stop(self):
+        self._stop.set()
+
+    def _abandoned(self):
+        # 세션이 끝나 더 이상 drain하지 않으면 스레드 종료
+        return self._stop.is_set() or time.monotonic() - self.last_drained > EVENT_LISTENER_IDLE_SECONDS
+
+    def _run(self):
+        headers = {'Authorization': f'Bearer {self.token}', 'Accept': 'text/event-stream'}
+        failures = 0
+        while not self._abandoned():
+            retry_after = None
+            try:
+                with requests.get(f"{FLASK_SERVER_URL}/api/events", headers=headers,
+                                  stream=True, timeout=(5, 60)) as response:
+                    if response.status_code == 401:
+                        return
+                    if response.status_code == 200:
+                        failures = 0
+                        self.connections += 1
+                        self.connected = True
+                        try:
+                            self._read(response)
+                        finally:
+                            self.connected = False
+                    else:
+                        failures += 1
+                        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            except requests.exceptions.RequestException:
+                failures += 1
+            self._stop.wait(retry_delay(failures, retry_after))
+
+    def _read(self, response):
+        event = None
+        for line in response.iter_lines(decode_unicode=True):
+            if self._abandoned():
+                return
+            if line.startswith('event:'):
+                event = line[6:].strip()
+            elif line.startswith('data:') and event in ('stamp', 'role', 'reset'):
+                with self._lock:
+                    self.pending.append((event, json.loads(line[5:])))
+            elif not line:
+                event = None
+
+def ensure_event_listener(token):
+    """로그인한 토큰으로 SSE 리스너 실행 (토큰이 바뀌면 새로 시작)"""
+    listener = st.session_state.event_listener
+    if listener and listener.token == token and listener._thread.is_alive():
+        return
+    if listener:
+        listener.stop()
+    st.session_state.event_listener = StampEventListener(token)
+
+def stop_event_listener():
+    if st.session_state.event_listener:
+        st.session_state.event_listener.stop()
+        st.session_state.event_listener = None
+
+def apply_stamp_events(events):
+    """받은 변경을 user_info에 반영 (전체 초기화는 프로필을 다시 받음)"""
+    user_info = st.session_state.user_info
+    for event, data in events:
+        if event == 'stamp':
+            # 여러 스탬프가 한 번에 바뀐 이벤트는 stamp_id 없이 stamp_bits만 옴 (비트 n-1 = stampn)
+            stamps = user_info.setdefault('stamps', {})
+            for stamp_id in {key for key in stamps if key.startswith('stamp')} | set(STAMP_IDS):
+                stamps[stamp_id] = bool(data['stamp_bits'] >> (int(stamp_id[5:]) - 1) & 1)
+        elif event == 'role':
+            user_info['role'] = data['role']
+        elif event == 'reset':
+            response = make_flask_request('/api/profile', 'GET', token=st.session_state.auth_token)
+            if response and response.status_code == 200:
+                user_info = response.json().get('user')
+    st.session_state.user_info = user_info
+
+def needs_profile_refresh(listener):
+    """
+    스트림으로 받지 못한 변경이 있을 수 있으면 True
+    - 연결 중: 새로 연결된 직후 한 번 (끊겨 있던 동안의 변경)
+    - 끊김/거절: PROFILE_POLL_SECONDS마다
+    """
+    if listener and listener.connected:
+        if listener.connections != st.session_state.seen_event_connections:
+            st.session_state.seen_event_connections = listener.connections
+            return True
+        return False
+    return time.monotonic() - st.session_state.profile_polled_at >= PROFILE_POLL_SECONDS
+
+def refresh_profile():
+    """/api/profile로 역할/스탬프 다시 받기 (ETag → 바뀐 게 없으면 304) - 바뀌었으면 True"""
+    st.session_state.profile_polled_at = time.monotonic()
+    response = make_flask_request('/api/profile', 'GET', token=st.session_state.auth_token)
+    if not response or response.status_code != 200:
+        return False
+    user = response.json().get('user') or {}
+    user_info = st.session_state.user_info
+    if all(user.get(key) == user_info.get(key) for key in ('role', 'stamps')):
+        return False
+    st.session_state.user_info = {**user_info, **user}
+    return True
+
+@st.fragment(run_every=EVENT_CHECK_SECONDS)
+def watch_stamp_events():
+    """
+    리스너가 받아 둔 이벤트 확인 → 변경이 있으면 화면 전체 갱신
+    스트림이 없거나 오류인 동안에는 프로필 주기 조회로 대신함
+    """
+    if not st.session_state.user_info:
+        return
+    listener = st.session_state.event_listener
+    events = listener.drain() if listener else []
+    if events:
+        apply_stamp_events(events)
+        st.rerun()
+    if needs_profile_refresh(listener) and refresh_profile():
+        st.rerun()
+
 def verify_token(token):
     """토큰 검증 함수"""
     if not token:
@@ -465,7 +716,7 @@ def show_manager_features(token, user_info):
                         'target_email': target_email, 
                         'action': 'grant',
                         'auto_grant': True
-                    }, token)
+                    }, token, form_key="manager_grant_form")
                     
                     if response and response.status_code == 200:
                         data = response.json()
@@ -475,31 +726,67 @@ def show_manager_features(token, user_info):
                     else:
                         error_msg = response.json().get('message', '처리 실패') if response else '이 계정에는 더이상 스탬프를 부여할 수 없습니다.'
                         st.error(f"❌ {error_msg}")
+    
+    # ✅ 대기 중인 학생 여러 명 한 번에 부여
+    with st.form("manager_batch_grant_form"):
+        st.subheader("📋 여러 명 한 번에 부여")
+        
+        batch_input = st.text_area("대상 학번 또는 이메일 (줄바꿈 또는 쉼표로 구분)",
+                                   placeholder="2411224\n2411225\n2411226",
+                                   key="manager_batch_input")
+        targets = [format_email_input(t) for t in batch_input.replace(',', '\n').splitlines() if t.strip()]
+        
+        if targets:
+            st.info(f"**부여 대상:** {len(targets)}명")
+        
+        if st.form_submit_button("✅ 일괄 부여", use_container_width=True):
+            if not targets:
+                st.error("❌ 대상 학번을 입력하세요.")
+            else:
+                with st.spinner(f"{len(targets)}명에게 스탬프 부여 중..."):
+                    response = make_flask_request('/api/stamps/batch', 'POST', {'targets': targets}, token,
+                                                  form_key="manager_batch_grant_form")
+                    
+                    if response and response.status_code == 200:
+                        data = response.json()
+                        if data.get('failed'):
+                            st.warning(f"⚠️ {data.get('message')}")
+                        else:
+                            st.success(f"✅ {data.get('message')}")
+                        st.dataframe([{
+                            '대상': result['target_email'],
+                            '결과': '✅ 부여' if result['status'] == 'granted' else '❌ 실패',
+                            '스탬프/사유': result.get('stamp_id') or result.get('message', '')
+                        } for result in data.get('results', [])], use_container_width=True)
+                    else:
+                        error_msg = response.json().get('message', '처리 실패') if response else '서버 연결 실패'
+                        st.error(f"❌ {error_msg}")
 
 def show_admin_features(token, user_info):
     st.header("⚙️ 관리자 메뉴")
     
-    if 'admin_users' not in st.session_state:
-        response = make_flask_request('/api/users', 'GET', token=token)
-        if response and response.status_code == 200:
-            st.session_state.admin_users = response.json().get('users', [])
+    if st.session_state.admin_users is None:
+        load_admin_users(token)
     
     st.subheader("👥 사용자 관리")
     
-    if 'admin_users' in st.session_state and st.session_state.admin_users:
-        users_for_display = []
-        for user in st.session_state.admin_users:
-            stamps = user.get('stamps', {})
-            stamp_count = sum(1 for has_stamp in stamps.values() if has_stamp)
-            users_for_display.append({
-                '이메일': user.get('email', '이메일 없음'),
-                '이름': user.get('display_name', '이름 없음'),
-                '역할': user.get('role', 'student'),
-                '스탬프': f"{stamp_count}/{len(STAMP_IDS)}"
-            })
+    if 'admin_users' in st.session_state and st.session_state.admin_users and st.session_state.admin_users['id']:
+        # ✅ 필드별 배열을 그대로 표의 열로 사용 (스탬프 수 = 비트 수)
+        admin_users = st.session_state.admin_users
+        users_for_display = {
+            '이메일': [email or '이메일 없음' for email in admin_users['email']],
+            '이름': [name or '이름 없음' for name in admin_users['display_name']],
+            '역할': [role or 'student' for role in admin_users['role']],
+            '스탬프': [f"{bin(bits or 0).count('1')}/{len(STAMP_IDS)}" for bits in admin_users['stamp_bits']]
+        }
         
         st.dataframe(users_for_display, use_container_width=True)
         
+        if st.session_state.admin_users_cursor:
+            if st.button(f"⬇️ 사용자 더 불러오기 ({ADMIN_USERS_PAGE_SIZE}명씩)", key="admin_users_more"):
+                load_admin_users(token, more=True)
+                st.rerun()
+        
         st.subheader("🔄 역할 변경")
         col1, col2, col3 = st.columns([2, 1, 1])
         
@@ -521,13 +808,11 @@ def show_admin_features(token, user_info):
                         response = make_flask_request('/api/role', 'POST', {
                             'target_email': role_target_email, 
                             'new_role': new_role
-                        }, token)
+                        }, token, form_key="admin_role_form")
                         
                         if response and response.status_code == 200:
                             st.success(f"✅ {response.json().get('message')}")
-                            response = make_flask_request('/api/users', 'GET', token=token)
-                            if response and response.status_code == 200:
-                                st.session_state.admin_users = response.json().get('users', [])
+                            load_admin_users(token)
                             st.rerun()
                         else:
                             error_msg = response.json().get('message', '처리 실패') if response else '서버 연결 실패'
@@ -557,7 +842,7 @@ def show_admin_features(token, user_info):
                             'target_email': auto_target_email, 
                             'action': 'grant',
                             'auto_grant': True
-                        }, token)
+                        }, token, form_key="admin_auto_grant_form")
                         
                         if response and response.status_code == 200:
                             data = response.json()
@@ -593,7 +878,7 @@ def show_admin_features(token, user_info):
                             'target_email': specific_target_email, 
                             'stamp_id': stamp_id,
                             'action': 'grant' if action_type == "부여" else 'revoke'
-                        }, token)
+                        }, token, form_key="admin_specific_stamp_form")
                         
                         if response and response.status_code == 200:
                             st.success(f"✅ {response.json().get('message')}")
@@ -626,6 +911,7 @@ def show_main_page():
             </script>
             """
             html(logout_js, height=0)
+            stop_event_listener()
             st.session_state.auth_token = None
             st.session_state.user_info = None
             st.session_state.logout_triggered = True
@@ -667,6 +953,10 @@ def show_main_page():
     
     st.divider()
     
+    # ✅ 새로고침 없이 스탬프 변경 반영 (SSE)
+    ensure_event_listener(token)
+    watch_stamp_events()
+    
     show_student_features(token, user_info)
     
     if user_info['role'] in ['manager', 'admin']:
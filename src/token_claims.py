@@ -0,0 +1,106 @@
+"""
+검증된 JWT 클레임 캐시 + 역할 변경 반영
+- 토큰 SHA-256 다이제스트 → 검증된 클레임 (토큰 만료 시각까지만 보관)
+- update_role이 기록한 역할 변경은 그 이전에 발급된 토큰에 바로 적용 (Firestore 조회 없음)
+  record_role_change는 이 워커에만 기록됨 → 다른 워커에서 바뀐 역할은 role_lookup으로 반영:
+  캐시 항목을 recheck_seconds마다 만료시키고, 캐시 미스 때 저장소의 현재 역할로 클레임의 역할을 덮어씀
+  (다른 워커의 역할 변경은 최대 recheck_seconds 뒤에 적용, 토큰당 워커당 그 주기로 조회 1회)
+"""
+
+import hashlib
+import threading
+import time
+
+from cache import LRUCache
+
+TOKEN_LIFETIME_SECONDS = 24 * 3600
+ROLE_RECHECK_SECONDS = 60
+
+
+def token_digest(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class TokenClaims:
+    def __init__(self, maxsize=10000, role_lookup=None, recheck_seconds=ROLE_RECHECK_SECONDS):
+        """
+        Args:
+            role_lookup: claims → 저장소의 현재 역할 (없으면 None), 없으면 이 워커의 변경 기록만 적용
+            recheck_seconds: role_lookup을 다시 호출하기까지의 시간 (캐시 항목 TTL 상한)
+        """
+        self._lock = threading.Lock()
+        self._role_changes = {}   # 이메일 → (새 역할, 변경 시각)
+        self.role_lookup = role_lookup
+        self.recheck_seconds = recheck_seconds
+        self.role_lookups = 0
+        self.cache = LRUCache(maxsize=maxsize, ttl=TOKEN_LIFETIME_SECONDS)
+
+    def verify(self, token, decode):
+        """
+        캐시에 있으면 캐시된 클레임, 없으면 decode(token)으로 검증 + 저장소 역할 확인 후 캐시
+        (decode가 던지는 jwt 예외는 그대로 전달)
+        """
+        digest = token_digest(token)
+        entry = self.cache.get(digest)
+        if entry is None:
+            claims = decode(token)
+            entry = (self._lookup_role(claims), time.time() if self.role_lookup else 0)
+            remaining = claims.get('exp', time.time() + TOKEN_LIFETIME_SECONDS) - time.time()
+            ttl = min(remaining, self.recheck_seconds) if self.role_lookup else remaining
+            self.cache.set(digest, entry, ttl=max(0.0, ttl))
+        claims, checked_at = entry
+        return self._apply_role_change(claims, checked_at)
+
+    def peek(self, token, decode):
+        """
+        서명만 확인한 클레임 (요청 한도 키 등 저장소를 건드리면 안 되는 곳에서 사용)
+        캐시에 있으면 캐시된 클레임, 없으면 decode만 하고 캐시하지 않음 → role_lookup은 뒤의 verify()에서
+        """
+        entry = self.cache.get(token_digest(token))
+        if entry is None:
+            return self._apply_role_change(decode(token))
+        claims, checked_at = entry
+        return self._apply_role_change(claims, checked_at)
+
+    def _lookup_role(self, claims):
+        """저장소의 현재 역할로 클레임 갱신 (조회 실패 시 토큰의 역할 그대로)"""
+        if self.role_lookup is None:
+            return claims
+        try:
+            stored_role = self.role_lookup(claims)
+        except Exception as e:
+            print(f"Role lookup error: {e}")
+            return claims
+        with self._lock:
+            self.role_lookups += 1
+        if stored_role and stored_role != claims.get('role'):
+            return {**claims, 'role': stored_role}
+        return claims
+
+    def record_role_change(self, email, new_role):
+        """역할 변경 기록 → 변경 전에 발급된 토큰은 새 역할로 취급"""
+        with self._lock:
+            self._role_changes[email] = (new_role, time.time())
+            self._prune()
+
+    def _apply_role_change(self, claims, checked_at=0):
+        with self._lock:
+            change = self._role_changes.get(claims.get('email'))
+        if not change:
+            return claims
+        new_role, changed_at = change
+        # 저장소에서 역할을 확인한 뒤의 변경만 (그 전 변경은 확인한 역할에 이미 들어 있음)
+        if claims.get('iat', 0) < changed_at and changed_at > checked_at and claims.get('role') != new_role:
+            return {**claims, 'role': new_role}
+        return claims
+
+    def _prune(self):
+        # 토큰 수명이 지난 변경 기록은 더 이상 적용할 토큰이 없음
+        cutoff = time.time() - TOKEN_LIFETIME_SECONDS
+        for email in [e for e, (_, changed_at) in self._role_changes.items() if changed_at < cutoff]:
+            del self._role_changes[email]
+
+    def stats(self):
+        with self._lock:
+            role_changes = len(self._role_changes)
+        return {**self.cache.stats(), 'role_changes': role_changes, 'role_lookups': self.role_lookups}
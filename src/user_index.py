@@ -0,0 +1,168 @@
+"""
+이메일/학번 → uid 인덱스
+스탬프 부여·역할 변경 시 users 컬렉션 쿼리 대신 포인트 조회를 사용합니다.
+- 프로세스 메모리 맵 (이메일, 학번 → uid)
+- 저장소의 이메일 인덱스 (Firestore: user_index/{email} 조회 컬렉션)
+- 존재하지 않는 대상(오타)은 네거티브 캐시로 일정 시간 바로 응답
+"""
+
+import threading
+import time
+
+INDEX_COLLECTION = 'user_index'
+SCHOOL_DOMAIN = '@jeohyeon.hs.kr'
+NEGATIVE_TTL_SECONDS = 30
+
+
+def normalize_email(identifier):
+    """학번 또는 이메일을 정규화된 이메일로 변환 (streamlit의 format_email_input과 동일 규칙)"""
+    if not identifier:
+        return ""
+    identifier = identifier.strip().lower()
+    if '@' in identifier:
+        return identifier
+    return f"{identifier}{SCHOOL_DOMAIN}"
+
+
+def student_number_from_email(email):
+    """학교 이메일에서 학번 추출 (숫자 학번이 아니면 None)"""
+    local, _, domain = normalize_email(email).partition('@')
+    if f"@{domain}" == SCHOOL_DOMAIN and local.isdigit():
+        return local
+    return None
+
+
+class UserIndex:
+    def __init__(self, negative_ttl=NEGATIVE_TTL_SECONDS):
+        self._lock = threading.Lock()
+        self._uids = {}      # 이메일/학번 → uid
+        self._misses = {}    # 이메일 → 네거티브 캐시 만료 시각
+        self.negative_ttl = negative_ttl
+
+    def _keys(self, email):
+        keys = [email]
+        number = student_number_from_email(email)
+        if number:
+            keys.append(number)
+        return keys
+
+    def remember(self, email, uid):
+        """메모리 인덱스에 등록 (새로 등록된 경우 True)"""
+        email = normalize_email(email)
+        with self._lock:
+            is_new = self._uids.get(email) != uid
+            for key in self._keys(email):
+                self._uids[key] = uid
+            self._misses.pop(email, None)
+        return is_new
+
+    def forget(self, email):
+        email = normalize_email(email)
+        with self._lock:
+            for key in self._keys(email):
+                self._uids.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._uids.clear()
+            self._misses.clear()
+
+    def cached_uid(self, identifier):
+        """메모리 맵에서만 조회 (학번 또는 이메일)"""
+        key = (identifier or "").strip().lower()
+        with self._lock:
+            return self._uids.get(key) or self._uids.get(normalize_email(key))
+
+    def _is_known_missing(self, email):
+        with self._lock:
+            expires_at = self._misses.get(email)
+            if expires_at is None:
+                return False
+            if expires_at < time.monotonic():
+                del self._misses[email]
+                return False
+            return True
+
+    def _mark_missing(self, email):
+        with self._lock:
+            self._misses[email] = time.monotonic() + self.negative_ttl
+
+    def lookup(self, storage, identifier):
+        """
+        학번 또는 이메일로 uid 조회
+
+        Returns:
+            str or None: uid (없는 사용자면 None)
+        """
+        email = normalize_email(identifier)
+        if not email:
+            return None
+
+        uid = self.cached_uid(email)
+        if uid:
+            return uid
+        if self._is_known_missing(email):
+            return None
+
+        uid = storage.get_index_uids([email]).get(email)
+        if uid:
+            self.remember(email, uid)
+            return uid
+        return self._lookup_legacy(storage, email)
+
+    def _lookup_legacy(self, storage, email):
+        """인덱스가 생기기 전에 가입한 사용자: 저장소가 한 번만 찾고 인덱스 보충 (없으면 네거티브 캐시)"""
+        uid = storage.find_uid_by_email(email)
+        if uid:
+            self.remember(email, uid)
+        else:
+            self._mark_missing(email)
+        return uid
+
+    def prime(self, storage, limit=None):
+        """
+        저장소의 인덱스를 한 번 읽어 메모리 맵 채우기 (워커 시작 시)
+
+        Returns:
+            int: 등록한 항목 수
+        """
+        count = 0
+        for email, uid in storage.iter_index(limit):
+            self.remember(email, uid)
+            count += 1
+        return count
+
+    def lookup_many(self, storage, identifiers):
+        """
+        여러 대상을 한 번에 조회 (메모리에 없는 것만 저장소에서 한 번에 읽음)
+
+        Returns:
+            dict: 정규화된 이메일 → uid (없는 사용자는 None)
+        """
+        uids = {}
+        unknown = []
+        for identifier in identifiers:
+            email = normalize_email(identifier)
+            if not email or email in uids:
+                continue
+            uids[email] = self.cached_uid(email)
+            if not uids[email] and not self._is_known_missing(email):
+                unknown.append(email)
+
+        if unknown:
+            for email, uid in storage.get_index_uids(unknown).items():
+                uids[email] = uid
+                self.remember(email, uid)
+            for email in unknown:
+                if not uids[email]:
+                    uids[email] = self._lookup_legacy(storage, email)
+        return uids
+
+
+def index_entry(email, uid):
+    email = normalize_email(email)
+    return {
+        'uid': uid,
+        'email': email,
+        'student_number': student_number_from_email(email),
+    }
@@ -0,0 +1,63 @@
+"""
+ETag용 버전 카운터
+스탬프/역할 쓰기마다 사용자별·컬렉션 버전을 올리고, 읽기 API는 버전으로 ETag를 만듭니다.
+- 카운터는 프로세스 메모리에 있으므로 ETag에 프로세스 boot id를 넣어 워커 간 오인을 막음
+- 워커가 여러 개(WEB_CONCURRENCY > 1)면 다른 워커의 쓰기를 이 워커의 카운터가 모름
+  → 같은 워커가 최대 ETAG_MAX_AGE_SECONDS 동안 바뀐 데이터에 304를 줄 수 있으므로 버전 ETag를 끔
+  (user_etag/collection_etag가 None → 항상 200)
+"""
+
+import hashlib
+import os
+import threading
+import time
+import uuid
+
+ETAG_MAX_AGE_SECONDS = int(os.environ.get('ETAG_MAX_AGE_SECONDS', 30))
+
+
+def single_worker():
+    return int(os.environ.get('WEB_CONCURRENCY', 1)) <= 1
+
+
+class VersionCounters:
+    def __init__(self, max_age=ETAG_MAX_AGE_SECONDS, enabled=None):
+        self._lock = threading.Lock()
+        self.enabled = single_worker() if enabled is None else enabled
+        self.boot_id = uuid.uuid4().hex[:8]
+        self.max_age = max_age
+        self.epoch = 0          # 전체 초기화 시 증가
+        self.collection = 0     # users 컬렉션의 어떤 쓰기든 증가
+        self._users = {}        # uid → 버전
+
+    def bump_user(self, uid):
+        with self._lock:
+            self._users[uid] = self._users.get(uid, 0) + 1
+            self.collection += 1
+
+    def bump_all(self):
+        with self._lock:
+            self.epoch += 1
+            self.collection += 1
+            self._users.clear()
+
+    def _time_bucket(self):
+        return int(time.time() // self.max_age) if self.max_age > 0 else 0
+
+    def user_etag(self, uid, *extra):
+        if not self.enabled:
+            return None
+        with self._lock:
+            parts = [self.boot_id, self.epoch, self._users.get(uid, 0), self._time_bucket(), uid, *extra]
+        return make_etag(*parts)
+
+    def collection_etag(self, *extra):
+        if not self.enabled:
+            return None
+        with self._lock:
+            parts = [self.boot_id, self.epoch, self.collection, self._time_bucket(), *extra]
+        return make_etag(*parts)
+
+
+def make_etag(*parts):
+    return hashlib.sha1('|'.join(str(p) for p in parts).encode()).hexdigest()[:20]